@@ -16,11 +16,23 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import multiprocessing
 import os
+import Queue
 import sqlite3
+import threading
+import time
 
 from window import Window
+from build_profiler import BuildProfiler, BUILD_OBJECT_LINES, BUILD_PHASE_CACHE, BUILD_PHASE_DECODE
+from calibration import calibrate
 from logic import Gameplay, Tutorial1, Tutorial2
+from content import meaning_cache, ContentWatcher, DEFAULT_MEANING_CACHE_SIZE
+from content_pack import get_resource_path, load_content, DB_FILE_NAME, CONTENT_PACK_FILE_NAME
+from ingest import open_text_source, FollowTextSource
+from level_cache import get_layout_key, LayoutCache, LayoutPool
+from line_index import get_user_dir
+from query_tracer import QueryTracer, TracedConnection, PHASE_BUILD, PHASE_TICK
 from constants import *
 
 
@@ -38,18 +50,52 @@ class Controller(object):
         # Game attributes
         self.interval_ms = self.settings.interval_ms
         self.current_file_name = None
+        self.current_path = None            # file, directory or glob pattern the current game is played on
+        self.lines_per_chunk = None         # number of lines per part of the current game
+        self.text_source = None             # chunks of the current file (see ingest module)
+        self.parts_total = 0                # number of parts (chunks) of the current file, None if not known yet
+        self.is_following = False           # True while the current file is followed (new parts are added as it grows)
+        self.gameplay_build_args = ()       # arguments parts of the current file are built with
+        self.gameplay_build_kwargs = {}     # keyword arguments parts of the current file are built with
+        self.prebuild_thread = None         # thread building the next part in background
+        self.prebuilt_parts = Queue.Queue()  # (number, Gameplay, parts total) built by the prebuild thread
+        self.layout_pool = None             # worker processes laying out the following parts (see level_cache module)
+        # Totals of the parts that have already been played and dropped (see finish_game)
+        self.dropped_parts_totals = {"price": 0, "enemies": 0, "enemies_eliminated": 0}
 
         # Input attributes (Tkinter event binding does not have key-just-pressed event)
         self.commands = {CMD_JUMP: False, CMD_LEFT: False, CMD_RIGHT: False, CMD_UP: False, CMD_DOWN: False,
                          CMD_TRANSFORM: False, CMD_1: False, CMD_2: False, CMD_3: False, CMD_4: False, CMD_5: False,
                          CMD_6: False, CMD_7: False, CMD_8: False, CMD_9: False, CMD_0: False}
 
-        # Obtain database connection
-        self.connection = sqlite3.connect("data.db")
+        # Layouts of built parts are cached between runs (see level_cache module)
+        self.layout_cache = None
+        if self.settings.is_layout_cache_enabled:
+            self.layout_cache = LayoutCache()
+            self.layout_cache.prune()
+
+        # Obtain database connection (used directly by the content editor only). Statements executed via the
+        # connection are traced when tracing is enabled (Diagnostics menu).
+        self.query_tracer = QueryTracer(is_enabled=self.settings.is_query_tracing_enabled)
+        # Builds of the parts of the current game are profiled when profiling is enabled (Diagnostics menu)
+        self.build_profiler = BuildProfiler(is_enabled=self.settings.is_build_profiling_enabled)
+        self.db_file_name = get_resource_path(DB_FILE_NAME)
+        self.connection = TracedConnection(sqlite3.connect(self.db_file_name), self.query_tracer)
+
+        # Game content is read once (from the content pack when it is up to date) and then served from memory
+        meaning_cache.set_max_size(self.settings.meaning_cache_size)
+        self.content = load_content(self.connection, self.db_file_name, get_resource_path(CONTENT_PACK_FILE_NAME))
+        # Content changed in the database while the game is running (e.g. via the content editor) is reloaded on the fly
+        self.content_watcher = ContentWatcher(self.connection)
 
         # User interface
         self.gui = Window(self, is_mac)
 
+        # Settings depending on the speed of the machine are measured on the first run (see calibration module), once
+        # the window is shown. The tutorial is played with the default ones until then.
+        if not self.settings.is_calibrated:
+            self.gui.after(FIRST_RUN_CALIBRATION_DELAY_MS, self.calibrate_first_run)
+
         # Game objects
         self.active_gameplay_number = 1
         self.gameplays = {}
@@ -61,6 +107,14 @@ class Controller(object):
         """
         Game loop
         """
+        self.query_tracer.begin_phase(PHASE_TICK)
+        if self.prebuild_thread and not self.prebuild_thread.is_alive():
+            self.wait_for_prebuild()  # add the prebuilt part right away
+        if self.content_watcher.has_changed():
+            self.reload_content()
+        if self.is_following:
+            self.follow_file()
+
         if self.gameplays and self.gameplays[self.active_gameplay_number]\
                 and self.gameplays[self.active_gameplay_number].is_running:
             self.gameplays[self.active_gameplay_number].update(self.commands)
@@ -72,40 +126,103 @@ class Controller(object):
                                  capacity=self.gameplays[self.active_gameplay_number].player.capacity,
                                  coins=self.gameplays[self.active_gameplay_number].player.coins,
                                  words=self.gameplays[self.active_gameplay_number].get_words_collided_by_player())
-            self.gui.game_area.render(self.gameplays[self.active_gameplay_number].render_string())
+            x_from, x_to = self.gui.game_area.get_visible_columns()
+            self.gui.game_area.render(self.gameplays[self.active_gameplay_number].render(x_from, x_to,
+                                                                                         self.settings.render_mode),
+                                      x_from)
             # TODO camera following the player. The solution below is not perfect.
             # self.gui.follow_player_y_view(round(
             #     self.gameplays[self.active_gameplay_number].player.y
             #     / float(len(self.gameplays[self.active_gameplay_number].rows) * 1.1), 2))
+        self.query_tracer.end_phase()
 
         self.gui.after(self.interval_ms, self.update)
 
+    def calibrate(self):
+        """
+        Measure the speed of the machine, tune the settings to it and save them. The current game keeps its number of
+        lines per chunk, it is used by new games.
+        :return: CalibrationResult
+        """
+        self.wait_for_prebuild()  # the part being built in background would slow down the measured one
+        with self.query_tracer.phase(PHASE_BUILD):
+            result = calibrate(self.content)
+        result.apply_to(self.settings)
+        self.interval_ms = self.settings.interval_ms
+        return result
+
+    def calibrate_first_run(self):
+        """
+        Calibrate the settings on the first run and save them
+        """
+        self.calibrate()
+        settings_error = self.save_settings()
+        if settings_error:
+            self.show_message(settings_error)
+
+    def save_settings(self):
+        """
+        Save settings to the folder of the user (see get_settings_file_name)
+        :return: error message, None if the settings have been saved
+        """
+        try:
+            self.settings.save_to_file(get_settings_file_name())
+        except (IOError, OSError) as e:
+            return "Settings could not be saved, calibration will be run again on the next start.\n\n" + str(e)
+        return None
+
+    def reload_content(self):
+        """
+        Reload game content from the database and update meanings of the affected words in all loaded gameplays.
+        """
+        self.wait_for_prebuild()  # the part being built must not see the content half-reloaded
+        changed_keys = self.content.reload_from_db(self.connection)
+        if self.layout_pool and self.current_path and not self.is_following:
+            # Layouts of the following parts depend on the content (phrases)
+            self.start_layout_pool(self.active_gameplay_number + 2)
+        for gameplay in self.gameplays.itervalues():
+            if gameplay:
+                gameplay.update_word_meanings(self.content, changed_keys)
+        if self.is_game_already_running():
+            self.construct_gui_actions_list(self.gameplays[self.active_gameplay_number].player.command_action_map)
+
     def start(self):
         """
         Start the entire application: both GUI and logic
         """
         self.gui.start_gui_loop(self.interval_ms, self.update)
+        # The window has been closed. The part being built in background is waited for, so that the prebuild thread
+        # does not outlive the interpreter.
+        self.close_text_source()
+        if self.layout_pool:
+            self.layout_pool.close()
 
     def start_tutorial(self):
         """
         Start tutorial session.
         """
+        self.close_text_source()
         self.active_gameplay_number = 1
-        self.gameplays = {
-            self.active_gameplay_number: Tutorial1(self),
-            self.active_gameplay_number + 1: Tutorial2(self)
-        }
+        with self.query_tracer.phase(PHASE_BUILD):
+            self.gameplays = {
+                self.active_gameplay_number: Tutorial1(self),
+                self.active_gameplay_number + 1: Tutorial2(self)
+            }
 
         # Start tutorial
         self.gameplays[self.active_gameplay_number].is_running = True
-        self.gui.set_scrollable_area_size(self.gameplays[self.active_gameplay_number].render_string())
+        self.gui.set_scrollable_area_size(self.gameplays[self.active_gameplay_number].width,
+                                          len(self.gameplays[self.active_gameplay_number].rows))
 
     def create_new_gameplay_from_file(self, file_name, language_id, difficulty, line_spacing, left, top_before_start,
                                       top_after_start, right, bottom_before_finish, bottom_after_finish,
-                                      lines_per_chunk):
+                                      lines_per_chunk, start_part=FIRST_GAMEPLAY_SEQUENCE_NUM, is_follow_mode=False,
+                                      wrap_column=0, seed=DEFAULT_SEED):
         """
-        Start new game (gameplay)
-        :param file_name: name of the text file to play on
+        Start new game (gameplay). Only the starting part is built right away, each following part is built in
+        background while the previous one is played.
+        :param file_name: name of the text file to play on (may be compressed with gzip, bzip2 or xz). A directory
+        or a glob pattern is played as a campaign: all its files one after another.
         :param language_id:
         :param difficulty:
         :param line_spacing:
@@ -116,44 +233,235 @@ class Controller(object):
         :param bottom_before_finish:
         :param bottom_after_finish:
         :param lines_per_chunk:
+        :param start_part: number of the part (chunk) to start the game from
+        :param is_follow_mode: follow the file, like "tail -f": parts are added while the file grows, the finish
+        platform appears only after the file stops growing
+        :param wrap_column: text lines longer than this are wrapped to several rows, 0 - no wrapping
+        :param seed: seed of random numbers the parts are built with, the same file and seed give the same game
         """
-        self.current_file_name = None
+        self.close_text_source()
         self.gameplays.clear()
-        gameplay_count = 0
-        line_count = 0
-        lines = []
-        # TODO file opening block needs refactoring
-        with open(file_name, "r") as f:
-            for line in f:
-                line = line.decode(encoding="utf-8", errors="replace")
-                if line_count < lines_per_chunk:
-                    line_count += 1
-                    lines.append(line)
-                else:
-                    gameplay_count += 1
-                    self.gameplays[gameplay_count] = Gameplay(self, gameplay_count, lines, language_id, difficulty,
-                                                              line_spacing, left, top_before_start, top_after_start,
-                                                              right, bottom_before_finish, bottom_after_finish)
-                    del lines[:]
-                    line_count = 1
-                    lines.append(line)
-            # Add last unassigned lines to last gameplay
-            if lines:
-                gameplay_count += 1
-                self.gameplays[gameplay_count] = Gameplay(self, gameplay_count, lines, language_id, difficulty,
-                                                          line_spacing, left, top_before_start, top_after_start,
-                                                          right, bottom_before_finish, bottom_after_finish,
-                                                          is_last_gameplay=True)
-            self.current_file_name = os.path.basename(f.name)
-            self.active_gameplay_number = 1
-
-        self.gui.set_scrollable_area_size(self.gameplays[self.active_gameplay_number].render_string())
+        self.build_profiler.reset()
+        try:
+            if is_follow_mode:
+                self.text_source = FollowTextSource(file_name, lines_per_chunk)
+            else:
+                self.text_source = open_text_source(file_name, lines_per_chunk)
+        except IOError as e:
+            self.text_source = None
+            self.show_message(str(e))
+            return
+        self.parts_total = self.text_source.parts_total
+        self.current_path = file_name
+        self.lines_per_chunk = lines_per_chunk
+        self.gameplay_build_args = (language_id, difficulty, line_spacing, left, top_before_start, top_after_start,
+                                    right, bottom_before_finish, bottom_after_finish)
+        self.gameplay_build_kwargs = {"wrap_column": wrap_column, "seed": seed}
+
+        start_part = max(FIRST_GAMEPLAY_SEQUENCE_NUM, start_part)
+        if not self.get_gameplay(start_part, is_first_gameplay=True):
+            # The file has less parts than requested, start from its last part
+            if is_follow_mode:
+                # Lines of the last part may not fill a whole chunk yet
+                self.text_source.flush()
+                start_part = min(start_part, self.text_source.chunks_count)
+            else:
+                start_part = self.parts_total
+            if not start_part or not self.get_gameplay(start_part, is_first_gameplay=True):
+                self.show_message("The file is empty")
+                return
+
+        self.current_file_name = os.path.basename(self.text_source.get_file_name(start_part) or file_name)
+        self.active_gameplay_number = start_part
+        self.is_following = is_follow_mode
+        if not is_follow_mode:
+            self.start_layout_pool(start_part + 2)  # the next part is prebuilt right away
+        self.prebuild_next_part()
+
+        self.gui.set_scrollable_area_size(self.gameplays[self.active_gameplay_number].width,
+                                          len(self.gameplays[self.active_gameplay_number].rows))
         self.gui.set_window_caption(file_name=self.current_file_name,
                                     current_part=self.gameplays[self.active_gameplay_number].sequence_number,
-                                    parts_total=len(self.gameplays))
+                                    parts_total=self.parts_total)
         for key in self.commands:
             self.commands[key] = False
             self.gameplays[self.active_gameplay_number].is_running = True
+        self.report_dead_ends()
+        if self.build_profiler.is_enabled:
+            self.gui.show_build_report_dialog()
+
+    def get_gameplay(self, number, is_first_gameplay=False):
+        """
+        Get gameplay (part) of the current file, building it from the text source if it has not been built yet.
+        :param number: number of the part
+        :param is_first_gameplay: True if the game starts from this part (see Gameplay)
+        :return: Gameplay, None if the file has no such part
+        """
+        self.wait_for_prebuild()
+        gameplay = self.gameplays.get(number)
+        if gameplay is None:
+            gameplay = self._build_gameplay(number, is_first_gameplay)
+        return gameplay
+
+    def prebuild_next_part(self):
+        """
+        Start building the part following the active one in a background thread, so that the game does not stall
+        when the player reaches it.
+        """
+        number = self.active_gameplay_number + 1
+        if (self.prebuild_thread or not self.text_source or self.is_following or number in self.gameplays
+                or (self.parts_total is not None and number > self.parts_total)):
+            return
+        self.prebuild_thread = threading.Thread(target=self._prebuild_part, args=(number,))
+        self.prebuild_thread.daemon = True
+        self.prebuild_thread.start()
+
+    def _prebuild_part(self, number):
+        """
+        Body of the prebuild thread. The part is only built here, it is added to the game by wait_for_prebuild in the
+        main thread.
+        """
+        gameplay, parts_total = None, self.parts_total
+        try:
+            gameplay, parts_total = self._build_part(number)
+        finally:
+            # Nothing is added if the build has failed, the part is built once again in the main thread then
+            self.prebuilt_parts.put((number, gameplay, parts_total))
+
+    def wait_for_prebuild(self):
+        """
+        Wait for the prebuild thread to finish and add the part it has built. Called in the main thread only.
+        """
+        if self.prebuild_thread:
+            self.prebuild_thread.join()
+            self.prebuild_thread = None
+            self._add_part(*self.prebuilt_parts.get())
+
+    def start_layout_pool(self, first_number):
+        """
+        Start laying out parts of the current file in worker processes, so that the game only has to create objects of
+        those from their cached layouts. Laying out of the previous file (if any) is stopped. The worker processes are
+        started with the first file, so that games on the tutorial only do not start them.
+        :param first_number: number of the first part to lay out
+        """
+        if not self.layout_pool and self.layout_cache and self.layout_cache.cache_dir:
+            processes_count = self.settings.layout_processes_count
+            if processes_count is None:
+                processes_count = multiprocessing.cpu_count() - 1  # one core is left to the game itself
+            if processes_count >= 1:
+                # The workers are forked from this process. They never touch the database connection and the window
+                # they inherit, and they exit without running finalizers, so those are left intact. No other thread
+                # may be running meanwhile though, its locks would be inherited taken.
+                self.wait_for_prebuild()
+                self.layout_pool = LayoutPool(processes_count, self.layout_cache)
+        if self.layout_pool:
+            self.layout_pool.start(self.current_path, self.lines_per_chunk, first_number, self.gameplay_build_args,
+                                   self.gameplay_build_kwargs, self.content, active_number=self.active_gameplay_number)
+
+    def stop_layout_pool(self):
+        if self.layout_pool:
+            self.layout_pool.stop()
+
+    def close_text_source(self):
+        """
+        Stop reading the current file (if any).
+        """
+        self.wait_for_prebuild()
+        self.stop_layout_pool()
+        if self.text_source:
+            self.text_source.close()
+        self.text_source = None
+        self.current_file_name = None
+        self.current_path = None
+        self.is_following = False
+        self.dropped_parts_totals = {"price": 0, "enemies": 0, "enemies_eliminated": 0}
+
+    def _build_gameplay(self, number, is_first_gameplay=False):
+        """
+        Build gameplay (part) from the text source and add it to the game
+        :return: Gameplay, None if the file has no such part
+        """
+        gameplay, parts_total = self._build_part(number, is_first_gameplay)
+        self._add_part(number, gameplay, parts_total)
+        return gameplay
+
+    def _add_part(self, number, gameplay, parts_total):
+        """
+        Add a part built by _build_part to the game. Called in the main thread only.
+        :param gameplay: Gameplay, None if the file has no such part
+        :param parts_total: number of parts of the file known after the build, None if not known yet
+        """
+        self.parts_total = parts_total
+        if gameplay:
+            self.build_profiler.add(gameplay.build_profile)
+            self.gameplays[number] = gameplay
+
+    def _build_part(self, number, is_first_gameplay=False):
+        """
+        Build gameplay (part) from the text source. Called either in the main thread or in the prebuild thread, so
+        the state of the game is not changed here (see _add_part).
+        :return: (Gameplay, None if the file has no such part; number of parts of the file, None if not known yet)
+        """
+        start_time = time.time()
+        chunk = self.text_source.get_chunk(number)
+        decode_sec = time.time() - start_time
+        parts_total = self.text_source.parts_total
+        if chunk is None:
+            return None, parts_total
+        lines, is_last = chunk
+        layout_key = None
+        layout = None
+        cache_start_time = time.time()
+        if self.layout_cache:
+            layout_key = get_layout_key(lines, self.gameplay_build_args, self.gameplay_build_kwargs,
+                                        is_first_gameplay, self.content.get_version())
+            layout = self.layout_cache.load(layout_key)
+        cache_sec = time.time() - cache_start_time
+        with self.query_tracer.phase(PHASE_BUILD):
+            gameplay = Gameplay(self, number, lines, *self.gameplay_build_args, is_last_gameplay=is_last,
+                                is_first_gameplay=is_first_gameplay, layout=layout, **self.gameplay_build_kwargs)
+        # A layout cached from the same part of another file (where it was not the last one) gets the finish platform
+        if layout_key and (layout is None or gameplay.layout["finish_x"] != layout.get("finish_x")):
+            cache_start_time = time.time()
+            self.layout_cache.save(layout_key, gameplay.layout)
+            cache_sec += time.time() - cache_start_time
+        profile = gameplay.build_profile
+        profile.add_time(BUILD_PHASE_DECODE, decode_sec)
+        profile.add_time(BUILD_PHASE_CACHE, cache_sec)
+        profile.count(BUILD_OBJECT_LINES, len(lines))
+        profile.total_sec = time.time() - start_time
+        return gameplay, parts_total
+
+    def _drop_played_parts(self):
+        """
+        Drop parts preceding the active one (the player never returns to those), so that memory stays bounded
+        regardless of the file size. Their totals are kept for finish_game.
+        """
+        if not self.text_source:
+            return  # tutorial
+        for number in [key for key in self.gameplays if key < self.active_gameplay_number]:
+            gameplay = self.gameplays.pop(number)
+            self.dropped_parts_totals["price"] += gameplay.initial_coins_count * 9
+            self.dropped_parts_totals["enemies"] += gameplay.initial_enemies_count
+            self.dropped_parts_totals["enemies_eliminated"] += (gameplay.initial_enemies_count -
+                                                                len(gameplay.enemies))
+
+    def follow_file(self):
+        """
+        Check the followed file for appended lines (see FollowTextSource.poll). Parts are built from them when the
+        player reaches those. Once the file stops growing, its last part gets the finish platform.
+        """
+        if not self.text_source.poll():
+            return
+        if self.text_source.is_finished:
+            self.is_following = False
+            self.parts_total = self.text_source.parts_total
+            last_gameplay = self.gameplays.get(self.parts_total)
+            if last_gameplay and not last_gameplay.is_last_gameplay:
+                last_gameplay.add_finish_platform()
+            self.gui.set_window_caption(file_name=self.current_file_name,
+                                        current_part=self.gameplays[self.active_gameplay_number].sequence_number,
+                                        parts_total=self.parts_total)
 
     def construct_gui_actions_list(self, command_action_map):
         """
@@ -182,10 +490,11 @@ class Controller(object):
         return self.gui.show_choose_word_dialog(word_texts_list)
 
     def finish_game(self, success, is_tutorial=False):
+        # Parts are built on demand, so totals cover the parts that have been played (built) only
         price_collected = self.gameplays[self.active_gameplay_number].player.coins
-        price_total = 0
-        enemies_eliminated = 0
-        enemies_total = 0
+        price_total = self.dropped_parts_totals["price"]
+        enemies_eliminated = self.dropped_parts_totals["enemies_eliminated"]
+        enemies_total = self.dropped_parts_totals["enemies"]
         for gameplay in self.gameplays.values():
             price_total += gameplay.initial_coins_count * 9
             enemies_total += gameplay.initial_enemies_count
@@ -200,18 +509,46 @@ class Controller(object):
         :param number: gamplay number in the self.gameplays dictionary
         :param player: player instance which should be transferred to next gameplay
         """
+        if not self.get_gameplay(number):
+            # Next part of the followed file has not been written yet, so the player falls through the current one
+            # once again
+            player.move_to_another_gameplay(self.gameplays[self.active_gameplay_number], player.x, 0)
+            self.gui.follow_player_y_view(0)
+            return
+
         self.gameplays[self.active_gameplay_number].is_running = False
         self.active_gameplay_number = number
         player.move_to_another_gameplay(self.gameplays[self.active_gameplay_number], player.x, 0)
         self.gameplays[self.active_gameplay_number].is_running = True
 
+        # Only the active part and the next one are kept
+        self._drop_played_parts()
+        self.prebuild_next_part()
+        if self.layout_pool:
+            self.layout_pool.set_active_part(number)
+
         # Scroll to the top
         self.gui.follow_player_y_view(0)
+        self.report_dead_ends()
 
         if self.current_file_name:
+            # Parts of a campaign come from different files
+            part_file_name = self.text_source and self.text_source.get_file_name(number)
+            if part_file_name:
+                self.current_file_name = os.path.basename(part_file_name)
             self.gui.set_window_caption(file_name=self.current_file_name,
                                         current_part=self.gameplays[self.active_gameplay_number].sequence_number,
-                                        parts_total=len(self.gameplays))
+                                        parts_total=self.parts_total)
+
+    def report_dead_ends(self):
+        """
+        Warn the player if it may get stuck in the active part: words could not be moved apart when it was built
+        (see LayoutBuilder)
+        """
+        layout = self.gameplays[self.active_gameplay_number].layout
+        if layout and layout["dead_ends"]:
+            self.show_message("You may get stuck in this part: rows %d-%d have no way down" %
+                              (layout["dead_ends"][-1][1], layout["dead_ends"][0][1]))
 
     def show_message(self, text):
         """
@@ -229,13 +566,13 @@ class Controller(object):
             self.gameplays[self.active_gameplay_number].is_running = False
             self.gui.set_window_caption(file_name=self.current_file_name,
                                         current_part=self.gameplays[self.active_gameplay_number].sequence_number,
-                                        parts_total=len(self.gameplays),
+                                        parts_total=self.parts_total,
                                         is_paused=True)
         else:
             self.gameplays[self.active_gameplay_number].is_running = True
             self.gui.set_window_caption(file_name=self.current_file_name,
                                         current_part=self.gameplays[self.active_gameplay_number].sequence_number,
-                                        parts_total=len(self.gameplays))
+                                        parts_total=self.parts_total)
 
     ##################
     # Calls to logic #
@@ -301,7 +638,7 @@ class Controller(object):
 
 class Settings(object):
     def __init__(self):
-        self.interval_ms = 100
+        self.interval_ms = DEFAULT_INTERVAL_MS
         self.font_name = "Courier New"
         self.font_size = 11
         self.x_step = 9
@@ -310,17 +647,84 @@ class Settings(object):
         self.window_y = 0
         self.window_width = 300
         self.window_height = 200
+        self.meaning_cache_size = DEFAULT_MEANING_CACHE_SIZE  # max number of word meanings kept in memory
+        self.is_query_tracing_enabled = False  # trace database queries from the start (see Diagnostics menu)
+        self.is_build_profiling_enabled = False  # profile builds of parts and report them when a game is started
+        self.wrap_column = DEFAULT_WRAP_COLUMN  # default column long text lines are wrapped at (0 - no wrapping)
+        self.seed = DEFAULT_SEED  # default seed of random numbers levels are built with
+        self.is_layout_cache_enabled = True  # cache layouts of built parts between runs (see level_cache module)
+        # Worker processes laying out parts ahead of the game (None - one less than CPU cores, 0 - none)
+        self.layout_processes_count = None
+        # Settings depending on the speed of the machine (see calibration module)
+        self.lines_per_chunk = DEFAULT_LINES_PER_CHUNK  # default number of lines per part of a new game
+        self.render_mode = RENDER_MODE_SLICING
+        self.is_calibrated = False  # calibration is run on start until it succeeds once
 
     def load_from_file(self, file_name):
-        pass
+        """
+        Read settings saved by save_to_file. Settings missing in the file (or the whole file) keep their defaults,
+        values that cannot be parsed are skipped.
+        :param file_name: name of a text file of "name = value" rows
+        """
+        try:
+            with open(file_name) as f:
+                rows = f.readlines()
+        except IOError:
+            return
+        for row in rows:
+            name, separator, value = row.partition("=")
+            name = name.strip()
+            if not separator or name.startswith("#") or not hasattr(self, name):
+                continue
+            try:
+                setattr(self, name, parse_setting_value(value.strip(), getattr(self, name)))
+            except ValueError:
+                pass
 
     def save_to_file(self, file_name):
-        pass
+        """
+        Write settings to a text file of "name = value" rows (its folder is created if it does not exist). Settings
+        that have their default values are not written, so that changed defaults of later versions take effect.
+        """
+        defaults = vars(Settings())
+        folder = os.path.dirname(file_name)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(file_name, "w") as f:
+            for name in sorted(vars(self)):
+                if getattr(self, name) != defaults[name]:
+                    f.write("%s = %s\n" % (name, getattr(self, name)))
+
+
+def get_settings_file_name():
+    """
+    :return: name of the settings file in the folder of the user
+    """
+    return os.path.join(get_user_dir(), SETTINGS_FILE_NAME)
+
+
+def parse_setting_value(value, default):
+    """
+    :param value: text of a setting value
+    :param default: default value of the setting, the text is parsed as a value of its type
+    :return: value of the setting
+    """
+    if value == "None":
+        return None
+    if isinstance(default, bool):
+        return value.lower() in ("true", "yes", "1")
+    if isinstance(default, int) or default is None:
+        return int(value)  # settings that are None by default are numbers of something
+    if isinstance(default, float):
+        return float(value)
+    return value
 
 
 # Application entry point
 if __name__ == '__main__':
+    # Worker processes of LayoutPool start by running the executable built by PyInstaller (on Windows)
+    multiprocessing.freeze_support()
     settings = Settings()
-    settings.load_from_file("settings.txt")
+    settings.load_from_file(get_settings_file_name())
     app_controller = Controller(settings, is_mac=False)
     app_controller.start()
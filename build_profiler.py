@@ -0,0 +1,207 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Profiling of part (chunk) builds: time spent in every phase of a build and numbers of objects created, per chunk.
+# Every gameplay records its ChunkProfile while it is built (see GameBuilder), BuildProfiler collects those of the
+# current game when profiling is enabled (Diagnostics menu) and aggregates them into a report.
+
+import time
+from contextlib import contextmanager
+
+# Phases of a build, in the order they happen
+BUILD_PHASE_DECODE = "decode"               # reading and decoding lines of the chunk
+BUILD_PHASE_CACHE = "layout cache"          # loading and saving the layout (see level_cache module)
+BUILD_PHASE_TOKENIZE = "tokenize"           # splitting lines to words
+BUILD_PHASE_REACHABILITY = "reachability"   # removing dead ends (see reachability module)
+BUILD_PHASE_PLACEMENT = "placement"         # finding space for coins and enemies
+BUILD_PHASE_MEANINGS = "meanings"           # resolving meanings of the words
+BUILD_PHASE_WORDS = "words"                 # Word objects with their meanings and actions
+BUILD_PHASE_COINS = "coins"
+BUILD_PHASE_ENEMIES = "enemies"
+BUILD_PHASE_BULLETS = "bullets"             # pool of bullets
+BUILD_PHASE_OTHER = "other"                 # the rest: rows, platforms, player
+BUILD_PHASES = (BUILD_PHASE_DECODE, BUILD_PHASE_CACHE, BUILD_PHASE_TOKENIZE, BUILD_PHASE_REACHABILITY,
+                BUILD_PHASE_PLACEMENT, BUILD_PHASE_MEANINGS, BUILD_PHASE_WORDS, BUILD_PHASE_COINS,
+                BUILD_PHASE_ENEMIES, BUILD_PHASE_BULLETS, BUILD_PHASE_OTHER)
+
+# Objects counted per chunk
+BUILD_OBJECT_LINES = "lines"
+BUILD_OBJECT_WORDS = "words"
+BUILD_OBJECT_MEANINGS = "meanings with lines"  # words that can be transformed to
+BUILD_OBJECT_COINS = "coins"
+BUILD_OBJECT_ENEMIES = "enemies"
+BUILD_OBJECT_BULLETS = "bullets"
+BUILD_OBJECT_PLATFORMS = "platforms"
+BUILD_OBJECTS = (BUILD_OBJECT_LINES, BUILD_OBJECT_WORDS, BUILD_OBJECT_MEANINGS, BUILD_OBJECT_COINS,
+                 BUILD_OBJECT_ENEMIES, BUILD_OBJECT_BULLETS, BUILD_OBJECT_PLATFORMS)
+
+# Phases whose time is spent per object of a kind: (phase, object)
+PER_OBJECT_PHASES = ((BUILD_PHASE_DECODE, BUILD_OBJECT_LINES), (BUILD_PHASE_TOKENIZE, BUILD_OBJECT_WORDS),
+                     (BUILD_PHASE_MEANINGS, BUILD_OBJECT_WORDS), (BUILD_PHASE_WORDS, BUILD_OBJECT_WORDS),
+                     (BUILD_PHASE_COINS, BUILD_OBJECT_COINS), (BUILD_PHASE_ENEMIES, BUILD_OBJECT_ENEMIES),
+                     (BUILD_PHASE_BULLETS, BUILD_OBJECT_BULLETS))
+
+SLOWEST_CHUNKS_COUNT = 10  # number of the slowest chunks in the report
+
+
+class ChunkProfile(object):
+    """
+    Times of the build phases and numbers of the objects of a single chunk
+    """
+    def __init__(self, number=None):
+        """
+        :param number: number of the chunk (part)
+        """
+        self.number = number
+        self.phases = {}                # {phase: seconds}
+        self.counts = {}                # {object: count}
+        self.total_sec = 0.0            # whole build, phases not timed separately are reported as BUILD_PHASE_OTHER
+        self.is_layout_cached = False   # the chunk has been built from a cached layout (it has not been laid out)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Add time spent within the "with" block to the phase
+        :param name: phase name (BUILD_PHASE_...)
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.time() - start_time)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, number):
+        """
+        :param name: object name (BUILD_OBJECT_...)
+        :param number: number of the created objects
+        """
+        self.counts[name] = self.counts.get(name, 0) + number
+
+    def get_phase_sec(self, name):
+        if name == BUILD_PHASE_OTHER:
+            return max(0.0, self.total_sec - sum(self.phases.itervalues()))
+        return self.phases.get(name, 0.0)
+
+    def to_dict(self):
+        return {"number": self.number, "total_sec": self.total_sec, "is_layout_cached": self.is_layout_cached,
+                "phases": dict((name, self.get_phase_sec(name)) for name in BUILD_PHASES),
+                "counts": dict(self.counts)}
+
+
+class BuildProfiler(object):
+    """
+    Collects profiles of the chunks of the current game
+    """
+    def __init__(self, is_enabled=False):
+        """
+        :param is_enabled: profiles are only collected when True
+        """
+        self.is_enabled = is_enabled
+        self.chunks = []  # list of ChunkProfile in the order the chunks have been built
+
+    def add(self, chunk_profile):
+        if self.is_enabled:
+            self.chunks.append(chunk_profile)
+
+    def reset(self):
+        del self.chunks[:]
+
+    def get_phase_totals(self):
+        """
+        :return: {phase: seconds} of all chunks
+        """
+        return dict((name, sum(chunk.get_phase_sec(name) for chunk in self.chunks)) for name in BUILD_PHASES)
+
+    def get_count_totals(self):
+        """
+        :return: {object: count} of all chunks
+        """
+        totals = dict((name, 0) for name in BUILD_OBJECTS)
+        for chunk in self.chunks:
+            for name, count in chunk.counts.iteritems():
+                totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def get_object_costs(self):
+        """
+        :return: list of (phase, object, seconds per object) of the phases spent per object
+        """
+        phase_totals = self.get_phase_totals()
+        count_totals = self.get_count_totals()
+        return [(phase, name, phase_totals[phase] / count_totals[name]) for phase, name in PER_OBJECT_PHASES
+                if count_totals.get(name)]
+
+    def get_slowest_chunks(self, count=SLOWEST_CHUNKS_COUNT):
+        """
+        :return: list of ChunkProfile, slowest first
+        """
+        return sorted(self.chunks, key=lambda chunk: chunk.total_sec, reverse=True)[:count]
+
+    def get_report(self):
+        """
+        :return: human readable report of collected profiles
+        """
+        chunks = list(self.chunks)
+        total_sec = sum(chunk.total_sec for chunk in chunks)
+        lines = ["Build profile (" + ("enabled" if self.is_enabled else "disabled") + ")", "",
+                 "Chunks built: %d (%d from cached layouts), %.1f ms in total" %
+                 (len(chunks), len([chunk for chunk in chunks if chunk.is_layout_cached]), total_sec * 1000)]
+
+        lines.append("")
+        lines.append("Phases:")
+        lines.append("  %-14s %12s %8s %14s" % ("phase", "total ms", "share", "per chunk ms"))
+        phase_totals = self.get_phase_totals()
+        for name in BUILD_PHASES:
+            share = phase_totals[name] / total_sec * 100 if total_sec else 0.0
+            per_chunk = phase_totals[name] / len(chunks) if chunks else 0.0
+            lines.append("  %-14s %12.1f %7.1f%% %14.2f" % (name, phase_totals[name] * 1000, share, per_chunk * 1000))
+
+        lines.append("")
+        lines.append("Objects:")
+        lines.append("  %-20s %10s %10s" % ("object", "total", "per chunk"))
+        count_totals = self.get_count_totals()
+        for name in BUILD_OBJECTS:
+            per_chunk = float(count_totals[name]) / len(chunks) if chunks else 0.0
+            lines.append("  %-20s %10d %10.1f" % (name, count_totals[name], per_chunk))
+
+        lines.append("")
+        lines.append("Cost per object:")
+        lines.append("  %-14s %-20s %10s" % ("phase", "object", "ms each"))
+        for phase, name, seconds in self.get_object_costs():
+            lines.append("  %-14s %-20s %10.3f" % (phase, name, seconds * 1000))
+
+        lines.append("")
+        lines.append("Slowest chunks:")
+        lines.append("  %8s %10s %8s  %s" % ("chunk", "total ms", "words", "slowest phase"))
+        for chunk in self.get_slowest_chunks():
+            slowest_phase = max(BUILD_PHASES, key=chunk.get_phase_sec)
+            lines.append("  %8s %10.1f %8d  %s (%.1f ms)%s" % (chunk.number, chunk.total_sec * 1000,
+                                                             chunk.counts.get(BUILD_OBJECT_WORDS, 0), slowest_phase,
+                                                             chunk.get_phase_sec(slowest_phase) * 1000,
+                                                             ", cached layout" if chunk.is_layout_cached else ""))
+        return "\n".join(lines)
+
+    def to_dict(self):
+        chunks = list(self.chunks)
+        return {"phase_totals_sec": self.get_phase_totals(), "count_totals": self.get_count_totals(),
+                "object_costs_sec": [{"phase": phase, "object": name, "sec": seconds}
+                                     for phase, name, seconds in self.get_object_costs()],
+                "chunks": [chunk.to_dict() for chunk in chunks]}
@@ -0,0 +1,212 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Calibration of the settings that depend on the speed of the machine. A part is built from synthetic text, played
+# for a number of ticks (the player runs and jumps around) and rendered with every strategy, without any window. The
+# costs are measured per line of text, as the number of objects a tick and a render go through grows with the lines
+# of a part. Drawing of the rendered text by Tk is not measured, a share of the frame is left to it instead.
+
+import math
+import random
+import time
+
+from constants import *
+from logic import Gameplay
+
+CALIBRATION_LINES = 40              # lines of synthetic text the measured part is built from
+CALIBRATION_LINE_LENGTH = 70        # approximate length of those lines
+CALIBRATION_TICKS = 60              # ticks the part is played for
+CALIBRATION_RENDERS = 20            # renders of the part with each strategy
+CALIBRATION_VISIBLE_COLUMNS = 120   # columns rendered, about as many as the game area shows
+CALIBRATION_SEED = 0                # synthetic text is the same on every run
+FRAME_BUDGET_SHARE = 0.5            # share of the game loop interval a tick and a render may take, the rest is Tk's
+BUILD_BUDGET_SEC = 0.5              # max time of building a part (the game waits for the starting part)
+MIN_LINES_PER_CHUNK = 5
+MAX_LINES_PER_CHUNK = CALIBRATION_LINES  # costs are not extrapolated beyond the measured part
+LINES_PER_CHUNK_STEP = 5
+MAX_INTERVAL_MS = 250               # the game is not slowed down more than that, however slow the machine is
+# Arguments the measured part is built with (defaults of the new game dialog), see Controller.gameplay_build_args
+CALIBRATION_BUILD_ARGS = (1, 30, 4, 4, 5, 3, 15, 3, 3)
+
+# Words of synthetic text: common ones (some of them have meanings in game content) and punctuation
+CALIBRATION_WORDS = ("the", "a", "and", "of", "to", "in", "is", "it", "that", "was", "he", "for", "on", "are", "with",
+                     "as", "his", "they", "be", "at", "one", "have", "this", "from", "or", "had", "by", "word", "but",
+                     "what", "some", "we", "can", "out", "other", "were", "all", "there", "when", "up", "use", "your",
+                     "how", "said", "an", "each", "she", "which", "do", "their", "time", "if", "will", "way", "about",
+                     "many", "then", "them", "write", "would", "like", "so", "these", "her", "long", "make", "thing",
+                     "see", "him", "two", "has", "look", "more", "day", "could", "go", "come", "did", "number", "sound",
+                     "no", "most", "people", "my", "over", "know", "water", "than", "call", "first", "who", "may",
+                     "down", "side", "been", "now", "find", "gun", "bomb", "shield", "sheriff", "horse", "sun", "noon")
+
+
+def generate_calibration_lines(lines_count=CALIBRATION_LINES, line_length=CALIBRATION_LINE_LENGTH,
+                               seed=CALIBRATION_SEED):
+    """
+    :return: list of lines of synthetic text, the same ones for the same arguments
+    """
+    random_generator = random.Random(seed)
+    lines = []
+    for i in range(0, lines_count):
+        words = []
+        length = 0
+        while length < line_length:
+            word = random_generator.choice(CALIBRATION_WORDS)
+            if random_generator.random() < 0.1:
+                word += random_generator.choice(PUNCTUATION_MARKS)
+            words.append(word)
+            length += len(word) + 1
+        lines.append(u" ".join(words) + u"\n")
+    return lines
+
+
+class CalibrationController(object):
+    """
+    Stand-in of Controller the measured part is played with: there is no window, and the player never leaves the part
+    """
+    def __init__(self, content):
+        self.content = content
+        self.commands = {CMD_LEFT: False, CMD_RIGHT: False, CMD_UP: False, CMD_DOWN: False,
+                         CMD_TRANSFORM: False, CMD_1: False, CMD_2: False, CMD_3: False, CMD_4: False, CMD_5: False,
+                         CMD_6: False, CMD_7: False, CMD_8: False, CMD_9: False, CMD_0: False}
+        self.gameplay = None
+        self.is_finished = False  # the player has died or reached the finish, the part has to be built again
+
+    def construct_gui_actions_list(self, command_action_map):
+        pass
+
+    def set_inventory_string(self, inventory_string):
+        pass
+
+    def choose_word_id_from_list(self, word_texts_list):
+        return 0
+
+    def show_message(self, text):
+        pass
+
+    def finish_game(self, success, is_tutorial=False):
+        self.is_finished = True
+
+    def activate_gameplay(self, number, player):
+        # The player falls through the part once again
+        player.move_to_another_gameplay(self.gameplay, player.x, 0)
+
+
+class CalibrationResult(object):
+    """
+    Costs measured by calibrate and the settings chosen from them
+    """
+    def __init__(self):
+        self.build_sec_per_line = 0.0
+        self.tick_sec_per_line = 0.0
+        self.render_sec_per_line = {}   # {render mode: seconds}
+        self.render_mode = RENDER_MODE_SLICING
+        self.lines_per_chunk = DEFAULT_LINES_PER_CHUNK
+        self.interval_ms = DEFAULT_INTERVAL_MS
+
+    def get_frame_sec(self, lines_count):
+        """
+        :return: estimated time of a tick and a render of a part of the provided number of lines
+        """
+        return (self.tick_sec_per_line + self.render_sec_per_line.get(self.render_mode, 0.0)) * lines_count
+
+    def choose_settings(self):
+        """
+        Choose the fastest render mode, the largest number of lines per chunk that builds within the build budget and
+        plays within the frame budget of the default game speed, and the game loop interval a frame of such a part
+        fits in (the game is never made faster than the default speed)
+        """
+        if self.render_sec_per_line:
+            self.render_mode = min(self.render_sec_per_line, key=self.render_sec_per_line.get)
+        max_lines = MAX_LINES_PER_CHUNK
+        if self.build_sec_per_line > 0:
+            max_lines = min(max_lines, BUILD_BUDGET_SEC / self.build_sec_per_line)
+        frame_sec_per_line = self.get_frame_sec(1)
+        if frame_sec_per_line > 0:
+            max_lines = min(max_lines, DEFAULT_INTERVAL_MS / 1000.0 * FRAME_BUDGET_SHARE / frame_sec_per_line)
+        self.lines_per_chunk = max(MIN_LINES_PER_CHUNK, int(max_lines) // LINES_PER_CHUNK_STEP * LINES_PER_CHUNK_STEP)
+        needed_interval_ms = int(math.ceil(self.get_frame_sec(self.lines_per_chunk) * 1000 / FRAME_BUDGET_SHARE))
+        self.interval_ms = min(MAX_INTERVAL_MS, max(DEFAULT_INTERVAL_MS, needed_interval_ms))
+
+    def apply_to(self, settings):
+        """
+        Store the chosen settings (see Settings)
+        """
+        settings.lines_per_chunk = self.lines_per_chunk
+        settings.interval_ms = self.interval_ms
+        settings.render_mode = self.render_mode
+        settings.is_calibrated = True
+
+    def get_report(self):
+        """
+        :return: text to show to the player
+        """
+        rows = ["Build: %.1f ms per line" % (self.build_sec_per_line * 1000),
+                "Tick: %.2f ms per line" % (self.tick_sec_per_line * 1000)]
+        for render_mode in sorted(self.render_sec_per_line):
+            rows.append("Render (%s): %.2f ms per line" % (render_mode, self.render_sec_per_line[render_mode] * 1000))
+        rows.append("")
+        rows.append("Rows per chunk: %d" % self.lines_per_chunk)
+        rows.append("Game loop interval: %d ms (frame ~%.1f ms)" % (self.interval_ms,
+                                                                     self.get_frame_sec(self.lines_per_chunk) * 1000))
+        rows.append("Rendering: %s" % self.render_mode)
+        return "\n".join(rows)
+
+
+def calibrate(content, build_args=CALIBRATION_BUILD_ARGS):
+    """
+    Measure build, tick and render costs of a part built from synthetic text and choose the settings from them.
+    :param content: game content (see content module)
+    :param build_args: arguments parts are built with, see Controller.gameplay_build_args
+    :return: CalibrationResult
+    """
+    result = CalibrationResult()
+    lines = generate_calibration_lines()
+    controller = CalibrationController(content)
+
+    def build():
+        # The player is placed in the first part
+        controller.is_finished = False
+        controller.gameplay = Gameplay(controller, FIRST_GAMEPLAY_SEQUENCE_NUM, lines, *build_args,
+                                       is_first_gameplay=True)
+        controller.gameplay.is_running = True
+
+    start_time = time.time()
+    build()
+    result.build_sec_per_line = (time.time() - start_time) / len(lines)
+
+    # The player runs to the right and back, jumping every few ticks. Rebuilding is not measured.
+    tick_sec = 0.0
+    for tick in range(0, CALIBRATION_TICKS):
+        if controller.is_finished:
+            build()
+        controller.commands[CMD_RIGHT] = (tick < CALIBRATION_TICKS // 2)
+        controller.commands[CMD_LEFT] = not controller.commands[CMD_RIGHT]
+        controller.commands[CMD_UP] = (tick % 4 == 0)  # jump
+        start_time = time.time()
+        controller.gameplay.update(controller.commands)
+        tick_sec += time.time() - start_time
+    result.tick_sec_per_line = tick_sec / CALIBRATION_TICKS / len(lines)
+
+    for render_mode in (RENDER_MODE_SLICING, RENDER_MODE_PADDING):
+        start_time = time.time()
+        for i in range(0, CALIBRATION_RENDERS):
+            controller.gameplay.render(0, CALIBRATION_VISIBLE_COLUMNS, render_mode)
+        result.render_sec_per_line[render_mode] = (time.time() - start_time) / CALIBRATION_RENDERS / len(lines)
+
+    result.choose_settings()
+    return result
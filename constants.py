@@ -27,6 +27,20 @@ ACTION_FUNCTION = 1
 HIDE_X = 30  # used for Poolables in order to hide outside the "viewport"
 HIDE_Y = 1
 FIRST_GAMEPLAY_SEQUENCE_NUM = 1
+DEFAULT_JUMP_POWER = 2  # number of jump stages of game objects (see Trick), each one lifts an object by a row
+DEFAULT_WRAP_COLUMN = 0  # longer text lines are wrapped to several rows of a gameplay (0 - no wrapping)
+DEFAULT_SEED = 0  # seed of random numbers levels are built with, the same file and seed give the same levels
+# Independent streams of random numbers (see logic.create_random)
+RANDOM_STREAM_COINS = "coins"
+RANDOM_STREAM_FINISH = "finish"
+DEFAULT_INTERVAL_MS = 100  # game loop interval the game is designed for (speed of the game)
+DEFAULT_LINES_PER_CHUNK = 10  # lines of text per part of a game
+SETTINGS_FILE_NAME = "settings.txt"
+FIRST_RUN_CALIBRATION_DELAY_MS = 1000  # settings are calibrated that long after the window of the first run is shown
+
+# Strategies of composing the visible part of a gameplay (see Gameplay.render), chosen by calibration
+RENDER_MODE_SLICING = "slicing"  # every row is a string, object lines are sliced into it
+RENDER_MODE_PADDING = "padding"  # every row is a list of object lines padded with predefined empty strings
 
 # Commands
 CMD_JUMP = 100
@@ -0,0 +1,513 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Access to game content stored in the database (word meanings and everything they consist of).
+# Game logic works with content through ContentStore: an in-memory snapshot of the whole content, read once and then
+# served without touching the database (see its get_meaning_records, get_action and get_changes methods).
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from operator import itemgetter
+
+from constants import *
+from game_object_components import Action, Changes, CHANGES_COLUMNS
+from phrases import PhraseAutomaton
+from tokenizer import get_tokenizer
+
+# Command numbers in the order of words.command_N_action_id columns
+COMMAND_NUMBERS = (CMD_1, CMD_2, CMD_3, CMD_4, CMD_5, CMD_6, CMD_7, CMD_8, CMD_9, CMD_0)
+
+DEFAULT_MEANING_CACHE_SIZE = 10000
+
+# How often the database is checked for content changes made while the game is running
+CONTENT_CHECK_INTERVAL_SEC = 1.0
+
+
+class MeaningRecord(object):
+    """
+    Resolved meaning of a word text: lines, immediate changes and ids of actions. A single record is shared by all
+    words with the same text, so it must never be modified.
+    """
+    def __init__(self, lines, immediate_changes, action_ids):
+        """
+        :param lines: tuple of (left_text, left_x_offset, right_text, right_x_offset, y_offset, left_is_for_shooting,
+        right_is_for_shooting) ordered by y offset
+        :param immediate_changes: tuple of change values in the order of Changes.set_all_fields parameters (without
+        description), None if there is no meaning
+        :param action_ids: dictionary {command number: database id of the action}
+        """
+        self.lines = lines
+        self.immediate_changes = immediate_changes
+        self.action_ids = action_ids
+
+    def is_empty(self):
+        return not self.lines
+
+
+# Negative entry: the word has no meaning
+NO_MEANING = MeaningRecord((), None, {})
+
+
+class MeaningCache(object):
+    """
+    Process-wide LRU cache of meaning records keyed by (language id, lowercased text). Also keeps negative entries
+    (NO_MEANING) for words that have no meaning, as those are the majority of words in any text.
+    The cache is thread-safe, as parts are also built in the prebuild thread (see Controller).
+    """
+    def __init__(self, max_size=DEFAULT_MEANING_CACHE_SIZE):
+        """
+        :param max_size: max number of records kept in the cache (least recently used ones are evicted)
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, language_id, text):
+        """
+        Get cached record and mark it as the most recently used one.
+        :param language_id: database id of the language
+        :param text: lowercased text of the word
+        :return: MeaningRecord (NO_MEANING for negative entry), None if the text is not cached
+        """
+        key = (language_id, text)
+        with self._lock:
+            record = self._records.pop(key, None)
+            if record is None:
+                self.misses += 1
+                return None
+            self._records[key] = record
+            self.hits += 1
+        return record
+
+    def put(self, language_id, text, record):
+        key = (language_id, text)
+        with self._lock:
+            self._records.pop(key, None)
+            self._records[key] = record
+            self._evict()
+
+    def discard(self, language_id, text):
+        with self._lock:
+            self._records.pop((language_id, text), None)
+
+    def set_max_size(self, max_size):
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_statistics(self):
+        """
+        :return: dictionary of cache counters
+        """
+        with self._lock:
+            negative_count = sum(1 for record in self._records.itervalues() if record is NO_MEANING)
+        lookups = self.hits + self.misses
+        hit_ratio = 0.0
+        if lookups:
+            hit_ratio = float(self.hits) / lookups
+        return {"size": len(self._records), "max_size": self.max_size, "negative_entries": negative_count,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "hit_ratio": hit_ratio}
+
+    def _evict(self):
+        while len(self._records) > self.max_size:
+            self._records.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._records)
+
+
+# Shared by all gameplays of the process
+meaning_cache = MeaningCache()
+
+
+class ContentStore(object):
+    """
+    In-memory snapshot of the whole game content. Tables are read from the database once, in bulk, and all lookups
+    are then served from dictionaries without touching the database.
+    """
+    def __init__(self, db_connection=None, cache=None):
+        """
+        :param db_connection: database connection to load the content from. If None, the store is left empty.
+        :param cache: MeaningCache to keep materialized meaning records in, shared meaning_cache by default
+        """
+        self.cache = cache
+        if self.cache is None:
+            self.cache = meaning_cache
+        self.languages = {}         # {language id: name}
+        self.tokenizer_patterns = {}  # {language id: token pattern}, None - default one
+        self.words = {}             # {(language id, lowercased name): words row}, None rows when loaded from a pack
+        self.word_lines_ids = {}    # {word id: [lines id, ...]} (word_lines_map)
+        self.lines = {}             # {lines word map id: [lines row, ...]}
+        self.functions = {}         # {function id: lowercased name}
+        self.actions = {}           # {action id: Action}
+        self.changes = {}           # {changes id: Changes}
+        self.meaning_records = {}   # {(language id, lowercased name): MeaningRecord} prebuilt ones (content pack)
+        self.phrase_automatons = {}  # {language id: PhraseAutomaton}, built on first use
+        self.version = None         # see get_version, computed on first use
+
+        if db_connection:
+            self.load_from_db(db_connection)
+
+    def load_from_db(self, db_connection):
+        """
+        Read all content tables in bulk, replacing current content of the store.
+        :param db_connection: database connection
+        """
+        self._load_tables(db_connection)
+
+        # Records materialized from the previous content are not valid anymore
+        self.cache.clear()
+
+    def reload_from_db(self, db_connection):
+        """
+        Re-read content that has been changed in the database while the game is running. Action and Changes instances
+        that already exist are updated in place, so game objects holding them get new values without being rebuilt.
+        Only meaning records that have actually changed are dropped from the cache.
+        :param db_connection: database connection
+        :return: set of (language id, lowercased name) of words whose meaning has changed
+        """
+        old_records = self._get_all_meaning_records()
+        old_changes = self.changes
+        old_actions = self.actions
+        self._load_tables(db_connection)
+
+        for changes_id, changes in self.changes.iteritems():
+            if changes_id in old_changes:
+                old_changes[changes_id].set_all_fields_from_db_row(self._get_changes_row(changes))
+                self.changes[changes_id] = old_changes[changes_id]
+
+        for action_id, action in self.actions.iteritems():
+            if action_id in old_actions:
+                old_actions[action_id].set_all_fields(action.db_id, action.title, action.function_id,
+                                                      self.functions.get(action.function_id),
+                                                      action.self_changes, action.subject_changes)
+                action = old_actions[action_id]
+                self.actions[action_id] = action
+            action.self_changes = self.get_changes(action.self_changes.db_id)
+            action.subject_changes = self.get_changes(action.subject_changes.db_id)
+
+        new_records = self._get_all_meaning_records()
+        changed_keys = set()
+        for key in set(old_records) | set(new_records):
+            old_record = old_records.get(key, NO_MEANING)
+            new_record = new_records.get(key, NO_MEANING)
+            if (old_record.lines, old_record.immediate_changes, old_record.action_ids) != \
+                    (new_record.lines, new_record.immediate_changes, new_record.action_ids):
+                changed_keys.add(key)
+                self.cache.discard(key[0], key[1])
+        return changed_keys
+
+    def _load_tables(self, db_connection):
+        cursor = db_connection.cursor()
+
+        self.languages = {}
+        self.tokenizer_patterns = {}
+        cursor.execute("select id, name, tokenizer_pattern from languages")
+        for db_row in cursor.fetchall():
+            self.languages[db_row[0]] = db_row[1]
+            self.tokenizer_patterns[db_row[0]] = db_row[2]
+
+        self.changes = {}
+        cursor.execute("select " + CHANGES_COLUMNS + " from changes ch")
+        for db_row in cursor.fetchall():
+            changes = Changes()
+            changes.set_all_fields_from_db_row(db_row)
+            self.changes[changes.db_id] = changes
+
+        self.functions = {}
+        cursor.execute("select id, lower(name) from functions")
+        for db_row in cursor.fetchall():
+            self.functions[db_row[0]] = db_row[1]
+
+        self.actions = {}
+        cursor.execute("select id, title, function_id, self_changes_id, subject_changes_id from actions")
+        for db_row in cursor.fetchall():
+            action = Action()
+            action.set_all_fields(db_row[0], db_row[1], db_row[2], self.functions.get(db_row[2]),
+                                  self.get_changes(db_row[3]), self.get_changes(db_row[4]))
+            self.actions[action.db_id] = action
+
+        self.words = {}
+        cursor.execute("select id, lower(name), language_id, immediate_changes_id, "
+                       "command_1_action_id, command_2_action_id, command_3_action_id, command_4_action_id, "
+                       "command_5_action_id, command_6_action_id, command_7_action_id, command_8_action_id, "
+                       "command_9_action_id, command_0_action_id "
+                       "from words")
+        for db_row in cursor.fetchall():
+            self.words[(db_row[2], db_row[1])] = db_row
+
+        self.word_lines_ids = {}
+        cursor.execute("select word_id, lines_id from word_lines_map")
+        for db_row in cursor.fetchall():
+            self.word_lines_ids.setdefault(db_row[0], []).append(db_row[1])
+
+        self.lines = {}
+        cursor.execute("select word_map_id, left_text, left_x_offset, right_text, right_x_offset, y_offset, "
+                       "left_is_for_shooting > 0, right_is_for_shooting > 0 "
+                       "from lines "
+                       "order by y_offset")
+        for db_row in cursor.fetchall():
+            self.lines.setdefault(db_row[0], []).append(db_row[1:])
+
+        self.meaning_records = {}
+        self.phrase_automatons = {}
+        self.version = None
+
+    def get_meaning_records(self, language_id, texts):
+        """
+        Get meaning records of all provided texts.
+        :param language_id: database id of the language
+        :param texts: iterable of word texts (case does not matter, duplicates are allowed)
+        :return: dictionary {lowercased text: MeaningRecord}, NO_MEANING for texts that have no meaning
+        """
+        result = {}
+        for text in set(text.lower() for text in texts):
+            record = self.cache.get(language_id, text)
+            if record is None:
+                record = self._create_meaning_record(language_id, text)
+                self.cache.put(language_id, text, record)
+            result[text] = record
+        return result
+
+    def get_action(self, action_id):
+        """
+        Get shared Action instance, which must not be modified.
+        :param action_id: database id of the action
+        :return: Action, None if there is no such action
+        """
+        return self.actions.get(action_id)
+
+    def get_changes(self, changes_id):
+        """
+        Get shared Changes instance, which must not be modified.
+        :param changes_id: database id of the changes
+        :return: Changes (empty changes if there are no changes with such id)
+        """
+        changes = self.changes.get(changes_id)
+        if changes is None:
+            changes = Changes()
+        return changes
+
+    def get_tokenizer_pattern(self, language_id):
+        """
+        :param language_id: database id of the language
+        :return: token pattern of the language, None if the default one is used
+        """
+        return self.tokenizer_patterns.get(language_id)
+
+    def get_phrase_automaton(self, language_id):
+        """
+        :param language_id: database id of the language
+        :return: PhraseAutomaton of all words of the language consisting of several tokens
+        """
+        automaton = self.phrase_automatons.get(language_id)
+        if automaton is None:
+            texts = set(key[1] for key in self.words if key[0] == language_id)
+            texts.update(key[1] for key in self.meaning_records if key[0] == language_id)
+            automaton = PhraseAutomaton(get_tokenizer(language_id, self.get_tokenizer_pattern(language_id)), texts)
+            self.phrase_automatons[language_id] = automaton
+        return automaton
+
+    def get_version(self):
+        """
+        :return: hex digest of the whole content, changes whenever the content does (i.e. after a reload)
+        """
+        if self.version is None:
+            digest = hashlib.sha1()
+            pack_data = self.get_pack_data()
+            for name in sorted(pack_data):
+                digest.update(name)
+                digest.update(repr(sorted(pack_data[name].iteritems() if isinstance(pack_data[name], dict)
+                                          else pack_data[name])))
+            self.version = digest.hexdigest()
+        return self.version
+
+    def _create_meaning_record(self, language_id, text):
+        """
+        Materialize meaning record of a single word from the snapshot tables.
+        :param language_id: database id of the language
+        :param text: lowercased text of the word
+        :return: MeaningRecord, NO_MEANING if the word has no meaning
+        """
+        record = self.meaning_records.get((language_id, text))
+        if record is not None:
+            return record
+
+        word_row = self.words.get((language_id, text))
+        if (not word_row or language_id not in self.languages or word_row[3] not in self.changes
+                or word_row[0] not in self.word_lines_ids):
+            return NO_MEANING
+
+        lines = []
+        for lines_id in self.word_lines_ids[word_row[0]]:
+            lines.extend(self.lines.get(lines_id, ()))
+        if not lines:
+            return NO_MEANING
+        lines.sort(key=itemgetter(4))  # order by y offset
+
+        changes = self.changes[word_row[3]]
+        immediate_changes = (changes.health_change, changes.is_health_change_value_absolute > 0,
+                             changes.x_energy_change, changes.is_x_energy_change_value_absolute > 0,
+                             changes.y_energy_change, changes.is_y_energy_change_value_absolute > 0,
+                             changes.jump_power_change, changes.is_jump_power_change_value_absolute > 0,
+                             changes.capacity_change, changes.is_capacity_change_value_absolute > 0,
+                             changes.bullets_change, changes.is_bullets_change_value_absolute > 0,
+                             changes.coins_change, changes.is_coins_change_value_absolute > 0)
+        action_ids = {}
+        for command_number, col_id in zip(COMMAND_NUMBERS, range(4, 14)):
+            if word_row[col_id]:
+                action_ids[command_number] = word_row[col_id]
+
+        return MeaningRecord(tuple(lines), immediate_changes, action_ids)
+
+    def get_pack_data(self):
+        """
+        Denormalize the content for a content pack: meaning records of all words are built in advance, so that the
+        pack can be loaded without any database tables.
+        :return: dictionary of built-in types only (suitable for marshal)
+        """
+        meanings = {}
+        for key, record in self._get_all_meaning_records().iteritems():
+            meanings[key] = (record.lines, record.immediate_changes, record.action_ids)
+
+        changes_rows = []
+        for changes in self.changes.itervalues():
+            changes_rows.append(self._get_changes_row(changes))
+
+        actions_rows = []
+        for action in self.actions.itervalues():
+            actions_rows.append((action.db_id, action.title, action.function_id, action.self_changes.db_id,
+                                 action.subject_changes.db_id))
+
+        # Words without meaning still make phrases (see get_phrase_automaton), so all names are kept
+        word_keys = sorted(self.words)
+
+        return {"languages": self.languages, "tokenizer_patterns": self.tokenizer_patterns,
+                "functions": self.functions, "changes": changes_rows,
+                "actions": actions_rows, "meanings": meanings, "word_keys": word_keys}
+
+    def load_from_pack_data(self, pack_data):
+        """
+        Replace current content of the store with the content of a content pack.
+        :param pack_data: dictionary returned by get_pack_data
+        """
+        self.languages = pack_data["languages"]
+        self.tokenizer_patterns = pack_data["tokenizer_patterns"]
+        self.functions = pack_data["functions"]
+        # Rows are not needed, meanings of the words are in the meaning records already
+        self.words = dict.fromkeys(tuple(key) for key in pack_data["word_keys"])
+        self.word_lines_ids = {}
+        self.lines = {}
+
+        self.changes = {}
+        for db_row in pack_data["changes"]:
+            changes = Changes()
+            changes.set_all_fields_from_db_row(db_row)
+            self.changes[changes.db_id] = changes
+
+        self.actions = {}
+        for db_row in pack_data["actions"]:
+            action = Action()
+            action.set_all_fields(db_row[0], db_row[1], db_row[2], self.functions.get(db_row[2]),
+                                  self.get_changes(db_row[3]), self.get_changes(db_row[4]))
+            self.actions[action.db_id] = action
+
+        self.meaning_records = {}
+        for key, (lines, immediate_changes, action_ids) in pack_data["meanings"].iteritems():
+            self.meaning_records[key] = MeaningRecord(lines, immediate_changes, action_ids)
+        self.phrase_automatons = {}
+        self.version = None
+
+        self.cache.clear()
+
+    def _get_all_meaning_records(self):
+        """
+        :return: dictionary {(language id, lowercased name): MeaningRecord} of all words that have meaning
+        """
+        records = dict(self.meaning_records)
+        for key in self.words:
+            record = self._create_meaning_record(key[0], key[1])
+            if not record.is_empty():
+                records[key] = record
+        return records
+
+    @staticmethod
+    def _get_changes_row(changes):
+        """
+        :param changes: Changes
+        :return: tuple of values in the order of CHANGES_COLUMNS
+        """
+        return (changes.health_change, changes.is_health_change_value_absolute,
+                changes.x_energy_change, changes.is_x_energy_change_value_absolute,
+                changes.y_energy_change, changes.is_y_energy_change_value_absolute,
+                changes.jump_power_change, changes.is_jump_power_change_value_absolute,
+                changes.capacity_change, changes.is_capacity_change_value_absolute,
+                changes.bullets_change, changes.is_bullets_change_value_absolute,
+                changes.coins_change, changes.is_coins_change_value_absolute,
+                changes.db_id, changes.description)
+
+
+class ContentWatcher(object):
+    """
+    Cheap detection of content changes in the database. Changes committed by other connections are reported by
+    "PRAGMA data_version", changes made through the watched connection itself (content editor) by its total_changes.
+    """
+    def __init__(self, db_connection, check_interval_sec=CONTENT_CHECK_INTERVAL_SEC):
+        """
+        :param db_connection: database connection to watch
+        :param check_interval_sec: min number of seconds between two checks of the database
+        """
+        self.db_connection = db_connection
+        self.check_interval_sec = check_interval_sec
+        self.last_check_time = time.time()
+        self.last_version = self._get_version()
+
+    def has_changed(self):
+        """
+        Check whether the database has been changed since the previous call. The database is not queried more often
+        than once per check interval, so the method can be called every frame.
+        :return: True if the content may have changed
+        """
+        now = time.time()
+        if now - self.last_check_time < self.check_interval_sec:
+            return False
+        self.last_check_time = now
+
+        version = self._get_version()
+        if version == self.last_version:
+            return False
+        self.last_version = version
+        return True
+
+    def _get_version(self):
+        return self.db_connection.execute("pragma data_version").fetchone()[0], self.db_connection.total_changes
@@ -0,0 +1,136 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Content pack: denormalized snapshot of the game content (see ContentStore.get_pack_data) stored as a single marshal
+# file next to the database. Loading the pack takes a single file read and no SQL, so it is used instead of reading
+# the database whenever the pack matches the database it was built from.
+# Build the pack before packaging the game (and after every change of the content):
+#     python content_pack.py [database file name] [pack file name]
+
+import hashlib
+import marshal
+import os
+import sqlite3
+import sys
+
+from content import ContentStore
+from migrations import apply_migrations
+
+# Increase whenever layout of the pack data changes, so that old packs are treated as stale
+CONTENT_PACK_FORMAT_VERSION = 3
+
+DB_FILE_NAME = "data.db"
+CONTENT_PACK_FILE_NAME = "data.pack"
+
+
+def get_resource_path(file_name):
+    """
+    Files shipped with the game are looked up in the folder of the game rather than in the current working directory.
+    :param file_name: name of the file relative to the game folder
+    :return: absolute path of the file
+    """
+    if getattr(sys, "frozen", False):
+        # PyInstaller unpacks bundled files to sys._MEIPASS (one-file mode), otherwise they are next to the executable
+        base_path = getattr(sys, "_MEIPASS", os.path.dirname(sys.executable))
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, file_name)
+
+
+def get_content_hash(db_file_name):
+    """
+    :param db_file_name: database file name
+    :return: hex digest of the database file contents
+    """
+    with open(db_file_name, "rb") as db_file:
+        return hashlib.sha1(db_file.read()).hexdigest()
+
+
+def build_content_pack(db_file_name, pack_file_name):
+    """
+    Build content pack from the database. Migrations are applied to the database beforehand, so that the game does
+    not modify the database (and thus make the pack stale) at startup.
+    :param db_file_name: database file name
+    :param pack_file_name: content pack file name
+    :return: pack data that was written
+    """
+    db_connection = sqlite3.connect(db_file_name)
+    try:
+        apply_migrations(db_connection)
+        content = ContentStore(db_connection)
+    finally:
+        db_connection.close()
+
+    pack_data = content.get_pack_data()
+    pack_data["format_version"] = CONTENT_PACK_FORMAT_VERSION
+    pack_data["content_hash"] = get_content_hash(db_file_name)
+
+    # Write to a temporary file first, so that a failed build does not leave a broken pack behind
+    temp_file_name = pack_file_name + ".tmp"
+    with open(temp_file_name, "wb") as pack_file:
+        marshal.dump(pack_data, pack_file)
+    if os.path.exists(pack_file_name):
+        os.remove(pack_file_name)
+    os.rename(temp_file_name, pack_file_name)
+    return pack_data
+
+
+def load_content_pack(pack_file_name, content_hash):
+    """
+    :param pack_file_name: content pack file name
+    :param content_hash: hash of the database the pack must have been built from (see get_content_hash)
+    :return: ContentStore loaded from the pack, None if the pack is missing, unreadable or stale
+    """
+    try:
+        with open(pack_file_name, "rb") as pack_file:
+            pack_data = marshal.loads(pack_file.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(pack_data, dict) or pack_data.get("format_version") != CONTENT_PACK_FORMAT_VERSION
+            or pack_data.get("content_hash") != content_hash):
+        return None
+
+    content = ContentStore()
+    content.load_from_pack_data(pack_data)
+    return content
+
+
+def load_content(db_connection, db_file_name, pack_file_name):
+    """
+    Load game content from the content pack if it is up to date, otherwise from the database.
+    :param db_connection: connection to the database
+    :param db_file_name: database file name
+    :param pack_file_name: content pack file name
+    :return: ContentStore
+    """
+    content = load_content_pack(pack_file_name, get_content_hash(db_file_name))
+    if content is None:
+        apply_migrations(db_connection)
+        content = ContentStore(db_connection)
+    return content
+
+
+if __name__ == '__main__':
+    arg_db_file_name = DB_FILE_NAME
+    arg_pack_file_name = CONTENT_PACK_FILE_NAME
+    if len(sys.argv) > 1:
+        arg_db_file_name = sys.argv[1]
+    if len(sys.argv) > 2:
+        arg_pack_file_name = sys.argv[2]
+    built_pack_data = build_content_pack(arg_db_file_name, arg_pack_file_name)
+    print "Content pack " + arg_pack_file_name + " built: " + str(len(built_pack_data["meanings"])) + " meanings"
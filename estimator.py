@@ -0,0 +1,325 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Dry-run estimate of a game built from a file. The file is only sampled: its cached line index is used if there is
+# one, otherwise a few windows spread over the file (or the head of a compressed file) are read. A small part is then
+# built from the sampled lines and its figures are scaled to the whole file.
+
+import codecs
+import os
+import sys
+import time
+import types
+
+from constants import *
+from game_object_components import Action, Changes
+from ingest import (detect_compression, detect_encoding, get_campaign_file_names, is_campaign_path,
+                    iter_decoded_lines, open_binary_stream, COMPRESSION_NONE, DEFAULT_ENCODING)
+from line_index import LineIndex
+from logic import Gameplay
+
+SAMPLE_WINDOWS = 16             # number of places lines of a large file are sampled at
+SAMPLE_WINDOW_LINES = 64        # lines sampled at each place of an indexed file
+SAMPLE_WINDOW_SIZE = 16 * 1024  # bytes sampled at each place of a file without index
+SAMPLE_HEAD_SIZE = 256 * 1024   # files up to this size, compressed and UTF-16/32 ones are sampled from the start
+SAMPLE_CAMPAIGN_FILES = 16      # max number of files of a campaign that are sampled
+SAMPLE_BUILD_LINES = 40         # max number of lines of the part built to measure objects and build time
+SAMPLE_BUILD_LENGTH = 2048      # max number of characters of that part (lines may be very long)
+
+# Objects shared by all gameplays (game content) or not owned by them, not counted as gameplay memory
+SHARED_TYPES = (Action, Changes, type, types.ClassType, types.ModuleType, types.FunctionType, types.MethodType,
+                types.BuiltinFunctionType)
+
+
+class TextSample(object):
+    """
+    Lines sampled from a file (or from files of a campaign) and the (estimated) numbers of lines of the sampled files
+    """
+    def __init__(self, lines, lines_totals, is_exact, files_count=1):
+        """
+        :param lines: sampled lines
+        :param lines_totals: list of numbers of lines of every sampled file, None for files whose size is unknown
+        :param is_exact: numbers of lines are exact
+        :param files_count: number of files the sampled ones have been chosen from
+        """
+        self.lines = lines
+        self.lines_totals = lines_totals
+        self.is_exact = is_exact
+        self.files_count = files_count
+
+    def is_empty(self):
+        """
+        :return: True if there is no text at all, i.e. no files in the campaign or only empty files
+        """
+        return not self.files_count or (self.is_exact and all(lines_total == 0 for lines_total in self.lines_totals))
+
+    def get_parts_total(self, lines_per_chunk):
+        """
+        :param lines_per_chunk: number of lines per chunk
+        :return: (estimated) number of parts, None if unknown. Files of a campaign are chunked separately.
+        """
+        if not self.lines_totals or None in self.lines_totals:
+            return None
+        parts_total = sum((lines_total + lines_per_chunk - 1) // lines_per_chunk for lines_total in self.lines_totals)
+        return int(round(parts_total * self.files_count / float(len(self.lines_totals))))
+
+    def get_length_per_part(self, lines_per_chunk):
+        """
+        :param lines_per_chunk: number of lines per chunk
+        :return: average number of characters per part
+        """
+        lines_per_part = lines_per_chunk
+        parts_total = self.get_parts_total(lines_per_chunk)
+        if parts_total:
+            lines_per_part = sum(self.lines_totals) * self.files_count / float(len(self.lines_totals)) / parts_total
+        return lines_per_part * sum(len(line) for line in self.lines) / float(len(self.lines))
+
+
+class BuildEstimate(object):
+    """
+    Figures of a game predicted by estimate_build
+    """
+    def __init__(self):
+        self.parts_total = None     # None if unknown
+        self.is_empty = False       # there is no text to play
+        self.is_exact = False       # parts_total is exact
+        self.words_per_part = 0
+        self.coins_per_part = 0
+        self.enemies_per_part = 0
+        self.build_sec_per_part = 0.0
+        self.memory_per_part = 0    # bytes
+
+    def get_report(self):
+        """
+        :return: text to show to the player
+        """
+        if self.is_empty:
+            return "Parts: none (no text to play)"
+        approx = "" if self.is_exact else "~"
+        if self.parts_total is None:
+            rows = ["Parts: unknown"]
+        else:
+            rows = ["Parts: %s%d" % (approx, self.parts_total)]
+        rows.append("Per part: ~%d words, ~%d coins, ~%d enemies" % (self.words_per_part, self.coins_per_part,
+                                                                   self.enemies_per_part))
+        if self.parts_total is not None:
+            rows.append("Total: ~%d coins, ~%d enemies" % (self.coins_per_part * self.parts_total,
+                                                            self.enemies_per_part * self.parts_total))
+        build_time = "Build time: ~%.2f s per part" % self.build_sec_per_part
+        if self.parts_total is not None:
+            build_time += " (~%d s in total)" % round(self.build_sec_per_part * self.parts_total)
+        rows.append(build_time)
+        # The active part and the next one are kept in memory
+        rows.append("Memory: ~%.1f MB per part" % (self.memory_per_part / 1024.0 / 1024.0))
+        return "\n".join(rows)
+
+
+def get_deep_size(root, skipped_ids=()):
+    """
+    :param root: object
+    :param skipped_ids: ids of objects (and everything referenced by them only) not to count
+    :return: approximate number of bytes taken by the object and all objects it references, except SHARED_TYPES
+    """
+    seen_ids = set(skipped_ids)
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen_ids or isinstance(obj, SHARED_TYPES):
+            continue
+        seen_ids.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.iterkeys())
+            stack.extend(obj.itervalues())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if hasattr(obj, name):
+                    stack.append(getattr(obj, name))
+    return size
+
+
+def sample_text(path):
+    """
+    :param path: name of the (possibly compressed) text file, or a directory or a glob pattern for a campaign
+    :return: TextSample
+    """
+    if not is_campaign_path(path):
+        return sample_file(path)
+
+    file_names = get_campaign_file_names(path)
+    step = max(1, len(file_names) // SAMPLE_CAMPAIGN_FILES)
+    lines = []
+    lines_totals = []
+    is_exact = len(file_names) <= SAMPLE_CAMPAIGN_FILES
+    for file_name in file_names[::step][:SAMPLE_CAMPAIGN_FILES]:
+        try:
+            file_sample = sample_file(file_name)
+        except (IOError, OSError):
+            continue  # unreadable files are skipped by the campaign as well
+        lines.extend(file_sample.lines)
+        lines_totals.append(file_sample.lines_totals[0])
+        is_exact = is_exact and file_sample.is_exact
+    return TextSample(lines, lines_totals, is_exact, files_count=len(file_names))
+
+
+def sample_file(file_name):
+    """
+    :param file_name: name of the (possibly compressed) text file
+    :return: TextSample
+    """
+    compression = detect_compression(file_name)
+    file_size = os.path.getsize(file_name)
+    if compression == COMPRESSION_NONE:
+        with open(file_name, "rb") as f:
+            encoding = detect_encoding(f.read(4096))[0]
+        if encoding == DEFAULT_ENCODING:
+            try:
+                line_index = LineIndex(file_name, is_build_allowed=False)
+            except IOError:
+                line_index = None
+            if line_index:
+                try:
+                    return _sample_line_index(line_index)
+                finally:
+                    line_index.close()
+            if file_size > SAMPLE_HEAD_SIZE:
+                return _sample_windows(file_name, file_size)
+    return _sample_head(file_name, compression, file_size)
+
+
+def estimate_build(controller, text_sample, build_args, lines_per_chunk, wrap_column=0):
+    """
+    Build a small part from the sampled lines and scale its figures to the whole file.
+    :param controller: Controller (game content is taken from it)
+    :param text_sample: TextSample of the file
+    :param build_args: arguments parts are built with, see Controller.gameplay_build_args
+    :param lines_per_chunk: number of lines per chunk
+    :param wrap_column: see Gameplay
+    :return: BuildEstimate
+    """
+    estimate = BuildEstimate()
+    estimate.parts_total = text_sample.get_parts_total(lines_per_chunk)
+    estimate.is_exact = text_sample.is_exact
+    estimate.is_empty = text_sample.is_empty()
+    lines = text_sample.lines
+    if not lines or estimate.is_empty:
+        return estimate
+
+    # Lines are taken from all over the sample, the last one is cut if the part gets too long
+    build_lines_count = min(lines_per_chunk, SAMPLE_BUILD_LINES, len(lines))
+    build_lines = []
+    build_length = 0
+    for line in lines[::len(lines) // build_lines_count][:build_lines_count]:
+        build_lines.append(line[:SAMPLE_BUILD_LENGTH - build_length])
+        build_length += len(build_lines[-1])
+        if build_length >= SAMPLE_BUILD_LENGTH:
+            break
+    start_time = time.time()
+    gameplay = Gameplay(controller, FIRST_GAMEPLAY_SEQUENCE_NUM, build_lines, *build_args, is_first_gameplay=False,
+                        wrap_column=wrap_column)
+    build_sec = time.time() - start_time
+
+    scale = text_sample.get_length_per_part(lines_per_chunk) / max(1, build_length)
+    estimate.words_per_part = int(round(len(gameplay.words) * scale))
+    estimate.coins_per_part = int(round(len(gameplay.coins) * scale))
+    estimate.enemies_per_part = int(round(len(gameplay.enemies) * scale))
+    estimate.build_sec_per_part = build_sec * scale
+    estimate.memory_per_part = int(get_deep_size(gameplay, (id(controller), id(controller.content))) * scale)
+    return estimate
+
+
+def _sample_line_index(line_index):
+    """
+    :param line_index: LineIndex of the file
+    :return: TextSample of lines taken at evenly spread places of the file
+    """
+    line_count = line_index.line_count
+    if line_count <= SAMPLE_WINDOWS * SAMPLE_WINDOW_LINES:
+        return TextSample(line_index.get_lines(0, line_count), [line_count], True)
+    lines = []
+    for i in range(SAMPLE_WINDOWS):
+        start = line_count * i // SAMPLE_WINDOWS
+        lines.extend(line_index.get_lines(start, start + SAMPLE_WINDOW_LINES))
+    return TextSample(lines, [line_count], True)
+
+
+def _sample_windows(file_name, file_size):
+    """
+    :param file_name: name of a large plain UTF-8 file
+    :param file_size: size of the file
+    :return: TextSample of complete lines found in windows at evenly spread places of the file. Number of lines is
+    estimated by the density of line breaks in the windows.
+    """
+    lines = []
+    line_breaks_count = 0
+    with open(file_name, "rb") as f:
+        for i in range(SAMPLE_WINDOWS):
+            f.seek((file_size - SAMPLE_WINDOW_SIZE) * i // (SAMPLE_WINDOWS - 1))
+            window = f.read(SAMPLE_WINDOW_SIZE)
+            line_breaks_count += window.count("\n")
+            if i == 0 and window.startswith(codecs.BOM_UTF8):
+                window = window[len(codecs.BOM_UTF8):]
+            # Lines cut by the window borders are dropped (the first line of the file is complete though)
+            start = 0 if i == 0 else window.find("\n") + 1
+            end = window.rfind("\n") + 1
+            if end > start:
+                text = window[start:end].decode("utf-8", "replace").replace(u"\r\n", u"\n")
+                lines.extend(line + u"\n" for line in text[:-1].split(u"\n"))
+    if not lines:
+        # Lines are longer than the windows, a piece of the first one stands in for them
+        lines.append(window.decode("utf-8", "replace"))
+    lines_total = max(1, int(round(line_breaks_count * file_size / float(SAMPLE_WINDOWS * SAMPLE_WINDOW_SIZE))))
+    return TextSample(lines, [lines_total], False)
+
+
+def _sample_head(file_name, compression, file_size):
+    """
+    :param file_name: name of the file
+    :param compression: COMPRESSION_* value
+    :param file_size: size of the file
+    :return: TextSample of the first lines of the file. Number of lines is exact if the whole file fits the sample,
+    estimated by the sample size for uncompressed files and unknown for compressed ones otherwise.
+    """
+    lines = []
+    sampled_length = 0
+    is_complete = True
+    stream = open_binary_stream(file_name, compression)
+    try:
+        for line in iter_decoded_lines(stream, SAMPLE_WINDOW_SIZE):
+            lines.append(line)
+            sampled_length += len(line)
+            if sampled_length >= SAMPLE_HEAD_SIZE:
+                is_complete = False
+                break
+    finally:
+        stream.close()
+
+    if is_complete:
+        return TextSample(lines, [len(lines)], True)
+    lines_total = None
+    if compression == COMPRESSION_NONE:
+        with open(file_name, "rb") as f:
+            encoding, bom_length = detect_encoding(f.read(4096))
+        sampled_size = bom_length + len(u"".join(lines).encode(encoding))
+        lines_total = int(round(len(lines) * file_size / float(sampled_size)))
+    return TextSample(lines, [lines_total], False)
@@ -19,14 +19,22 @@
 import functions
 
 
+# Columns of a single changes row, as expected by Changes.set_all_fields_from_db_row
+CHANGES_COLUMNS = ("ch.health, ch.is_health_absolute, ch.x_energy, ch.is_x_energy_absolute, "
+                   "ch.y_energy, ch.is_y_energy_absolute, ch.jump_power, ch.is_jump_power_absolute, "
+                   "ch.capacity, ch.is_capacity_absolute, ch.bullets, ch.is_bullets_absolute, "
+                   "ch.coins, ch.is_coins_absolute, ch.id, ch.comments")
+
+
 class Action(object):
     """
     self_changes - changes of attributes of self when action is executed
     subject_changes - changes of attributes of subject (game object upon which the action is executed)
     """
-    def __init__(self, db_connection, db_pk_id):
+    def __init__(self, db_connection=None, db_pk_id=None):
         """
-        Create new action by setting the fields from database
+        Create new action by setting the fields from database. If no database connection is provided, an empty action
+        is created, which is then filled by set_all_fields method.
         :param db_connection: database connection
         :param db_pk_id: database id of the action
         """
@@ -36,29 +44,44 @@ class Action(object):
         self.subject_changes = Changes()
         self.execute = None
         self.function_id = -1
+
+        if not db_connection:
+            return
+
         cursor = db_connection.cursor()
 
-        # Action header info
-        cursor.execute("select a.title, a.function_id, lower(f.name) " +
-                       "from actions a, functions f " +
-                       "where a.function_id = f.id and a.id = ?",
+        # Action header info, self changes and subject changes
+        cursor.execute("select a.title, a.function_id, lower(f.name), a.self_changes_id, a.subject_changes_id " +
+                       "from actions a left join functions f on a.function_id = f.id " +
+                       "where a.id = ?",
                        (db_pk_id,))
         db_rows = cursor.fetchall()
 
         if db_rows:
-            self.title = db_rows[0][0]
-            self.function_id = db_rows[0][1]
-            self.execute = getattr(functions, db_rows[0][2])
-
-        # Self changes and Subject changes
-        cursor.execute("select a.self_changes_id, a.subject_changes_id " +
-                       "from actions a " +
-                       "where a.id = ? ", (db_pk_id,))
-        db_rows = cursor.fetchall()
+            self_changes = Changes()
+            self_changes.set_all_fields_from_db(db_connection, change_pk_id=db_rows[0][3])
+            subject_changes = Changes()
+            subject_changes.set_all_fields_from_db(db_connection, change_pk_id=db_rows[0][4])
+            self.set_all_fields(db_pk_id, db_rows[0][0], db_rows[0][1], db_rows[0][2], self_changes, subject_changes)
 
-        if db_rows:
-            self.self_changes.set_all_fields_from_db(db_connection, change_pk_id=db_rows[0][0])
-            self.subject_changes.set_all_fields_from_db(db_connection, change_pk_id=db_rows[0][1])
+    def set_all_fields(self, db_pk_id, title, function_id, function_name, self_changes, subject_changes):
+        """
+        Set all fields of the action.
+        :param db_pk_id: database id of the action
+        :param title: action title
+        :param function_id: database id of the function
+        :param function_name: name of the function from functions module (lowercase), None if there is no function
+        :param self_changes: Changes
+        :param subject_changes: Changes
+        """
+        self.db_id = db_pk_id
+        self.title = title
+        self.function_id = function_id
+        self.execute = None
+        if function_name:
+            self.execute = getattr(functions, function_name)
+        self.self_changes = self_changes
+        self.subject_changes = subject_changes
 
     def __repr__(self):
         return self.title
@@ -68,6 +91,13 @@ class Changes(object):
     """
     List of changes to attributes of a game object. Contained by word meaning.
     """
+    # Every word meaning has its own Changes, so these have no __dict__ (see logic.GameObject)
+    __slots__ = ("db_id", "description", "health_change", "is_health_change_value_absolute", "x_energy_change",
+                 "is_x_energy_change_value_absolute", "y_energy_change", "is_y_energy_change_value_absolute",
+                 "jump_power_change", "is_jump_power_change_value_absolute", "capacity_change",
+                 "is_capacity_change_value_absolute", "bullets_change", "is_bullets_change_value_absolute",
+                 "coins_change", "is_coins_change_value_absolute")
+
     def __init__(self, description=None,
                  health_change=0, is_health_change_value_absolute=False,
                  x_energy_change=0, is_x_energy_change_value_absolute=False,
@@ -136,34 +166,38 @@ class Changes(object):
         cursor = db_connection.cursor()
 
         # Action header info
-        cursor.execute("select ch.health, ch.is_health_absolute, ch.x_energy, ch.is_x_energy_absolute, " +
-                       "ch.y_energy, ch.is_y_energy_absolute, ch.jump_power, ch.is_jump_power_absolute, " +
-                       "ch.capacity, ch.is_capacity_absolute, ch.bullets, ch.is_bullets_absolute, " +
-                       "ch.coins, ch.is_coins_absolute, ch.id, ch.comments " +
+        cursor.execute("select " + CHANGES_COLUMNS + " " +
                        "from changes ch " +
                        "where ch.id = ?",
                        (change_pk_id,))
         db_rows = cursor.fetchall()
 
         if db_rows:
-            self.db_id = db_rows[0][14]
-            self.set_all_fields(
-                description=db_rows[0][15],
-                health_change=db_rows[0][0],
-                is_health_change_value_absolute=db_rows[0][1],
-                x_energy_change=db_rows[0][2],
-                is_x_energy_change_value_absolute=db_rows[0][3],
-                y_energy_change=db_rows[0][4],
-                is_y_energy_change_value_absolute=db_rows[0][5],
-                jump_power_change=db_rows[0][6],
-                is_jump_power_change_value_absolute=db_rows[0][7],
-                capacity_change=db_rows[0][8],
-                is_capacity_change_value_absolute=db_rows[0][9],
-                bullets_change=db_rows[0][10],
-                is_bullets_change_value_absolute=db_rows[0][11],
-                coins_change=db_rows[0][12],
-                is_coins_change_value_absolute=db_rows[0][13]
-            )
+            self.set_all_fields_from_db_row(db_rows[0])
+
+    def set_all_fields_from_db_row(self, db_row):
+        """
+        Set values of Changes object from already fetched database row.
+        :param db_row: row containing CHANGES_COLUMNS
+        """
+        self.db_id = db_row[14]
+        self.set_all_fields(
+            description=db_row[15],
+            health_change=db_row[0],
+            is_health_change_value_absolute=db_row[1],
+            x_energy_change=db_row[2],
+            is_x_energy_change_value_absolute=db_row[3],
+            y_energy_change=db_row[4],
+            is_y_energy_change_value_absolute=db_row[5],
+            jump_power_change=db_row[6],
+            is_jump_power_change_value_absolute=db_row[7],
+            capacity_change=db_row[8],
+            is_capacity_change_value_absolute=db_row[9],
+            bullets_change=db_row[10],
+            is_bullets_change_value_absolute=db_row[11],
+            coins_change=db_row[12],
+            is_coins_change_value_absolute=db_row[13]
+        )
 
     def can_apply_health_change_to_object(self, game_object):
         return ((not self.is_health_change_value_absolute and game_object.health + self.health_change >= 0)
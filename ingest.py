@@ -0,0 +1,484 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Ingest of text files the game is played on. Plain UTF-8 files are read via LineIndex (random access to any chunk);
+# compressed (.gz, .bz2, .xz) and UTF-16/UTF-32 files are streamed: decompressed and decoded in large blocks, every
+# byte exactly once, and split to chunks on the fly. Both kinds of sources provide chunks of decoded lines via
+# get_chunk. A growing file (i.e. a log being written) can be followed via FollowTextSource, files of a directory (or
+# matching a glob pattern) can be played one after another via CampaignTextSource.
+
+import bz2
+import codecs
+import glob
+import gzip
+import os
+import time
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None  # .xz files are not supported then
+
+from line_index import LineIndex
+
+STREAM_BLOCK_SIZE = 1024 * 1024  # bytes read (and decoded) at once
+
+# Followed files
+FOLLOW_POLL_INTERVAL_SEC = 1.0  # how often size of the file is checked
+FOLLOW_QUIET_SEC = 30.0         # file is considered finished when it has not grown for that long
+
+COMPRESSION_NONE = None
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_BZIP2 = "bzip2"
+COMPRESSION_XZ = "xz"
+
+# (magic bytes, compression)
+COMPRESSION_MAGICS = (("\x1f\x8b", COMPRESSION_GZIP),
+                      ("BZh", COMPRESSION_BZIP2),
+                      ("\xfd7zXZ\x00", COMPRESSION_XZ))
+
+# (byte order mark, encoding). UTF-32 ones go first, as UTF-32 LE mark starts with UTF-16 LE mark.
+BOM_ENCODINGS = ((codecs.BOM_UTF32_LE, "utf-32-le"),
+                 (codecs.BOM_UTF32_BE, "utf-32-be"),
+                 (codecs.BOM_UTF8, "utf-8"),
+                 (codecs.BOM_UTF16_LE, "utf-16-le"),
+                 (codecs.BOM_UTF16_BE, "utf-16-be"))
+DEFAULT_ENCODING = "utf-8"
+
+
+def detect_compression(file_name):
+    """
+    :param file_name: name of the file
+    :return: COMPRESSION_* value detected by the magic bytes of the file (not by its extension)
+    """
+    with open(file_name, "rb") as f:
+        head = f.read(6)
+    for magic, compression in COMPRESSION_MAGICS:
+        if head.startswith(magic):
+            return compression
+    return COMPRESSION_NONE
+
+
+def detect_encoding(head):
+    """
+    Detect encoding by byte order mark or, if there is none, by zero bytes typical for UTF-16 texts.
+    :param head: first bytes of the text (at least a few hundred bytes for the detection without BOM to work)
+    :return: (encoding, length of the byte order mark)
+    """
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+
+    sample = head[:4096]
+    if len(sample) >= 4:
+        even_zeros = sample[0::2].count("\x00")
+        odd_zeros = sample[1::2].count("\x00")
+        half_length = len(sample) // 2
+        if odd_zeros > half_length * 0.3 and even_zeros < half_length * 0.05:
+            return "utf-16-le", 0
+        if even_zeros > half_length * 0.3 and odd_zeros < half_length * 0.05:
+            return "utf-16-be", 0
+    return DEFAULT_ENCODING, 0
+
+
+def open_binary_stream(file_name, compression):
+    """
+    :param file_name: name of the file
+    :param compression: COMPRESSION_* value
+    :return: file-like object returning decompressed bytes
+    """
+    if compression == COMPRESSION_GZIP:
+        return gzip.GzipFile(file_name, "rb")
+    if compression == COMPRESSION_BZIP2:
+        return bz2.BZ2File(file_name, "rb")
+    if compression == COMPRESSION_XZ:
+        if lzma is None:
+            raise IOError("Playing .xz files requires lzma module (install backports.lzma package)")
+        return lzma.LZMAFile(file_name, "rb")
+    return open(file_name, "rb")
+
+
+def iter_decoded_lines(stream, block_size=STREAM_BLOCK_SIZE):
+    """
+    Decode the stream in blocks and split it to lines. Line breaks are normalized to "\n".
+    :param stream: file-like object returning bytes
+    :param block_size: number of bytes read at once
+    :return: generator of lines (unicode) ending with "\n" (except the last line if the text does not end with a
+    line break)
+    """
+    block = stream.read(block_size)
+    encoding, bom_length = detect_encoding(block)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    block = block[bom_length:]
+    remainder = u""
+    while block:
+        text = remainder + decoder.decode(block)
+        # "\r" at the end may be the first half of "\r\n" split between blocks
+        if text.endswith(u"\r"):
+            remainder = u"\r"
+            text = text[:-1]
+        else:
+            remainder = u""
+        lines = text.replace(u"\r\n", u"\n").split(u"\n")
+        remainder = lines.pop() + remainder
+        for line in lines:
+            yield line + u"\n"
+        block = stream.read(block_size)
+    remainder += decoder.decode("", final=True)
+    if remainder:
+        yield remainder
+
+
+def iter_chunks(lines, lines_per_chunk):
+    """
+    Group lines to chunks. A chunk is known to be the last one only when there are no more lines after it, so every
+    chunk is yielded once the first line of the following chunk has been read.
+    :param lines: iterable of lines
+    :param lines_per_chunk: number of lines per chunk
+    :return: generator of (list of lines, is last chunk)
+    """
+    chunk = []
+    for line in lines:
+        if len(chunk) == lines_per_chunk:
+            yield chunk, False
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield chunk, True
+
+
+class IndexedTextSource(object):
+    """
+    Chunks of a plain UTF-8 file, read via its line index in any order.
+    """
+    def __init__(self, file_name, lines_per_chunk):
+        self.file_name = file_name
+        self.lines_per_chunk = lines_per_chunk
+        self.line_index = LineIndex(file_name)
+        self.parts_total = self.line_index.get_chunk_count(lines_per_chunk)
+
+    def get_file_name(self, number):
+        return self.file_name
+
+    def get_chunk(self, number):
+        """
+        :param number: number of the chunk, counting from 1
+        :return: (list of lines, is last chunk), None if there is no such chunk
+        """
+        if not 1 <= number <= self.parts_total:
+            return None
+        return self.line_index.get_chunk_lines(number, self.lines_per_chunk), number == self.parts_total
+
+    def close(self):
+        self.line_index.close()
+
+
+class StreamTextSource(object):
+    """
+    Chunks of a compressed or non UTF-8 file, decoded while the file is streamed. Chunks are meant to be read in
+    order: reading a chunk preceding the last read one restarts the stream from the beginning.
+    """
+    def __init__(self, file_name, lines_per_chunk, compression):
+        self.file_name = file_name
+        self.lines_per_chunk = lines_per_chunk
+        self.compression = compression
+        self.parts_total = None  # not known until the last chunk has been read
+        self.stream = None
+        self.chunks = None
+        self.next_number = 1
+        self._restart()
+
+    def get_file_name(self, number):
+        return self.file_name
+
+    def get_chunk(self, number):
+        """
+        :param number: number of the chunk, counting from 1
+        :return: (list of lines, is last chunk), None if there is no such chunk
+        """
+        if number < self.next_number:
+            self._restart()
+        for lines, is_last in self.chunks:
+            current_number = self.next_number
+            self.next_number += 1
+            if is_last:
+                self.parts_total = current_number
+            if current_number == number:
+                return lines, is_last
+        if self.parts_total is None:  # empty file
+            self.parts_total = 0
+        return None
+
+    def close(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+    def _restart(self):
+        self.close()
+        self.stream = open_binary_stream(self.file_name, self.compression)
+        self.chunks = iter_chunks(iter_decoded_lines(self.stream), self.lines_per_chunk)
+        self.next_number = 1
+
+
+class FollowTextSource(object):
+    """
+    Chunks of a growing (uncompressed) file. Appended data is read by poll(): complete lines are decoded and grouped
+    to chunks, a chunk becomes available once it is full. The file is considered finished when it stops growing, the
+    remaining lines then form the last chunk. Only lines that have not been taken by get_chunk yet are kept in memory.
+    """
+    def __init__(self, file_name, lines_per_chunk, poll_interval_sec=FOLLOW_POLL_INTERVAL_SEC,
+                 quiet_sec=FOLLOW_QUIET_SEC):
+        """
+        :param file_name: name of the file
+        :param lines_per_chunk: number of lines per chunk
+        :param poll_interval_sec: min number of seconds between two checks of the file size
+        :param quiet_sec: number of seconds without growth after which the file is considered finished
+        """
+        if detect_compression(file_name) != COMPRESSION_NONE:
+            raise IOError("Compressed files cannot be followed")
+        self.file_name = file_name
+        self.file = open(file_name, "rb")
+        self.lines_per_chunk = lines_per_chunk
+        self.poll_interval_sec = poll_interval_sec
+        self.quiet_sec = quiet_sec
+        self.parts_total = None     # not known until the file is finished
+        self.is_finished = False
+        self.offset = 0             # number of bytes already read
+        self.decoder = None         # created when the encoding is known (first bytes are read)
+        self.partial_line = u""     # text after the last line break
+        self.pending_lines = []     # complete lines not forming a full chunk yet
+        self.chunks = {}            # {number: list of lines} of chunks not taken yet
+        self.chunks_count = 0
+        self.last_poll_time = 0
+        self.last_growth_time = time.time()
+        self.poll(is_forced=True)
+
+    def get_file_name(self, number):
+        return self.file_name
+
+    def poll(self, is_forced=False):
+        """
+        Read data appended to the file since the previous poll. Does nothing if called sooner than the poll interval
+        after the previous poll (unless forced), so it can be called every frame.
+        :param is_forced: poll regardless of the poll interval
+        :return: True if new chunks became available or the file has been finished
+        """
+        now = time.time()
+        if self.is_finished or (not is_forced and now - self.last_poll_time < self.poll_interval_sec):
+            return False
+        self.last_poll_time = now
+
+        size = os.fstat(self.file.fileno()).st_size
+        if size <= self.offset:  # not grown (or truncated, which is not supported)
+            if now - self.last_growth_time >= self.quiet_sec:
+                self.finish()
+                return True
+            return False
+        self.last_growth_time = now
+
+        self.file.seek(self.offset)
+        data = self.file.read(size - self.offset)
+        self.offset += len(data)
+        if self.decoder is None:
+            if len(data) < 4 and not self.is_finished:
+                # Too little to detect encoding reliably, wait for more data
+                self.offset -= len(data)
+                return False
+            encoding, bom_length = detect_encoding(data)
+            self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            data = data[bom_length:]
+
+        lines = (self.partial_line + self.decoder.decode(data)).replace(u"\r\n", u"\n").split(u"\n")
+        self.partial_line = lines.pop()
+        self.pending_lines.extend(line + u"\n" for line in lines)
+
+        chunks_count = self.chunks_count
+        while len(self.pending_lines) >= self.lines_per_chunk:
+            self._add_chunk(self.pending_lines[:self.lines_per_chunk])
+            del self.pending_lines[:self.lines_per_chunk]
+        return self.chunks_count > chunks_count
+
+    def flush(self):
+        """
+        Turn complete lines that do not form a full chunk yet into a (shorter) chunk.
+        """
+        if self.pending_lines:
+            self._add_chunk(self.pending_lines)
+            self.pending_lines = []
+
+    def finish(self):
+        """
+        Stop following the file: the remaining lines form the last chunk.
+        """
+        if self.is_finished:
+            return
+        if self.decoder:
+            self.partial_line += self.decoder.decode("", final=True)
+        if self.partial_line:
+            self.pending_lines.append(self.partial_line)
+            self.partial_line = u""
+        self.flush()
+        self.is_finished = True
+        self.parts_total = self.chunks_count
+        self.file.close()
+
+    def get_chunk(self, number):
+        """
+        Take the chunk. Chunks preceding it are dropped, as chunks can only be taken once and in order.
+        :param number: number of the chunk, counting from 1
+        :return: (list of lines, is last chunk), None if the chunk is not available (yet)
+        """
+        lines = self.chunks.pop(number, None)
+        if lines is None:
+            return None
+        for previous_number in [key for key in self.chunks if key < number]:
+            del self.chunks[previous_number]
+        return lines, self.is_finished and number == self.parts_total
+
+    def close(self):
+        self.file.close()
+
+    def _add_chunk(self, lines):
+        self.chunks_count += 1
+        self.chunks[self.chunks_count] = lines
+
+
+class CampaignTextSource(object):
+    """
+    Chunks of several files played one after another as a single sequence of chunks (campaign). Only the file of the
+    current chunk is open. Chunks are meant to be read in order, like the ones of StreamTextSource.
+    """
+    def __init__(self, file_names, lines_per_chunk):
+        """
+        :param file_names: ordered list of names of the files
+        :param lines_per_chunk: number of lines per chunk
+        """
+        self.file_names = file_names
+        self.lines_per_chunk = lines_per_chunk
+        self.parts_total = None     # not known until the last chunk has been read
+        self.chunk_file_names = {}  # {chunk number: file name} of recently read chunks
+        self.source = None
+        self.file_position = -1
+        self.source_chunk_number = 1
+        self.next_number = 1
+        self.next_chunk = None      # chunk read ahead, to know whether the previous one is the last one
+        self._restart()
+
+    def get_file_name(self, number):
+        """
+        :param number: number of a recently read chunk
+        :return: name of the file the chunk belongs to
+        """
+        return self.chunk_file_names.get(number)
+
+    def get_chunk(self, number):
+        """
+        :param number: number of the chunk, counting from 1
+        :return: (list of lines, is last chunk), None if there is no such chunk
+        """
+        if number < self.next_number:
+            self._restart()
+        while True:
+            chunk = self.next_chunk
+            if chunk is None:
+                self.parts_total = self.next_number - 1
+                return None
+            current_number = self.next_number
+            self.next_number += 1
+            self.next_chunk = self._read_chunk()
+            is_last = self.next_chunk is None
+            if is_last:
+                self.parts_total = current_number
+            if current_number == number:
+                self.chunk_file_names[number] = chunk[1]
+                for old_number in [key for key in self.chunk_file_names if key < number - 1]:
+                    del self.chunk_file_names[old_number]
+                return chunk[0], is_last
+
+    def close(self):
+        if self.source:
+            self.source.close()
+            self.source = None
+
+    def _restart(self):
+        self.close()
+        self.file_position = -1
+        self.next_number = 1
+        self.next_chunk = self._read_chunk()
+
+    def _read_chunk(self):
+        """
+        :return: (list of lines, file name) of the next chunk of the campaign, None if there are no more chunks
+        """
+        while True:
+            if self.source:
+                chunk = self.source.get_chunk(self.source_chunk_number)
+                if chunk is not None:
+                    self.source_chunk_number += 1
+                    return chunk[0], self.file_names[self.file_position]
+                self.close()
+            self.file_position += 1
+            if self.file_position >= len(self.file_names):
+                return None
+            try:
+                self.source = open_text_source(self.file_names[self.file_position], self.lines_per_chunk)
+            except IOError:
+                continue  # unreadable files are skipped
+            self.source_chunk_number = 1
+
+
+def get_campaign_file_names(path):
+    """
+    :param path: directory or glob pattern
+    :return: sorted list of names of the files in the directory (hidden ones excluded) or matching the pattern
+    """
+    if os.path.isdir(path):
+        file_names = [os.path.join(path, name) for name in os.listdir(path) if not name.startswith(".")]
+    else:
+        file_names = glob.glob(path)
+    return sorted(file_name for file_name in file_names if os.path.isfile(file_name))
+
+
+def is_campaign_path(path):
+    """
+    :param path: path chosen by the user
+    :return: True if the path is a directory or a glob pattern (to be played as a campaign)
+    """
+    return os.path.isdir(path) or (glob.has_magic(path) and not os.path.isfile(path))
+
+
+def open_text_source(file_name, lines_per_chunk):
+    """
+    :param file_name: name of the (possibly compressed) text file, or a directory or a glob pattern for a campaign
+    :param lines_per_chunk: number of lines per chunk
+    :return: IndexedTextSource for plain UTF-8 files, StreamTextSource for other ones, CampaignTextSource for
+    directories and glob patterns
+    """
+    if is_campaign_path(file_name):
+        return CampaignTextSource(get_campaign_file_names(file_name), lines_per_chunk)
+    compression = detect_compression(file_name)
+    if compression == COMPRESSION_NONE:
+        with open(file_name, "rb") as f:
+            encoding = detect_encoding(f.read(4096))[0]
+        if encoding == DEFAULT_ENCODING:
+            return IndexedTextSource(file_name, lines_per_chunk)
+    return StreamTextSource(file_name, lines_per_chunk, compression)
@@ -0,0 +1,424 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Level cache: layouts of built parts (see LayoutBuilder) persisted in the cache folder, so that replaying a file (or
+# restarting the game) builds its parts from the layouts instead of tokenizing and laying them out again. A layout is
+# keyed by the text of the part (rather than by the whole file, so that any text source, i.e. a campaign or a
+# compressed file, can use it and a part does not depend on the rest of the file), the build parameters and the
+# content version. Parts are laid out ahead of the game by a pool of worker processes (LayoutPool), which can also
+# warm the cache before the game starts:
+#     python level_cache.py [options] file, directory or glob pattern ...
+
+import argparse
+import hashlib
+import marshal
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import traceback
+import zlib
+
+from constants import *
+from content_pack import get_resource_path, load_content, DB_FILE_NAME, CONTENT_PACK_FILE_NAME
+from ingest import get_campaign_file_names, is_campaign_path, open_text_source
+from line_index import get_cache_dir
+from logic import wrap_lines, LayoutBuilder
+from phrases import PhraseAutomaton
+from tokenizer import get_tokenizer
+
+# Increase whenever LayoutBuilder lays parts out differently or layout data changes, so that old layouts are not used
+LAYOUT_FORMAT_VERSION = 4
+
+LAYOUT_FILE_EXTENSION = ".layout"
+LAYOUT_CACHE_MAX_SIZE = 256 * 1024 * 1024  # the least recently used layouts are deleted above this total size
+LAYOUT_COMPRESS_LEVEL = 1
+LAYOUT_POOL_MAX_PENDING_PARTS = 64  # parts handed to the workers at once (their lines are kept until laid out)
+LAYOUT_POOL_WINDOW_PARTS = 16       # parts laid out ahead of the active one, see LayoutPool.set_active_part
+
+
+def get_layout_key(lines, build_args, build_kwargs, is_first_gameplay, content_version):
+    """
+    :param lines: lines of the part
+    :param build_args: arguments the part is built with, see Controller.gameplay_build_args
+    :param build_kwargs: keyword arguments the part is built with, see Controller.gameplay_build_kwargs
+    :param is_first_gameplay: see Gameplay (the player and the start platform take space in the first part)
+    :param content_version: see ContentStore.get_version
+    :return: hex digest the layout of the part is cached by. Whether the part is the last one is not a part of the key:
+    the finish platform is added after the part has been laid out.
+    """
+    digest = hashlib.sha1()
+    digest.update(repr((LAYOUT_FORMAT_VERSION, content_version, tuple(build_args), sorted(build_kwargs.iteritems()),
+                        bool(is_first_gameplay), len(lines))))
+    for line in lines:
+        digest.update(line.encode("utf-8"))
+        digest.update("\0")
+    return digest.hexdigest()
+
+
+class LayoutCache(object):
+    """
+    Layout files in the cache folder: zlib-compressed marshal of the layout, named by its key
+    """
+    def __init__(self, cache_dir=None, max_size=LAYOUT_CACHE_MAX_SIZE):
+        """
+        :param cache_dir: folder to keep layouts in, "layouts" subfolder of get_cache_dir() by default
+        :param max_size: max total size of the layout files, see prune
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        try:
+            if self.cache_dir is None:
+                self.cache_dir = os.path.join(get_cache_dir(), "layouts")
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+        except (IOError, OSError):
+            self.cache_dir = None  # no writable cache folder, parts are always laid out from scratch then
+
+    def has(self, key):
+        """
+        :param key: see get_layout_key
+        :return: True if the layout is cached
+        """
+        return bool(self.cache_dir) and os.path.isfile(self._get_file_name(key))
+
+    def load(self, key):
+        """
+        :param key: see get_layout_key
+        :return: cached layout, None if there is none (or it is unreadable)
+        """
+        if not self.cache_dir:
+            return None
+        file_name = self._get_file_name(key)
+        try:
+            with open(file_name, "rb") as layout_file:
+                layout = marshal.loads(zlib.decompress(layout_file.read()))
+            os.utime(file_name, None)  # recently used, see prune
+        except (IOError, OSError, EOFError, ValueError, TypeError, zlib.error):
+            return None
+        return layout if isinstance(layout, dict) else None
+
+    def save(self, key, layout):
+        """
+        :param key: see get_layout_key
+        :param layout: layout of the built part
+        """
+        if not self.cache_dir:
+            return
+        file_name = self._get_file_name(key)
+        # Write to a temporary file first, so that a concurrent load never reads a half-written layout
+        temp_file_name = "%s.%d.tmp" % (file_name, os.getpid())
+        try:
+            with open(temp_file_name, "wb") as layout_file:
+                layout_file.write(zlib.compress(marshal.dumps(layout), LAYOUT_COMPRESS_LEVEL))
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            os.rename(temp_file_name, file_name)
+        except (IOError, OSError, ValueError):
+            pass  # the layout is just not cached then
+
+    def prune(self):
+        """
+        Delete the least recently used layouts while their total size exceeds max_size.
+        :return: number of deleted layouts
+        """
+        if not self.cache_dir:
+            return 0
+        files = []
+        total_size = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(LAYOUT_FILE_EXTENSION):
+                try:
+                    file_stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                files.append((file_stat.st_mtime, file_stat.st_size, name))
+                total_size += file_stat.st_size
+        deleted_count = 0
+        for mtime, size, name in sorted(files):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total_size -= size
+            deleted_count += 1
+        return deleted_count
+
+    def _get_file_name(self, key):
+        return os.path.join(self.cache_dir, key + LAYOUT_FILE_EXTENSION)
+
+
+# State of a worker process of LayoutPool, see _init_worker
+_worker = {}
+
+
+def _init_worker(feed_number, cache_dir):
+    """
+    Initialize a worker process of LayoutPool
+    :param feed_number: shared number of the current feed, see LayoutPool.stop
+    :param cache_dir: folder of the layout cache
+    """
+    _worker["feed_number"] = feed_number
+    _worker["layout_cache"] = LayoutCache(cache_dir)
+    _worker["language"] = None
+
+
+def _set_worker_language(language):
+    """
+    Laying parts out takes the tokenizer and the phrases of the language only (not the whole content), those are
+    rebuilt whenever a part of another language (or content version) comes.
+    :param language: (language id, tokenizer pattern, phrase texts), see LayoutPool.start
+    """
+    if _worker["language"] != language:
+        language_id, tokenizer_pattern, phrase_texts = language
+        tokenizer = get_tokenizer(language_id, tokenizer_pattern)
+        _worker["tokenizer"] = tokenizer
+        _worker["phrases"] = PhraseAutomaton(tokenizer, phrase_texts)
+        _worker["language"] = language
+
+
+def _lay_out_part(task):
+    """
+    Lay out a part in a worker process of LayoutPool and put its layout into the cache
+    :param task: (feed number, language, key, lines, build args, build kwargs, is first gameplay), see get_layout_key
+    :return: (feed number, key, True if the part has been laid out)
+    """
+    feed_number, language, key, lines, build_args, build_kwargs, is_first_gameplay = task
+    if feed_number != _worker["feed_number"].value:
+        return feed_number, key, False  # the feed has been stopped, the part is not needed anymore
+    (language_id, difficulty, line_spacing, left, top_before_start, top_after_start, right, bottom_before_finish,
+     bottom_after_finish) = build_args
+    try:
+        _set_worker_language(language)
+        layout = LayoutBuilder(_worker["tokenizer"], _worker["phrases"],
+                               wrap_lines(lines, build_kwargs.get("wrap_column", 0)), difficulty, line_spacing, left,
+                               right, top_before_start, top_after_start, is_first_gameplay,
+                               build_kwargs.get("seed", DEFAULT_SEED)).layout
+    except Exception:
+        traceback.print_exc()
+        return feed_number, key, False  # the game lays the part out itself then
+    _worker["layout_cache"].save(key, layout)
+    return feed_number, key, True
+
+
+class LayoutPool(object):
+    """
+    Worker processes laying out parts of a file ahead of the game (see LayoutBuilder). The workers put the layouts into
+    the layout cache themselves, so the game only creates objects of a part from its cached layout. Parts are read by
+    a feeder thread (from a text source of its own) and handed to the workers a few at a time, up to a window ahead of
+    the active part, so that memory stays bounded however large the file is. The workers are started once and serve
+    all files (of any language) laid out afterwards.
+    """
+    def __init__(self, processes_count, layout_cache):
+        """
+        :param processes_count: number of worker processes
+        :param layout_cache: LayoutCache (enabled one)
+        """
+        self.layout_cache = layout_cache
+        # Parts of previous feeds are skipped by the workers. Only the thread calling stop changes the number, so it
+        # needs no lock (a worker terminated by close could leave a lock taken).
+        self.feed_number = multiprocessing.Value("i", 0, lock=False)
+        self.pool = multiprocessing.Pool(processes_count, _init_worker, (self.feed_number, layout_cache.cache_dir))
+        self.thread = None
+        self.condition = threading.Condition()
+        self.pending_keys = set()  # keys of the parts handed to the workers and not laid out yet
+        self.active_number = None  # number of the part being played, None - all parts are laid out without waiting
+        self.parts_count = 0       # parts of the current file read so far
+        self.laid_out_count = 0    # parts laid out by the workers (the other ones are either cached or failed)
+
+    def start(self, file_name, lines_per_chunk, first_number, build_args, build_kwargs, content,
+              is_first_gameplay=False, active_number=None):
+        """
+        Start laying out parts of the file in background, from the provided part to the last one. The current feed
+        (if any) is stopped.
+        :param file_name: name of the text file, or a directory or a glob pattern for a campaign
+        :param lines_per_chunk: number of lines per chunk
+        :param first_number: number of the first part to lay out
+        :param build_args: see Controller.gameplay_build_args
+        :param build_kwargs: see Controller.gameplay_build_kwargs
+        :param content: game content to take the tokenizer and the phrases of the language from
+        :param is_first_gameplay: True if the game starts from the first_number part
+        :param active_number: number of the part being played, see set_active_part
+        """
+        self.stop()
+        language_id = build_args[0]
+        language = (language_id, content.get_tokenizer_pattern(language_id),
+                    tuple(sorted(content.get_phrase_automaton(language_id).phrase_texts)))
+        with self.condition:
+            self.active_number = active_number
+        self.parts_count = 0
+        self.laid_out_count = 0
+        self.thread = threading.Thread(target=self._feed, args=(self.feed_number.value, file_name, lines_per_chunk,
+                                                                first_number, build_args, build_kwargs,
+                                                                content.get_version(), language, is_first_gameplay))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def set_active_part(self, number):
+        """
+        Parts are laid out up to LAYOUT_POOL_WINDOW_PARTS ahead of the active part only
+        :param number: number of the part being played
+        """
+        with self.condition:
+            self.active_number = number
+            self.condition.notify_all()
+
+    def wait(self):
+        """
+        Wait until all parts of the file have been laid out
+        """
+        while self.thread and self.thread.is_alive():
+            self.thread.join(0.5)  # joining with a timeout keeps the waiting thread interruptible (Ctrl+C)
+
+    def stop(self):
+        """
+        Stop laying out the current file. Parts handed to the workers and not laid out yet are skipped. The feeder
+        thread is not waited for (it may be reading a slow file), it exits on its own as soon as it notices the stop.
+        """
+        with self.condition:
+            self.feed_number.value += 1
+            self.pending_keys.clear()
+            self.condition.notify_all()
+        self.thread = None
+
+    def close(self):
+        """
+        Stop laying out (parts being laid out are dropped) and terminate the worker processes
+        """
+        self.stop()
+        self.pool.terminate()
+        self.pool.join()
+
+    def _is_stopped(self, feed_number):
+        """
+        :param feed_number: number of the feed (see stop) a feeder thread has been started with
+        :return: True if the feed has been stopped
+        """
+        return feed_number != self.feed_number.value
+
+    def _feed(self, feed_number, file_name, lines_per_chunk, first_number, build_args, build_kwargs, content_version,
+              language, is_first_gameplay):
+        try:
+            text_source = open_text_source(file_name, lines_per_chunk)
+        except IOError:
+            return
+        try:
+            number = first_number
+            chunk = text_source.get_chunk(number)
+            while chunk is not None and not self._is_stopped(feed_number):
+                lines = chunk[0]
+                is_first_part = is_first_gameplay and number == first_number
+                key = get_layout_key(lines, build_args, build_kwargs, is_first_part, content_version)
+                self.parts_count += 1
+                if not self.layout_cache.has(key):
+                    with self.condition:
+                        while ((len(self.pending_keys) >= LAYOUT_POOL_MAX_PENDING_PARTS or
+                                (self.active_number is not None and
+                                 number > self.active_number + LAYOUT_POOL_WINDOW_PARTS))
+                               and not self._is_stopped(feed_number)):
+                            self.condition.wait()
+                        if self._is_stopped(feed_number):
+                            break
+                        # Parts with the same text share the layout (i.e. repeated lines). Parts are handed over with
+                        # the lock held, so that none is handed to a pool closed meanwhile.
+                        if key not in self.pending_keys:
+                            self.pending_keys.add(key)
+                            self.pool.apply_async(_lay_out_part, ((feed_number, language, key, lines, build_args,
+                                                                   build_kwargs, is_first_part),),
+                                                  callback=self._on_part_laid_out)
+                number += 1
+                chunk = text_source.get_chunk(number)
+
+            with self.condition:
+                while self.pending_keys and not self._is_stopped(feed_number):
+                    self.condition.wait()
+        finally:
+            text_source.close()
+        if not self._is_stopped(feed_number):
+            self.layout_cache.prune()  # the cache may have grown over its max size
+
+    def _on_part_laid_out(self, result):
+        # Called in a thread of the pool
+        feed_number, key, is_laid_out = result
+        with self.condition:
+            if self._is_stopped(feed_number):
+                return  # part of a stopped feed
+            self.pending_keys.discard(key)
+            if is_laid_out:
+                self.laid_out_count += 1
+            self.condition.notify_all()
+
+
+def main(argv):
+    # Defaults are the ones of the new game dialog (GameSettingsDialog)
+    parser = argparse.ArgumentParser(description="Cache layouts of all parts of the files ahead of time, so that games "
+                                                 "on them start without building the parts. A directory or a glob "
+                                                 "pattern means all its files, each one played separately.")
+    parser.add_argument("paths", nargs="+", metavar="path", help="text file, directory or glob pattern")
+    parser.add_argument("--database", default=get_resource_path(DB_FILE_NAME), help="game content database")
+    parser.add_argument("--language-id", type=int, default=1)
+    parser.add_argument("--difficulty", type=int, default=30)
+    parser.add_argument("--line-spacing", type=int, default=4)
+    parser.add_argument("--left", type=int, default=4)
+    parser.add_argument("--top-before-start", type=int, default=5)
+    parser.add_argument("--top-after-start", type=int, default=3)
+    parser.add_argument("--right", type=int, default=15)
+    parser.add_argument("--bottom-before-finish", type=int, default=3)
+    parser.add_argument("--bottom-after-finish", type=int, default=3)
+    parser.add_argument("--lines-per-chunk", type=int, default=DEFAULT_LINES_PER_CHUNK)
+    parser.add_argument("--wrap-column", type=int, default=DEFAULT_WRAP_COLUMN)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="number of worker processes (default: one per CPU core)")
+    args = parser.parse_args(argv)
+
+    db_connection = sqlite3.connect(args.database)
+    try:
+        content = load_content(db_connection, args.database,
+                               os.path.join(os.path.dirname(os.path.abspath(args.database)), CONTENT_PACK_FILE_NAME))
+    finally:
+        db_connection.close()
+    build_args = (args.language_id, args.difficulty, args.line_spacing, args.left, args.top_before_start,
+                  args.top_after_start, args.right, args.bottom_before_finish, args.bottom_after_finish)
+    build_kwargs = {"wrap_column": args.wrap_column, "seed": args.seed}
+
+    layout_cache = LayoutCache()
+    if not layout_cache.cache_dir:
+        print "No writable cache folder"
+        return 1
+    layout_pool = LayoutPool(max(1, args.processes), layout_cache)
+    try:
+        for path in args.paths:
+            for file_name in (get_campaign_file_names(path) if is_campaign_path(path) else [path]):
+                if not os.path.isfile(file_name):
+                    print file_name + ": no such file"
+                    continue
+                layout_pool.start(file_name, args.lines_per_chunk, FIRST_GAMEPLAY_SEQUENCE_NUM, build_args,
+                                  build_kwargs, content, is_first_gameplay=True)
+                layout_pool.wait()
+                print "%s: %d parts, %d laid out" % (file_name, layout_pool.parts_count, layout_pool.laid_out_count)
+    finally:
+        layout_pool.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
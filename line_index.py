@@ -0,0 +1,206 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Line index of a text file: byte offsets of the beginnings of all lines, built over an mmap of the file. Any slice of
+# lines (a chunk) can then be read and decoded without touching the rest of the file. Built indexes are persisted in
+# the cache folder, keyed by the path, size and modification time of the file.
+
+import codecs
+import hashlib
+import mmap
+import os
+import struct
+from array import array
+
+from constants import *
+
+# Offsets have to hold sizes of files larger than 4 GB. Python 2.7 array has no 64-bit integer type code, and "L" is
+# only 32 bits on Windows, where doubles (exact up to 2**53) are used instead.
+OFFSET_TYPECODE = "L" if array("L").itemsize >= 8 else "d"
+
+INDEX_FILE_MAGIC = "IWLI"
+INDEX_FILE_VERSION = 2
+INDEX_FILE_EXTENSION = ".lineidx"
+# magic, version, offset type code, file size, file modification time, number of offsets
+INDEX_FILE_HEADER = struct.Struct("<4sHcQdQ")
+
+
+def get_user_dir():
+    """
+    :return: folder of the files the game keeps for the user (the folder of the game may be read-only)
+    """
+    return os.path.join(os.path.expanduser("~"), "." + APP_NAME.lower())
+
+
+def get_cache_dir():
+    """
+    :return: folder for files the game caches between runs (created if it does not exist)
+    """
+    cache_dir = os.path.join(get_user_dir(), "cache")
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    return cache_dir
+
+
+class LineIndex(object):
+    """
+    Random access to lines of a UTF-8 text file. Line i spans bytes offsets[i]:offsets[i + 1], the last offset is
+    the size of the file. Byte order mark is not a part of the first line.
+    """
+    def __init__(self, file_name, cache_dir=None, is_build_allowed=True):
+        """
+        Open the file and load its line index from the cache, or build (and cache) it if there is none.
+        :param file_name: name of the text file
+        :param cache_dir: folder to keep built indexes in, get_cache_dir() by default. Pass False to skip caching.
+        :param is_build_allowed: False - raise IOError instead of building the index if it is not cached
+        """
+        self.file_name = os.path.abspath(file_name)
+        self.file = open(self.file_name, "rb")
+        file_stat = os.fstat(self.file.fileno())
+        self.file_size = file_stat.st_size
+        self.file_mtime = file_stat.st_mtime
+        self.mapped_file = None
+        if self.file_size > 0:  # empty files cannot be mapped
+            self.mapped_file = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.index_file_name = None
+        if cache_dir is not False:
+            key = hashlib.sha1(self.file_name.encode("utf-8") if isinstance(self.file_name, unicode)
+                               else self.file_name).hexdigest()
+            try:
+                self.index_file_name = os.path.join(cache_dir or get_cache_dir(), key + INDEX_FILE_EXTENSION)
+            except (IOError, OSError):
+                pass  # no writable cache folder, the index is built every time then
+
+        self.offsets = self._load_offsets()
+        if self.offsets is None:
+            if not is_build_allowed:
+                self.close()
+                raise IOError("Line index of %s is not cached" % self.file_name)
+            self.offsets = self._build_offsets()
+            self._save_offsets()
+
+    @property
+    def line_count(self):
+        return len(self.offsets) - 1
+
+    def get_chunk_count(self, lines_per_chunk):
+        """
+        :param lines_per_chunk: number of lines per chunk
+        :return: number of chunks of the file
+        """
+        return (self.line_count + lines_per_chunk - 1) // lines_per_chunk
+
+    def get_chunk_bytes(self, chunk_number, lines_per_chunk):
+        """
+        :param chunk_number: number of the chunk, counting from 1
+        :param lines_per_chunk: number of lines per chunk
+        :return: raw bytes of all lines of the chunk
+        """
+        start = (chunk_number - 1) * lines_per_chunk
+        return self.get_bytes(start, min(start + lines_per_chunk, self.line_count))
+
+    def get_bytes(self, start, stop):
+        """
+        :param start: index of the first line
+        :param stop: index of the line after the last one
+        :return: raw bytes of the lines
+        """
+        if start >= stop:
+            return ""
+        return self.mapped_file[int(self.offsets[start]):int(self.offsets[stop])]
+
+    def get_lines(self, start, stop):
+        """
+        :param start: index of the first line
+        :param stop: index of the line after the last one
+        :return: list of lines (unicode, decoded as UTF-8) ending with "\n" (except the last line of the file if it
+        does not end with a line break)
+        """
+        if start >= stop:
+            return []
+        text = self.get_bytes(start, stop).decode("utf-8", "replace").replace(u"\r\n", u"\n")
+        lines = [line + u"\n" for line in text.split(u"\n")]
+        # The split leaves either an empty remainder after the final line break or the unterminated last line
+        if text.endswith(u"\n"):
+            lines.pop()
+        elif lines:
+            lines[-1] = lines[-1][:-1]
+        return lines
+
+    def get_chunk_lines(self, chunk_number, lines_per_chunk):
+        """
+        :param chunk_number: number of the chunk, counting from 1
+        :param lines_per_chunk: number of lines per chunk
+        :return: list of decoded lines of the chunk (see get_lines)
+        """
+        start = (chunk_number - 1) * lines_per_chunk
+        return self.get_lines(start, min(start + lines_per_chunk, self.line_count))
+
+    def close(self):
+        if self.mapped_file:
+            self.mapped_file.close()
+            self.mapped_file = None
+        self.file.close()
+
+    def _build_offsets(self):
+        offsets = array(OFFSET_TYPECODE, [0])
+        if self.mapped_file:
+            if self.mapped_file[:len(codecs.BOM_UTF8)] == codecs.BOM_UTF8:
+                offsets[0] = len(codecs.BOM_UTF8)
+            position = self.mapped_file.find("\n")
+            while position != -1:
+                offsets.append(position + 1)
+                position = self.mapped_file.find("\n", position + 1)
+            if offsets[-1] != self.file_size:  # last line without line break
+                offsets.append(self.file_size)
+        return offsets
+
+    def _load_offsets(self):
+        """
+        :return: offsets read from the cached index, None if there is no valid index for the current file contents
+        """
+        if not self.index_file_name or not os.path.isfile(self.index_file_name):
+            return None
+        try:
+            with open(self.index_file_name, "rb") as index_file:
+                header = INDEX_FILE_HEADER.unpack(index_file.read(INDEX_FILE_HEADER.size))
+                magic, version, typecode, file_size, file_mtime, offsets_count = header
+                if (magic != INDEX_FILE_MAGIC or version != INDEX_FILE_VERSION or typecode != OFFSET_TYPECODE
+                        or file_size != self.file_size or file_mtime != self.file_mtime):
+                    return None
+                offsets = array(OFFSET_TYPECODE)
+                offsets.fromfile(index_file, offsets_count)
+                return offsets
+        except (IOError, OSError, EOFError, struct.error):
+            return None
+
+    def _save_offsets(self):
+        if not self.index_file_name:
+            return
+        temp_file_name = self.index_file_name + ".tmp"
+        try:
+            with open(temp_file_name, "wb") as index_file:
+                index_file.write(INDEX_FILE_HEADER.pack(INDEX_FILE_MAGIC, INDEX_FILE_VERSION, OFFSET_TYPECODE,
+                                                        self.file_size, self.file_mtime, len(self.offsets)))
+                self.offsets.tofile(index_file)
+            if os.path.exists(self.index_file_name):
+                os.remove(self.index_file_name)
+            os.rename(temp_file_name, self.index_file_name)
+        except (IOError, OSError):
+            pass  # the index is just not cached then
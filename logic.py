@@ -17,12 +17,15 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 # TODO split this enormous module into smaller ones
-import re
+import hashlib
 import random
 from operator import attrgetter
 
+from build_profiler import *
 from constants import *
 from game_object_components import *
+from reachability import ReachabilitySolver
+from tokenizer import get_tokenizer
 
 
 # Functions
@@ -55,6 +58,45 @@ def get_max_width_of_lines(lines):
     return width
 
 
+def wrap_lines(lines, max_width):
+    """
+    Wrap lines longer than max_width into several lines. A line is broken after the last space that fits, words
+    longer than max_width are broken anywhere.
+    :param lines: list of text lines
+    :param max_width: max line length, 0 - do not wrap
+    :return: list of text lines
+    """
+    if max_width <= 0:
+        return lines
+    result = []
+    for line in lines:
+        while len(line) > max_width:
+            cut = line.rfind(" ", 0, max_width + 1)
+            if cut <= 0:
+                cut = max_width
+            result.append(line[:cut])
+            line = line[cut:].lstrip(" ")
+        result.append(line)
+    return result
+
+
+def create_random(seed, stream, lines):
+    """
+    Create a random number generator of a subsystem for a part. Every subsystem has its own stream of numbers, so that
+    a change in one of them does not shift numbers of the other ones. Streams depend on the text of the part rather
+    than on its number, so a cached layout of the same text (see level_cache module) stays valid.
+    :param seed: seed of the game
+    :param stream: name of the stream, one of RANDOM_STREAM_* constants
+    :param lines: lines of the part
+    :return: random.Random
+    """
+    digest = hashlib.sha1("%d:%s" % (seed, stream))
+    for line in lines:
+        digest.update("\n")
+        digest.update(line.encode("utf8") if isinstance(line, unicode) else line)
+    return random.Random(int(digest.hexdigest()[:16], 16))
+
+
 def get_list_of_empty_strings_of_various_length(max_length):
     """
     Generate list of empty strings of various length. String position in the list corresponds to its length.
@@ -70,39 +112,52 @@ def get_list_of_empty_strings_of_various_length(max_length):
     return result
 
 
-def generate_string_line(object_lines_list, max_length):
+def generate_string_line(object_lines_list, max_length, x_from=0):
     """
     Produce single-line string from provided list of object lines.
     :param object_lines_list: list of object_lines for each line
     :param max_length: max width of the string line
+    :param x_from: gameplay column the string line starts at, object lines outside of the string line are skipped
     :return: single-row string
     """
     result = ""
     for object_line in object_lines_list:
-        if len(result) < object_line.x:
-            # Length of current result string is shorter than element position
-            spaces_to_add = " " * (object_line.x - len(result))
-            result += spaces_to_add + object_line.directional_line.texts[object_line.parent.direction]
-        else:
-            # Length of current result string allows standard inserting
-            result = result[:object_line.x] + object_line.directional_line.texts[object_line.parent.direction] \
-                     + result[(object_line.x + len(object_line.directional_line.texts[object_line.parent.direction])):]
-
-        # Append spaces to fill the whole line
-        diff = max_length - len(result)
-        if diff > 0:
-            result += (" " * diff)
+        text = object_line.directional_line.texts[object_line.parent.direction]
+        x = object_line.x - x_from
+        if x < 0:
+            # Object line starts to the left of the visible part
+            text = text[-x:]
+            x = 0
+        if x < max_length:
+            text = text[:max_length - x]
+            if len(result) < x:
+                # Length of current result string is shorter than element position
+                spaces_to_add = " " * (x - len(result))
+                result += spaces_to_add + text
+            else:
+                # Length of current result string allows standard inserting
+                result = result[:x] + text + result[(x + len(text)):]
+
+    # Append spaces to fill the whole line (rows without objects are left empty)
+    diff = max_length - len(result)
+    if object_lines_list and diff > 0:
+        result += (" " * diff)
     return result
 
 
-def generate_string_line2(object_lines_list, max_length, empty_strings):
+def generate_string_line2(object_lines_list, max_length, empty_strings, x_from=0):
     """
     Produce list of strings like ["---", "      ", "/  \", "        "]
     :param object_lines_list: list of object_lines for each row
     :param max_length: max width of the row
-    :param empty_strings: list of predefined empty strings of various length
+    :param empty_strings: list of predefined empty strings of various length (at least max_length + 1 of them)
+    :param x_from: gameplay column the row starts at, object lines outside of the row are skipped
     :return: list of strings representing current row
     """
+    if not object_lines_list:
+        # Rows without objects are left empty (like generate_string_line does)
+        return ["\n"]
+
     result = []
     current_x_pointer = 0
 
@@ -111,14 +166,20 @@ def generate_string_line2(object_lines_list, max_length, empty_strings):
 
     # Generate list of string representing current row
     for object_line in object_lines_list:
-        if current_x_pointer == 0:
-            # If first line in the row, append appropriate empty string before it
-            result.append(empty_strings[object_line.x])
-        else:
-            # If not first line in the row, append empty string of length between previous and current object lines
-            result.append(empty_strings[object_line.x - current_x_pointer])
-        result.append(object_line.directional_line.texts[object_line.parent.direction])
-        current_x_pointer = (object_line.x + len(object_line.directional_line.texts[object_line.parent.direction]))
+        text = object_line.directional_line.texts[object_line.parent.direction]
+        x = object_line.x - x_from
+        if x < current_x_pointer:
+            # Object line starts to the left of the row or overlaps the previous one (which stays on top)
+            text = text[current_x_pointer - x:]
+            x = current_x_pointer
+        if x >= max_length:
+            break
+        text = text[:max_length - x]
+        if text:
+            # Empty string of length between previous and current object lines
+            result.append(empty_strings[x - current_x_pointer])
+            result.append(text)
+            current_x_pointer = x + len(text)
 
     # Append empty string till the end of current row
     result.append(empty_strings[max_length - current_x_pointer])
@@ -133,6 +194,10 @@ class DirectionalLine(object):
     """
     Contains information about single text line in both directions
     """
+    # Hot classes (instantiated per word, line, bullet and explosion segment) have no __dict__, see GameObject
+    __slots__ = ("texts", "original_texts", "hurt_texts", "empty_texts", "explode_texts", "x_offsets", "y_offset",
+                 "is_for_shooting")
+
     def __init__(self, left_text, left_x_offset, right_text, right_x_offset, y_offset, left_is_for_shooting=False,
                  right_is_for_shooting=False):
         """
@@ -154,19 +219,21 @@ class DirectionalLine(object):
         self.y_offset = y_offset
         self.is_for_shooting = [left_is_for_shooting, right_is_for_shooting]
 
+    # Texts of lines looking the same in both directions (all words) are generated and stored once
+
     def _generate_hurt_texts(self, left_text, right_text):
         l_txt = self._replace_non_empty_characters(left_text, ".")
-        r_txt = self._replace_non_empty_characters(right_text, ".")
+        r_txt = l_txt if right_text == left_text else self._replace_non_empty_characters(right_text, ".")
         return l_txt, r_txt
 
     def _generate_empty_texts(self, left_text, right_text):
         l_txt = " " * len(left_text)
-        r_txt = " " * len(right_text)
+        r_txt = l_txt if len(right_text) == len(left_text) else " " * len(right_text)
         return l_txt, r_txt
 
     def _generate_explode_texts(self, left_text, right_text):
         l_txt = self._replace_non_empty_characters(left_text, "*")
-        r_txt = self._replace_non_empty_characters(right_text, "*")
+        r_txt = l_txt if right_text == left_text else self._replace_non_empty_characters(right_text, "*")
         return l_txt, r_txt
 
     def _replace_non_empty_characters(self, string, replacement):
@@ -183,6 +250,8 @@ class ObjectLine(object):
     """
     Contains information about single line of a game object: DirectionalLine and coordinates
     """
+    __slots__ = ("parent", "directional_line", "x", "y", "potential_x", "potential_y")
+
     def __init__(self, game_object, directional_line):
         """
         Create new instance of ObjectLine
@@ -285,8 +354,17 @@ class GameObject(object):
     """
     Base class for any object in the game
     """
+    # A large file has millions of game objects and their parts, so these have no __dict__ (attributes of each
+    # subclass are declared by its own __slots__). New attributes have to be added to __slots__ too.
+    __slots__ = ("gameplay", "x", "y", "length", "direction", "lines", "jump_trick", "touching_enemies",
+                 "touching_words", "is_on_ground", "current_transformation", "is_transformed",
+                 "initial_directional_lines", "blinking", "inventory", "widths", "initial_health", "initial_x_energy",
+                 "initial_y_energy", "initial_jump_power", "initial_bullets", "initial_capacity", "initial_coins",
+                 "health", "x_energy", "y_energy", "bullets", "capacity", "coins", "_command_action_map")
+
     def __init__(self, gameplay, directional_lines, x, y,
-                 initial_health=100, initial_x_energy=50, initial_y_energy=50, initial_jump_power=2, initial_bullets=0,
+                 initial_health=100, initial_x_energy=50, initial_y_energy=50, initial_jump_power=DEFAULT_JUMP_POWER,
+                 initial_bullets=0,
                  initial_capacity=3, initial_coins=0):
         """
         Create new instance of GameObject
@@ -330,27 +408,36 @@ class GameObject(object):
         self.capacity = self.initial_capacity
         self.coins = self.initial_coins
 
-        # Command button number - [action title - action]. For enemy simply use the list of values.
-        self.command_action_map = {
-            1: None,
-            2: None,
-            3: None,
-            4: None,
-            5: None,
-            6: None,
-            7: None,
-            8: None,
-            9: None,
-            0: None
-        }
+        self._command_action_map = None  # see command_action_map
 
         if isinstance(self, Player) or isinstance(self, Enemy):
-            self.command_action_map[1] = Action(self.gameplay.controller.connection, 4)  # Collect by default
-            self.command_action_map[2] = Action(self.gameplay.controller.connection, 5)  # Uncollect by default
+            self.command_action_map[1] = self.gameplay.controller.content.get_action(4)  # Collect by default
+            self.command_action_map[2] = self.gameplay.controller.content.get_action(5)  # Uncollect by default
 
         if isinstance(self, Player):
             self.gameplay.controller.construct_gui_actions_list(self.command_action_map)
 
+    @property
+    def command_action_map(self):
+        """
+        Command button number - [action title - action]. For enemy simply use the list of values.
+        Created on first use: words never use theirs.
+        """
+        if self._command_action_map is None:
+            self._command_action_map = {
+                1: None,
+                2: None,
+                3: None,
+                4: None,
+                5: None,
+                6: None,
+                7: None,
+                8: None,
+                9: None,
+                0: None
+            }
+        return self._command_action_map
+
     def set_x_no_collision_detection(self, new_x):
         for line in self.lines:
             line.set_x_no_collision_detection(new_x)
@@ -701,8 +788,8 @@ class GameObject(object):
 
         # Restore default actions after clearing (TODO: should be rewritten)
         if isinstance(self, Player) or isinstance(self, Enemy):
-            self.command_action_map[1] = Action(self.gameplay.controller.connection, 4)
-            self.command_action_map[2] = Action(self.gameplay.controller.connection, 5)
+            self.command_action_map[1] = self.gameplay.controller.content.get_action(4)
+            self.command_action_map[2] = self.gameplay.controller.content.get_action(5)
 
     def get_action_number_by_title(self, action_title):
         for command_num in self.command_action_map.keys():
@@ -793,6 +880,8 @@ class GameObject(object):
 
 
 class Player(GameObject):
+    __slots__ = ()
+
     def __init__(self, gameplay, lines, x, y):
         super(Player, self).__init__(gameplay, lines, x, y)
 
@@ -808,6 +897,8 @@ class Player(GameObject):
 
 
 class Coin(GameObject):
+    __slots__ = ("price", "price_change_time", "delta_time")
+
     def __init__(self, gameplay, lines, start_price, x, y, price_change_time=1):
         super(Coin, self).__init__(gameplay, lines, x, y)
         self.price = start_price
@@ -831,9 +922,12 @@ class Coin(GameObject):
 
 
 class Enemy(GameObject):
+    __slots__ = ("default_attack_action",)
+
     def __init__(self, gameplay, lines, x, y):
         super(Enemy, self).__init__(gameplay, lines, x, y)
-        self.default_attack_action = Action(self.gameplay.controller.connection, 3)  # Action to be the first one b.d.
+        # Action to be the first one by default
+        self.default_attack_action = self.gameplay.controller.content.get_action(3)
         self.remove_actions()
 
     def remove_actions(self):
@@ -842,15 +936,29 @@ class Enemy(GameObject):
 
 
 class Word(GameObject):
-    def __init__(self, gameplay, text, language_id, x, y, db_connection=None):
+    __slots__ = ("text", "language_id", "is_consumable", "meaning")
+
+    def __init__(self, gameplay, text, language_id, x, y, content=None, meaning_record=None):
         super(Word, self).__init__(gameplay, (DirectionalLine(text, 0, text, 0, 0),), x, y)
         self.text = text
+        self.language_id = language_id
         self.is_consumable = False  # Defines whether the word can be used for transformation or attribute change
         self.meaning = None
-        self.meaning = Meaning(self, db_connection, text, language_id)
+        self.update_meaning(content, meaning_record)
+
+    def update_meaning(self, content, meaning_record=None):
+        """
+        (Re)create meaning of the word, e.g. after its content has been changed.
+        :param content: game content (ContentStore), the word has no meaning if None
+        :param meaning_record: already resolved MeaningRecord of the word text
+        """
+        self.is_consumable = False
+        self.meaning = Meaning(self, content, self.text, self.language_id, record=meaning_record)
 
 
 class Platform(GameObject):
+    __slots__ = ("function_to_run", "max_width", "move_x_from", "move_x_to")
+
     def __init__(self, gameplay, text, x, y, function_to_run,
                  move_x_from=None, move_x_to=None):
         super(Platform, self).__init__(gameplay, (DirectionalLine(text, 0, text, 0, 0),), x, y)
@@ -886,6 +994,9 @@ class Explosion(GameObject):
     """
     Wave released from epicenter and applying changes (either destructive or not) to all objects that it touches.
     """
+    __slots__ = ("epicenter_width", "epicenter_height", "radius", "current_radius", "subject_changes",
+                 "horizontal_char", "vertical_char")
+
     def __init__(self, gameplay, x, y, epicenter_width, epicenter_height, radius, subject_changes,
                  horizontal_char="-", vertical_char="|"):
         """
@@ -980,76 +1091,66 @@ class Meaning(object):
     """
     Contains information about the meaning of the word: it's visual representation and all its parameters
     """
-    def __init__(self, word, db_connection, text, language_id):
+    __slots__ = ("directional_lines", "immediate_changes", "_command_action_map")
+
+    def __init__(self, word, content, text, language_id, record=None):
+        """
+        Create meaning of the word.
+        :param word: Word the meaning belongs to
+        :param content: game content (ContentStore), the word has no meaning if None
+        :param text: text of the word
+        :param language_id: database id of the language
+        :param record: already resolved MeaningRecord of the text. If None, the record is resolved via content.
+        """
         self.directional_lines = []
 
         # Changes of object's attributes immediately after transformation to a word
         self.immediate_changes = Changes()
 
-        # Actions
-        self.command_action_map = {CMD_1: None, CMD_2: None, CMD_3: None, CMD_4: None, CMD_5: None, CMD_6: None,
-                                   CMD_7: None, CMD_8: None, CMD_9: None, CMD_0: None}
+        # Actions (see command_action_map)
+        self._command_action_map = None
 
-        if not db_connection:
+        if not content:
             return
 
-        # TODO refactor: extract to separate method
-        cursor = db_connection.cursor()
-        cursor.execute("select lin.right_text, lin.right_x_offset, lin.left_text, lin.left_x_offset, lin.y_offset, " +
-                       "ch.health, ch.is_health_absolute, ch.x_energy, ch.is_x_energy_absolute, " +
-                       "ch.y_energy, ch.is_y_energy_absolute, ch.jump_power, ch.is_jump_power_absolute, " +
-                       "ch.capacity, ch.is_capacity_absolute, ch.bullets, ch.is_bullets_absolute, " +
-                       "ch.coins, ch.is_coins_absolute, " +
-                       "w.command_1_action_id, w.command_2_action_id, w.command_3_action_id, w.command_4_action_id, "
-                       "w.command_5_action_id, w.command_6_action_id, w.command_7_action_id, w.command_8_action_id, "
-                       "w.command_9_action_id, w.command_0_action_id, "
-                       "lin.left_is_for_shooting, lin.right_is_for_shooting "
-                       "from languages lang, word_lines_map map, words w, lines lin, changes ch " +
-                       "where w.language_id = lang.id " +
-                       "and w.id = map.word_id " +
-                       "and lin.word_map_id = map.lines_id " +
-                       "and w.immediate_changes_id = ch.id " +
-                       "and lang.id = ? " +
-                       "and lower(w.name) = ? " +
-                       "order by lin.y_offset", (language_id, text.lower()))
-        db_rows = cursor.fetchall()
+        if record is None:
+            record = content.get_meaning_records(language_id, (text,))[text.lower()]
+
+        self._set_from_record(word, content, record)
+
+    @property
+    def command_action_map(self):
+        """
+        Actions of the meaning per command number, created on first use: most words have no meaning
+        """
+        if self._command_action_map is None:
+            self._command_action_map = {CMD_1: None, CMD_2: None, CMD_3: None, CMD_4: None, CMD_5: None, CMD_6: None,
+                                        CMD_7: None, CMD_8: None, CMD_9: None, CMD_0: None}
+        return self._command_action_map
+
+    def _set_from_record(self, word, content, record):
+        """
+        Set properties, actions and lines of the meaning from its resolved record
+        :param word: Word the meaning belongs to
+        :param content: game content to take actions from
+        :param record: MeaningRecord
+        """
+        if record.is_empty():
+            return
 
         # Set properties and actions
-        if db_rows:
-            word.is_consumable = True
-            self.immediate_changes.set_all_fields(None, db_rows[0][5], db_rows[0][6] > 0, db_rows[0][7],
-                                                  db_rows[0][8] > 0, db_rows[0][9], db_rows[0][10] > 0, db_rows[0][11],
-                                                  db_rows[0][12] > 0, db_rows[0][13], db_rows[0][14] > 0,
-                                                  db_rows[0][15], db_rows[0][16] > 0, db_rows[0][17],
-                                                  db_rows[0][18] > 0)
-            if db_rows[0][19]:
-                self.command_action_map[CMD_1] = Action(db_connection, db_rows[0][19])
-            if db_rows[0][20]:
-                self.command_action_map[CMD_2] = Action(db_connection, db_rows[0][20])
-            if db_rows[0][21]:
-                self.command_action_map[CMD_3] = Action(db_connection, db_rows[0][21])
-            if db_rows[0][22]:
-                self.command_action_map[CMD_4] = Action(db_connection, db_rows[0][22])
-            if db_rows[0][23]:
-                self.command_action_map[CMD_5] = Action(db_connection, db_rows[0][23])
-            if db_rows[0][24]:
-                self.command_action_map[CMD_6] = Action(db_connection, db_rows[0][24])
-            if db_rows[0][25]:
-                self.command_action_map[CMD_7] = Action(db_connection, db_rows[0][25])
-            if db_rows[0][26]:
-                self.command_action_map[CMD_8] = Action(db_connection, db_rows[0][26])
-            if db_rows[0][27]:
-                self.command_action_map[CMD_9] = Action(db_connection, db_rows[0][27])
-            if db_rows[0][28]:
-                self.command_action_map[CMD_0] = Action(db_connection, db_rows[0][28])
+        word.is_consumable = True
+        self.immediate_changes.set_all_fields(None, *record.immediate_changes)
+        for command_number, action_id in record.action_ids.iteritems():
+            self.command_action_map[command_number] = content.get_action(action_id)
 
         # Set lines
-        for db_row in db_rows:
-            self.directional_lines.append(DirectionalLine(left_text=db_row[2], left_x_offset=db_row[3],
-                                                          right_text=db_row[0], right_x_offset=db_row[1],
-                                                          y_offset=db_row[4],
-                                                          left_is_for_shooting=db_row[29] > 0,
-                                                          right_is_for_shooting=db_row[30] > 0))
+        for line in record.lines:
+            self.directional_lines.append(DirectionalLine(left_text=line[0], left_x_offset=line[1],
+                                                          right_text=line[2], right_x_offset=line[3],
+                                                          y_offset=line[4],
+                                                          left_is_for_shooting=line[5],
+                                                          right_is_for_shooting=line[6]))
 
 
 class Gameplay(object):
@@ -1058,16 +1159,24 @@ class Gameplay(object):
     """
     def __init__(self, controller, sequence_num, lines, language_id, difficulty, line_spacing, left, top_before_start,
                  top_after_start, right, bottom_before_finish, bottom_after_finish, is_last_gameplay=False,
-                 is_custom_game_builder=False):
+                 is_custom_game_builder=False, is_first_gameplay=None, wrap_column=0, layout=None, seed=DEFAULT_SEED):
         self.controller = controller
         self.is_running = False
         self.sequence_number = sequence_num
         self.is_last_gameplay = is_last_gameplay
+        # The first gameplay has the start platform and the player. Game may start from any part, not just part 1.
+        self.is_first_gameplay = is_first_gameplay
+        if self.is_first_gameplay is None:
+            self.is_first_gameplay = (sequence_num == FIRST_GAMEPLAY_SEQUENCE_NUM)
+        self.is_custom_game_builder = is_custom_game_builder
 
         self.difficulty = difficulty
+        self.left_margin = left
+        self.right_margin = right
+        lines = wrap_lines(lines, wrap_column)
         self.width = left + get_max_width_of_lines(lines) + right
-        # List of empty strings of various length (used for "rendering" of game as a string)
-        self.empty_strings = get_list_of_empty_strings_of_various_length(self.width)
+        self.seed = seed
+        self.finish_random = create_random(seed, RANDOM_STREAM_FINISH, lines)  # placement of the finish platform
         self.y_gravity = 1
 
         self.rows = None  # Array of object lists per each line
@@ -1078,16 +1187,23 @@ class Gameplay(object):
         self.platforms = None
         self.explosions = None
         self.bottom = None
+        self.finish_platform_y = None  # row of the finish platform (in the last gameplay only)
         self.dummy_bottom_platform = None  # Platform to be returned by ObjectLine when hitting the bottom of the game
         self.dummy_top_platform = None  # Platform to be returned by ObjectLine when hitting the top of the game space
         self.dummy_side_platform = None  # Platform to be returned by ObjectLine when colliding with left/right sides
+        self.empty_strings = None  # see render_string2
 
         # Pools
         self.bullets_pool = None
 
+        # Layout the gameplay has been built with (see LayoutBuilder), None for tutorials. If a layout of a previous
+        # build of the same part is passed, the gameplay is built from it instead of being laid out from scratch.
+        self.layout = None
+        self.build_profile = ChunkProfile(sequence_num)  # times and objects of the build (see build_profiler module)
+
         if not is_custom_game_builder:  # FYI: is_custom_game_builder=True only for tutorials
-            GameBuilder(self, lines, language_id, line_spacing, left, top_before_start, top_after_start,
-                        right, bottom_before_finish, bottom_after_finish)
+            self.layout = GameBuilder(self, lines, language_id, line_spacing, left, top_before_start, top_after_start,
+                                      right, bottom_before_finish, bottom_after_finish, layout, seed).layout
 
             self.initial_enemies_count = len(self.enemies)
             self.initial_coins_count = len(self.coins)
@@ -1248,22 +1364,68 @@ class Gameplay(object):
         for platform in self.platforms:
             platform.update_x_position()
 
-    def render_string(self):
-        result = ""
-        for object_lines_in_row in self.rows:
-            result += generate_string_line(object_lines_in_row, self.width) + "\n"
-        return result
-
-    def render_string2(self):
+    def render_string(self, x_from=0, x_to=None):
         """
-        I thought this approach would be faster than simple render_string, however their speeds are equal
-        :return:
+        Render columns from x_from to x_to (excluding) of all rows, so that only the visible part of a wide gameplay
+        is composed.
+        :param x_from: first column
+        :param x_to: column after the last one, None - gameplay width
+        :return: string
         """
+        if x_to is None or x_to > self.width:
+            x_to = self.width
+        x_from = max(0, min(x_from, x_to))
+        result = []
+        for object_lines_in_row in self.rows:
+            result.append(generate_string_line(object_lines_in_row, x_to - x_from, x_from))
+        result.append("")
+        return "\n".join(result)
+
+    def render_string2(self, x_from=0, x_to=None):
+        """
+        Same as render_string, but rows are composed of padded object lines instead of slicing strings. Which one is
+        faster depends on the machine (see calibration module).
+        :param x_from: first column
+        :param x_to: column after the last one, None - gameplay width
+        :return: string
+        """
+        if x_to is None or x_to > self.width:
+            x_to = self.width
+        x_from = max(0, min(x_from, x_to))
+        if self.empty_strings is None or len(self.empty_strings) <= x_to - x_from:
+            # List of empty strings is quadratic in width, so it is created on demand only
+            self.empty_strings = get_list_of_empty_strings_of_various_length(self.width)
         render_rows = []
         for object_lines_in_row in self.rows:
-            render_rows.extend(generate_string_line2(object_lines_in_row, self.width, self.empty_strings))
+            render_rows.extend(generate_string_line2(object_lines_in_row, x_to - x_from, self.empty_strings, x_from))
         return "".join(render_rows)
 
+    def render(self, x_from=0, x_to=None, render_mode=RENDER_MODE_SLICING):
+        """
+        Render columns from x_from to x_to (excluding) of all rows with the provided strategy
+        :param render_mode: RENDER_MODE_SLICING (render_string) or RENDER_MODE_PADDING (render_string2)
+        :return: string
+        """
+        if render_mode == RENDER_MODE_PADDING:
+            return self.render_string2(x_from, x_to)
+        return self.render_string(x_from, x_to)
+
+    def update_word_meanings(self, content, changed_keys):
+        """
+        Recreate meanings of the words whose content has changed. Words placed by a custom game builder (tutorials)
+        are left as they are.
+        :param content: game content
+        :param changed_keys: set of (language id, lowercased text) of changed meanings
+        """
+        if self.is_custom_game_builder or not changed_keys:
+            return
+        words = list(self.words)
+        if self.player:
+            words.extend(self.player.inventory)
+        for word in words:
+            if (word.language_id, word.text.lower()) in changed_keys:
+                word.update_meaning(content)
+
     def get_words_collided_by_player(self):
         return self.player.touching_words
 
@@ -1288,6 +1450,23 @@ class Gameplay(object):
             self.controller.finish_game(success=False,
                                         is_tutorial=(isinstance(self, Tutorial1) or isinstance(self, Tutorial2)))
 
+    def add_finish_platform(self, start_x=None):
+        """
+        Add the finish platform, making this gameplay the last one. Normally done by GameBuilder, but for a followed
+        (growing) file it becomes known that the gameplay is the last one only after it has been built.
+        :param start_x: X coordinate of the platform, None - random one
+        :return: X coordinate of the platform
+        """
+        self.is_last_gameplay = True
+        p_text = "========"
+        if start_x is None:
+            # The platform may not fit between the margins of very narrow texts
+            start_x = self.finish_random.randrange(self.left_margin, max(self.left_margin + 1,
+                                                                         self.width - self.right_margin - len(p_text)))
+        self.platforms.append(Platform(self, p_text, start_x, self.finish_platform_y, self.step_on_finish_platform,
+                                       move_x_from=self.left_margin, move_x_to=self.width - self.right_margin))
+        return start_x
+
     def kill_or_pass_to_next_part(self, game_object):
         """
         When a player reaches the dummy bottom platform, transfer it to the next part of the gameplay, if it is not the
@@ -1318,15 +1497,367 @@ class Gameplay(object):
         return True
 
 
+class OccupancyGrid(object):
+    """
+    Cells of gameplay rows taken by object lines: a bytearray per row, 1 - taken, 0 - free. Free positions for a new
+    object are then found by scanning the bytes of a row at once, instead of checking every object line of the row for
+    every position like Gameplay.is_enough_space does (the results are the same).
+    """
+    def __init__(self, rows_count):
+        """
+        :param rows_count: number of rows of the gameplay
+        """
+        self.cells = [bytearray() for r in range(0, rows_count)]
+
+    def take(self, x, y, length):
+        """
+        Mark cells of a line of text as taken. Like in Gameplay.is_enough_space, the cell after the last character of
+        the line is taken too.
+        :param x: X coordinate of the line
+        :param y: Y coordinate of the line (row), negative ones count from the end like indexes of gameplay rows do
+        :param length: length of the text of the line
+        """
+        start = max(0, x)
+        stop = x + length + 1
+        if stop > start:
+            row_cells = self._get_row_cells(y, stop)
+            row_cells[start:stop] = b"\x01" * (stop - start)
+
+    def take_lines(self, directional_lines, x, y):
+        """
+        Mark cells of an object consisting of the directional lines (looking right) as taken
+        """
+        for dline in directional_lines:
+            self.take(x + dline.x_offsets[RIGHT], y + dline.y_offset, len(dline.texts[RIGHT]))
+
+    def find_free_positions(self, directional_lines, x_from, x_to, y):
+        """
+        Find all positions at which an object consisting of the directional lines can be placed without colliding
+        :param directional_lines: list of directional lines
+        :param x_from: the first X coordinate to check
+        :param x_to: X coordinate after the last one to check
+        :param y: Y coordinate
+        :return: list of suitable X coordinates, in ascending order
+        """
+        positions = None
+        for dline in directional_lines:
+            # TODO currently assumed RIGHT direction
+            length = len(dline.texts[RIGHT])
+            if length == 0:
+                continue
+            offset = dline.x_offsets[RIGHT]
+            row_cells = self._get_row_cells(y + dline.y_offset, x_to + offset + length)
+            free_run = b"\x00" * length
+            if positions is None:
+                # Every position of the first line whose cells are free
+                positions = []
+                end = x_to + offset + length - 1
+                cell_x = row_cells.find(free_run, x_from + offset, end)
+                while cell_x != -1:
+                    positions.append(cell_x - offset)
+                    cell_x = row_cells.find(free_run, cell_x + 1, end)
+            else:
+                positions = [x for x in positions if row_cells.startswith(free_run, x + offset)]
+            if not positions:
+                break
+        return range(x_from, x_to) if positions is None else positions
+
+    def _get_row_cells(self, y, length):
+        """
+        :return: cells of the row, extended with free cells up to the provided length if shorter
+        """
+        row_cells = self.cells[y]
+        if len(row_cells) < length:
+            row_cells.extend(b"\x00" * (length - len(row_cells)))
+        return row_cells
+
+
+class LayoutBuilder(object):
+    """
+    Lays out a gameplay: finds words in the lines and places coins and enemies among them. Only plain data is involved
+    (no game objects and no game content), so that parts can be laid out in other processes (see level_cache module).
+    The result is a layout, a dictionary of built-in types only (suitable for marshal):
+        tokens - [(text, x, y), ...] of the words
+        coins - [(x, y, start price), ...]
+        enemies - [(x, y), ...]
+        finish_x - X coordinate of the finish platform, None until the gameplay is built as the last one (the platform
+        is placed by GameBuilder)
+        seed - seed of the game the layout has been made with
+        dead_ends - [(x, y), ...] of the cells the player can get stuck in (see reachability module), normally empty
+        width - width of the gameplay, it is wider than its lines and margins if words have been moved aside
+    Words under dead ends are moved aside or removed, see _remove_dead_ends.
+    """
+    START_PLATFORM_TEXT = "--------"
+    PLAYER_X = 4
+    PLAYER_Y = 1
+    MAX_NUDGES = 32  # max number of moves of words per part when removing dead ends
+
+    def __init__(self, tokenizer, phrases, lines, difficulty, line_spacing, left, right, top_before_start,
+                 top_after_start, is_first_gameplay, seed=DEFAULT_SEED, profile=None):
+        """
+        :param tokenizer: Tokenizer of the language
+        :param phrases: PhraseAutomaton of the language
+        :param lines: lines of the gameplay (already wrapped, see wrap_lines)
+        :param is_first_gameplay: the start platform and the player are placed in the first gameplay (see Gameplay)
+        :param seed: seed of the game, the same lines, parameters and seed always give the same layout
+        :param profile: ChunkProfile the phases of laying out are timed in
+        Other parameters are the ones of Gameplay.
+        """
+        if profile is None:
+            profile = ChunkProfile()
+        self.difficulty = difficulty
+        self.coins_random = create_random(seed, RANDOM_STREAM_COINS, lines)
+        row_step = line_spacing + 1 if line_spacing >= 0 else 0
+        first_row = max(0, top_before_start) + max(0, top_after_start) - 1
+        with profile.phase(BUILD_PHASE_TOKENIZE):
+            tokens = list(tokenizer.iter_tokens(lines, left, first_row, row_step, phrases))
+        self.layout = {"tokens": tokens, "coins": [], "enemies": [], "finish_x": None, "seed": seed, "dead_ends": [],
+                       "width": left + get_max_width_of_lines(lines) + right}
+        if is_first_gameplay:
+            # The player must be able to walk off the start platform, however short the lines are
+            self.layout["width"] = max(self.layout["width"], left + len(self.START_PLATFORM_TEXT) + 1)
+        rows_count = first_row + 1 + len(lines) * row_step
+
+        # The player enters the first gameplay at its start position, the other ones anywhere at the top
+        solver = ReachabilitySolver(self.layout["width"], rows_count)
+        if is_first_gameplay:
+            solver.take(left, max(0, top_before_start) - 1, len(self.START_PLATFORM_TEXT))
+            entries = [(self.PLAYER_X, self.PLAYER_Y)]
+        else:
+            entries = [(x, 0) for x in range(0, solver.width)]
+        with profile.phase(BUILD_PHASE_REACHABILITY):
+            self._remove_dead_ends(solver, entries)
+
+        with profile.phase(BUILD_PHASE_PLACEMENT):
+            # Cells taken by the objects GameBuilder creates before coins and enemies
+            occupancy_grid = OccupancyGrid(rows_count)
+            if is_first_gameplay:
+                occupancy_grid.take(left, max(0, top_before_start) - 1, len(self.START_PLATFORM_TEXT))
+                occupancy_grid.take_lines(self.create_player_lines(), self.PLAYER_X, self.PLAYER_Y)
+            for text, x, y in self.layout["tokens"]:
+                occupancy_grid.take(x, y, len(text))
+
+            self._place_coins(occupancy_grid)
+            self._place_enemies(occupancy_grid)
+
+    def _remove_dead_ends(self, solver, entries):
+        """
+        Find dead ends of the gameplay and move the words the player gets stuck between aside, one at a time, until it
+        can get through. Once words cannot be moved apart (e.g. there is no room to move them in, with no margins, or
+        MAX_NUDGES moves have not been enough), the words the player gets stuck on are removed instead, so that there
+        is always a way down. Dead ends left (only if there are no words to remove) are kept in the layout.
+        :param solver: ReachabilitySolver of the gameplay, with the cells of the start platform taken
+        :param entries: list of (x, y) the player enters the gameplay at
+        """
+        for text, x, y in self.layout["tokens"]:
+            solver.take(x, y, len(text))
+        dead_ends = solver.find_dead_ends(entries)
+        nudges_count = 0
+        while dead_ends:
+            stuck_cells = [cell for cell in dead_ends if solver.is_standing(*cell)]
+            if not stuck_cells:
+                break
+            if nudges_count < self.MAX_NUDGES and self._nudge_words(solver, *stuck_cells[0]):
+                nudges_count += 1
+            elif not self._remove_blocking_word(solver, *stuck_cells[0]):
+                break
+            dead_ends = solver.find_dead_ends(entries)
+        self.layout["dead_ends"] = dead_ends
+
+    def _nudge_words(self, solver, x, y):
+        """
+        Free the way down from a cell the player gets stuck in: move the word it stands on to the nearest side, so
+        that the cell below becomes free, or else move the words on its sides one cell apart, so that it can walk
+        further. Words in the way of a moved one are pushed along.
+        :param solver: ReachabilitySolver of the gameplay
+        :return: True if words have been moved
+        """
+        tokens = self.layout["tokens"]
+        floor_indexes = sorted((i for i in range(0, len(tokens)) if tokens[i][2] == y + 1), key=lambda i: tokens[i][1])
+        for n in range(0, len(floor_indexes)):
+            text, floor_x, floor_y = tokens[floor_indexes[n]]
+            if floor_x <= x < floor_x + len(text):
+                if self._shift_tokens(solver, ((x - floor_x + 1, floor_indexes[n:]),
+                                               (x - floor_x - len(text), floor_indexes[n::-1]))):
+                    return True
+                break
+        row_indexes = sorted((i for i in range(0, len(tokens)) if tokens[i][2] == y), key=lambda i: tokens[i][1])
+        right_walls = [n for n in range(0, len(row_indexes)) if tokens[row_indexes[n]][1] > x]
+        left_walls = [n for n in range(0, len(row_indexes)) if tokens[row_indexes[n]][1] < x]
+        shifts = []
+        if right_walls:
+            shifts.append((1, row_indexes[right_walls[0]:]))
+        if left_walls:
+            shifts.append((-1, row_indexes[left_walls[-1]::-1]))
+        return self._shift_tokens(solver, shifts)
+
+    def _remove_blocking_word(self, solver, x, y):
+        """
+        Free the way down from a cell the player gets stuck in by removing the word it stands on, or else (it stands on
+        the start platform) the nearest word on its sides
+        :param solver: ReachabilitySolver of the gameplay, cells of the removed word are released
+        :return: True if a word has been removed
+        """
+        tokens = self.layout["tokens"]
+        blocking_indexes = [i for i in range(0, len(tokens))
+                            if tokens[i][2] == y + 1 and tokens[i][1] <= x < tokens[i][1] + len(tokens[i][0])]
+        if not blocking_indexes:
+            blocking_indexes = sorted((i for i in range(0, len(tokens)) if tokens[i][2] == y),
+                                      key=lambda i: min(abs(tokens[i][1] - x),
+                                                        abs(tokens[i][1] + len(tokens[i][0]) - 1 - x)))
+        if not blocking_indexes:
+            return False
+        text, token_x, token_y = tokens.pop(blocking_indexes[0])
+        solver.release(token_x, token_y, len(text))
+        return True
+
+    def _shift_tokens(self, solver, shifts):
+        """
+        Move a token of a row horizontally by the smallest of the shifts, preferably by one that keeps it within the
+        gameplay (otherwise the gameplay is widened, there may be no right margin). The following tokens in the
+        direction of the shift are pushed along as far as needed to keep a space between words (tokens not separated
+        by a space, like a word and a punctuation mark, stay together).
+        :param solver: ReachabilitySolver of the gameplay, cells of the moved tokens are updated
+        :param shifts: list of (shift, indexes of the token and the following ones in the direction of the shift)
+        :return: True if tokens have been moved
+        """
+        tokens = self.layout["tokens"]
+        moves = []  # [(right side of the moved tokens, shift, [(index, new X), ...]), ...]
+        for shift, indexes in shifts:
+            new_xs = []
+            for i in indexes:
+                text, token_x, token_y = tokens[i]
+                if not new_xs:
+                    new_x = token_x + shift
+                else:
+                    previous_text, previous_x, previous_y = tokens[new_xs[-1][0]]
+                    if shift > 0:
+                        space = min(1, token_x - previous_x - len(previous_text))
+                        new_x = max(token_x, new_xs[-1][1] + len(previous_text) + space)
+                    else:
+                        space = min(1, previous_x - token_x - len(text))
+                        new_x = min(token_x, new_xs[-1][1] - space - len(text))
+                    if new_x == token_x:
+                        break
+                new_xs.append((i, new_x))
+            if min(new_x for i, new_x in new_xs) >= 0:
+                moves.append((max(new_x + len(tokens[i][0]) for i, new_x in new_xs), shift, new_xs))
+        if not moves:
+            return False
+        right, shift, new_xs = min(moves, key=lambda move: (move[0] > solver.width, abs(move[1])))
+        if right > solver.width:
+            solver.widen(right)
+            self.layout["width"] = right
+        for i, new_x in new_xs:
+            solver.release(tokens[i][1], tokens[i][2], len(tokens[i][0]))
+        for i, new_x in new_xs:
+            tokens[i] = (tokens[i][0], new_x, tokens[i][2])
+            solver.take(new_x, tokens[i][2], len(tokens[i][0]))
+        return True
+
+    def _place_coins(self, occupancy_grid):
+        """
+        Search for suitable coordinates to place coins. Quantity depends on difficulty level.
+        :param occupancy_grid: OccupancyGrid of the gameplay rows, cells of the coins are marked as taken
+        """
+        if self.difficulty > 0:
+            potential_coordinates = []
+            potential_words_count = 0
+            directional_lines = self.create_coin_lines()
+            for text, x, y in self.layout["tokens"]:
+                potential_y = y - len(directional_lines)
+                potential_xs = occupancy_grid.find_free_positions(directional_lines, x, x + len(text), potential_y)
+                if potential_xs:
+                    potential_coordinates.extend((potential_x, potential_y) for potential_x in potential_xs)
+                    potential_words_count += 1
+
+            # Number of coins for selected difficulty
+            c_count = int(potential_words_count * float(self.difficulty) / 600)  # 600 is got experimentally
+
+            if c_count == 0:
+                c_count = 1  # Eliminating division by zero
+
+            # Step to iterate over coin coordinates (at least 1, see _place_enemies)
+            step = max(1, int(len(potential_coordinates) / c_count))
+
+            # Index of first potential coin coordinate
+            for c_coord in potential_coordinates[::step]:
+                self.layout["coins"].append((c_coord[0], c_coord[1], self.coins_random.randrange(0, 9)))
+                occupancy_grid.take_lines(directional_lines, c_coord[0], c_coord[1])
+
+    def _place_enemies(self, occupancy_grid):
+        """
+        Search for suitable coordinates to place enemies. Quantity depends on difficulty level.
+        :param occupancy_grid: OccupancyGrid of the gameplay rows, cells of the enemies are marked as taken
+        """
+        if self.difficulty > 0:
+            potential_coordinates = []
+            potential_words_count = 0
+            e_directional_lines = self.create_enemy_lines()
+            for text, x, y in self.layout["tokens"]:
+                potential_y = y - len(e_directional_lines)
+                potential_xs = occupancy_grid.find_free_positions(e_directional_lines, x, x + len(text), potential_y)
+                if potential_xs:
+                    potential_coordinates.extend((potential_x, potential_y) for potential_x in potential_xs)
+                    potential_words_count += 1
+
+            # Number of enemies for selected difficulty
+            e_count = int(potential_words_count * float(self.difficulty) / 500)  # 500 is got experimentally
+
+            if e_count == 0:
+                e_count = 1  # Eliminating division by zero
+
+            # TODO add randomness
+            # So that first enemy does not appear right near player's starting position
+            start_coord_index = 0
+            if len(potential_coordinates) > 1:
+                start_coord_index = int(len(potential_coordinates) * 0.3)  # TODO 0.3 is not good in case of many lines
+
+            # Step to iterate over enemy coordinates
+            # (at least 1: there may be less suitable coordinates than enemies, e.g. in a part without words)
+            step = max(1, int((len(potential_coordinates) - start_coord_index) / e_count))
+
+            # Index of first potential enemy coordinate
+            for e_coord in potential_coordinates[start_coord_index::step]:
+                self.layout["enemies"].append(e_coord)
+                occupancy_grid.take_lines(e_directional_lines, e_coord[0], e_coord[1])
+
+    @staticmethod
+    def create_player_lines():
+        return (DirectionalLine("<", 0, ">", 0, 0),)
+
+    @staticmethod
+    def create_coin_lines():
+        return (DirectionalLine("(0)", 0, "(0)", 0, 0),)
+
+    @staticmethod
+    def create_enemy_lines():
+        return (DirectionalLine("__/\"\"|", 1, "|\"\"\__", 0, 0),
+                DirectionalLine("(___._|", 0, "|_.___)", 0, 1))
+
+
 class GameBuilder(object):
     """
-    Builds all game objects from input file.
+    Builds all game objects from input file: lays the gameplay out (see LayoutBuilder), unless a layout of a previous
+    build of the same lines with the same parameters and content is provided (see level_cache module), and creates the
+    objects where the layout says.
     """
     def __init__(self, gameplay, lines, language_id, line_spacing, left, top_before_start, top_after_start, right,
-                 bottom_before_finish, bottom_after_finish):
+                 bottom_before_finish, bottom_after_finish, layout=None, seed=DEFAULT_SEED):
         self.gameplay = gameplay
         self.lines = lines
 
+        content = self.gameplay.controller.content
+        profile = self.gameplay.build_profile
+        profile.is_layout_cached = layout is not None
+        if layout is None:
+            layout = LayoutBuilder(get_tokenizer(language_id, content.get_tokenizer_pattern(language_id)),
+                                   content.get_phrase_automaton(language_id), lines, self.gameplay.difficulty,
+                                   line_spacing, left, right, top_before_start, top_after_start,
+                                   self.gameplay.is_first_gameplay, seed, profile).layout
+        self.layout = dict(layout)  # a copy, the finish platform of this gameplay is not a part of the provided layout
+        self.gameplay.width = self.layout["width"]
+
         self.gameplay.rows = []
         self.gameplay.coins = []
         self.gameplay.enemies = []
@@ -1341,37 +1872,35 @@ class GameBuilder(object):
                 self.gameplay.rows.append([])
 
         # Start-platform
-        if self.gameplay.sequence_number == FIRST_GAMEPLAY_SEQUENCE_NUM:
-            self.gameplay.platforms.append(Platform(self.gameplay, "--------", left, len(self.gameplay.rows) - 1, None))
+        if self.gameplay.is_first_gameplay:
+            self.gameplay.platforms.append(Platform(self.gameplay, LayoutBuilder.START_PLATFORM_TEXT, left,
+                                                    len(self.gameplay.rows) - 1, None))
 
         # Top indentation after start-platform
         if top_after_start > 0:
             for t in range(0, top_after_start):
                 self.gameplay.rows.append([])
 
-        regex = re.compile(
-            "([.,#!?~@$%^&*()_+={}:;/<>'\[\]\"\-])|(\d+)|([^.,#!?~@$%^&*()_+={}:;/<>'\[\]\"\-\d\s]+)")
-        for line in lines:
-            line = line.encode(encoding="utf-8", errors="replace")
-            line = line.decode(encoding="utf-8", errors="replace")
-            self._create_words_from_string(line, language_id, left, len(self.gameplay.rows) - 1, regex,
-                                           self.gameplay.controller.connection)
-            if line_spacing >= 0:
-                for l in range(0, line_spacing + 1):
-                    self.gameplay.rows.append([])
+        row_step = line_spacing + 1 if line_spacing >= 0 else 0
+        self.gameplay.rows.extend([] for r in range(0, len(lines) * row_step))
+        self._create_words(self.layout["tokens"], language_id, content, profile)
 
         # Create player only in the first gameplay (part)
-        if self.gameplay.sequence_number == FIRST_GAMEPLAY_SEQUENCE_NUM:
-            self.gameplay.player = Player(self.gameplay, (DirectionalLine("<", 0, ">", 0, 0),), 4, 1)
+        if self.gameplay.is_first_gameplay:
+            self.gameplay.player = Player(self.gameplay, LayoutBuilder.create_player_lines(), LayoutBuilder.PLAYER_X,
+                                          LayoutBuilder.PLAYER_Y)
 
-        self._place_coins()
-        self._place_enemies()
+        with profile.phase(BUILD_PHASE_COINS):
+            self._create_coins(self.layout["coins"])
+        with profile.phase(BUILD_PHASE_ENEMIES):
+            self._create_enemies(self.layout["enemies"])
 
         # Pool collections
-        bullets = []
-        for b in range(0, (len(self.gameplay.enemies) + 1) * 10):  # Approx. 10 bullets per each enemy and player
-            bullets.append(Bullet(self.gameplay, (DirectionalLine("*", 0, "*", 0, 0),)))
-        self.gameplay.bullets_pool = Pool(bullets)
+        with profile.phase(BUILD_PHASE_BULLETS):
+            bullets = []
+            for b in range(0, (len(self.gameplay.enemies) + 1) * 10):  # Approx. 10 bullets per each enemy and player
+                bullets.append(Bullet(self.gameplay, (DirectionalLine("*", 0, "*", 0, 0),)))
+            self.gameplay.bullets_pool = Pool(bullets)
 
         # Bottom indentation before finish-platform
         if bottom_before_finish > 0:
@@ -1379,12 +1908,9 @@ class GameBuilder(object):
                 self.gameplay.rows.append([])
 
         # Finish-platform
+        self.gameplay.finish_platform_y = len(self.gameplay.rows) - 1
         if self.gameplay.is_last_gameplay:
-            p_text = "========"
-            start_x = random.randrange(left, self.gameplay.width - right - len(p_text))
-            self.gameplay.platforms.append(Platform(self.gameplay, p_text, start_x, len(self.gameplay.rows) - 1,
-                                                    self.gameplay.step_on_finish_platform,
-                                                    move_x_from=left,  move_x_to=self.gameplay.width - right))
+            self.layout["finish_x"] = self.gameplay.add_finish_platform(self.layout["finish_x"])
 
         # Dummy platforms
         self.gameplay.dummy_bottom_platform = Platform(self.gameplay, "", 0, len(self.gameplay.rows) - 1,
@@ -1397,76 +1923,43 @@ class GameBuilder(object):
             for b in range(0, bottom_after_finish):
                 self.gameplay.rows.append([])
 
-    def _create_words_from_string(self, string, language_id, left, y, regex_pattern, connection):
-        for w in regex_pattern.finditer(string):
-            self.gameplay.words.append(Word(self.gameplay, w.group(), language_id, left + w.start(), y, connection))
+        profile.count(BUILD_OBJECT_WORDS, len(self.gameplay.words))
+        profile.count(BUILD_OBJECT_MEANINGS, len([word for word in self.gameplay.words if word.is_consumable]))
+        profile.count(BUILD_OBJECT_COINS, len(self.gameplay.coins))
+        profile.count(BUILD_OBJECT_ENEMIES, len(self.gameplay.enemies))
+        profile.count(BUILD_OBJECT_BULLETS, len(bullets))
+        profile.count(BUILD_OBJECT_PLATFORMS, len(self.gameplay.platforms))
 
-    def _place_coins(self):
+    def _create_words(self, tokens, language_id, content, profile):
         """
-        Search for suitable coordinates to place coins and create Coin objects. Quantity depends on difficulty level.
+        Create Word objects from the tokens. Meanings of all distinct texts are resolved at once.
+        :param tokens: list of (text, x, y)
+        :param language_id: database id of the language
+        :param content: game content to resolve meanings with
+        :param profile: ChunkProfile of the gameplay
         """
-        if self.gameplay.difficulty > 0:
-            potential_coordinates = []
-            potential_words = []
-            directional_lines = (DirectionalLine("(0)", 0, "(0)", 0, 0),)
-            for word in self.gameplay.words:
-                potential_y = word.y - len(directional_lines)
-                for potential_x in range(word.x, word.x + len(word.text)):
-                    if self.gameplay.is_enough_space(directional_lines, potential_x, potential_y):
-                        potential_coordinates.append((potential_x, potential_y))
-                        if word not in potential_words:
-                            potential_words.append(word)
+        with profile.phase(BUILD_PHASE_MEANINGS):
+            meaning_records = content.get_meaning_records(language_id, (token[0] for token in tokens))
+        with profile.phase(BUILD_PHASE_WORDS):
+            for text, x, y in tokens:
+                self.gameplay.words.append(Word(self.gameplay, text, language_id, x, y, content,
+                                                meaning_record=meaning_records[text.lower()]))
 
-            # Number of coins for selected difficulty
-            c_count = int(len(potential_words) * float(self.gameplay.difficulty) / 600)  # 600 is got experimentally
-
-            if c_count == 0:
-                c_count = 1  # Eliminating division by zero
-
-            # Step to iterate over coin coordinates
-            step = int(len(potential_coordinates) / c_count)
-
-            # Index of first potential coin coordinate
-            for c_coord in potential_coordinates[::step]:
-                start_price = random.randrange(0, 9)
-                self.gameplay.coins.append(Coin(self.gameplay, directional_lines, start_price, c_coord[0], c_coord[1],
-                                                price_change_time=2))
-
-    def _place_enemies(self):
+    def _create_coins(self, coins):
         """
-        Search for suitable coordinates to place enemies and create Enemy objects. Quantity depends on difficulty level.
+        :param coins: list of (x, y, start price) of the coins
         """
-        if self.gameplay.difficulty > 0:
-            potential_coordinates = []
-            potential_words = []
-            e_directional_lines = (DirectionalLine("__/\"\"|", 1, "|\"\"\__", 0, 0),
-                                   DirectionalLine("(___._|", 0, "|_.___)", 0, 1))
-            for word in self.gameplay.words:
-                potential_y = word.y - len(e_directional_lines)
-                for potential_x in range(word.x, word.x + len(word.text)):
-                    if self.gameplay.is_enough_space(e_directional_lines, potential_x, potential_y):
-                        potential_coordinates.append((potential_x, potential_y))
-                        if word not in potential_words:
-                            potential_words.append(word)
+        directional_lines = LayoutBuilder.create_coin_lines()  # shared by all coins of the gameplay
+        for x, y, start_price in coins:
+            self.gameplay.coins.append(Coin(self.gameplay, directional_lines, start_price, x, y, price_change_time=2))
 
-            # Number of enemies for selected difficulty
-            e_count = int(len(potential_words) * float(self.gameplay.difficulty) / 500)  # 500 is got experimentally
-
-            if e_count == 0:
-                e_count = 1  # Eliminating division by zero
-
-            # TODO add randomness
-            # So that first enemy does not appear right near player's starting position
-            start_coord_index = 0
-            if len(potential_coordinates) > 1:
-                start_coord_index = int(len(potential_coordinates) * 0.3)  # TODO 0.3 is not good in case of many lines
-
-            # Step to iterate over enemy coordinates
-            step = int((len(potential_coordinates) - start_coord_index) / e_count)
-
-            # Index of first potential enemy coordinate
-            for e_coord in potential_coordinates[start_coord_index::step]:
-                self.gameplay.enemies.append(Enemy(self.gameplay, e_directional_lines, e_coord[0], e_coord[1]))
+    def _create_enemies(self, enemies):
+        """
+        :param enemies: list of (x, y) of the enemies
+        """
+        e_directional_lines = LayoutBuilder.create_enemy_lines()
+        for x, y in enemies:
+            self.gameplay.enemies.append(Enemy(self.gameplay, e_directional_lines, x, y))
 
 
 class Tutorial1(Gameplay):
@@ -1639,7 +2132,7 @@ class Tutorial2(Gameplay):
             DirectionalLine("'|__|", 9, "|__|'", 0, 3),
         )
         gun_word.meaning.immediate_changes.bullets_change = 25
-        gun_word.meaning.command_action_map[1] = Action(controller.connection, 1)
+        gun_word.meaning.command_action_map[1] = controller.content.get_action(1)
         gun_word.meaning.command_action_map[2] = None
         gun_word.is_consumable = True
         self.words.append(gun_word)
@@ -1723,6 +2216,8 @@ class Trick(object):
     """
     Represents collection of sequential coordinate changes (or forces applied to object coordinates)
     """
+    __slots__ = ("stages", "current_stage_id", "is_active")
+
     def __init__(self, stages):
         """
         Create new trick
@@ -1778,6 +2273,8 @@ class Blink(object):
     """
     First "blink", then "un-blink" - this is a single phase of the Blink
     """
+    __slots__ = ("game_object", "times_to_blink", "blinking_type", "is_active", "is_unblinking")
+
     def __init__(self, game_object):
         self.game_object = game_object
         self.times_to_blink = 0
@@ -1839,6 +2336,8 @@ class Poolable(GameObject):
     Game object that is available for pooling: to be part of a collection of reusable instances of game objects.
     Used to avoid creation of a large number of instances. In this case number of instances is limited.
     """
+    __slots__ = ("is_available",)
+
     def __init__(self, gameplay, lines):
         super(Poolable, self).__init__(gameplay, lines, HIDE_X, HIDE_Y)
         self.is_available = True
@@ -1855,6 +2354,7 @@ class Poolable(GameObject):
 
 
 class Bullet(Poolable):
+    __slots__ = ("subject_changes", "shooter")
 
     def __init__(self, gameplay, lines):
         super(Bullet, self).__init__(gameplay, lines)
@@ -0,0 +1,62 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Versioned schema changes of the database. Version of the schema is kept in "PRAGMA user_version": migration N
+# (counting from 1) is applied to the database of version N - 1 and sets its version to N.
+# Never modify already released migrations, append new ones to the end of MIGRATIONS instead.
+
+MIGRATIONS = (
+    # 1: Indexes used by word meaning lookups
+    "create index if not exists words_language_name_idx on words (language_id, lower(name));\n"
+    "create index if not exists word_lines_map_word_id_idx on word_lines_map (word_id);\n"
+    "create index if not exists lines_word_map_id_idx on lines (word_map_id);\n"
+    "analyze;\n",
+    # 2: Token pattern of the language (regular expression), default one is used if empty (see tokenizer.py)
+    "alter table languages add column tokenizer_pattern text;\n",
+)
+
+
+def get_schema_version(db_connection):
+    """
+    :param db_connection: database connection
+    :return: number of migrations already applied to the database
+    """
+    return db_connection.execute("pragma user_version").fetchone()[0]
+
+
+def apply_migrations(db_connection):
+    """
+    Apply all migrations that have not yet been applied to the database. Each migration runs in its own transaction
+    together with the version update, so a failed migration leaves the database at the previous version.
+    Query planner statistics are refreshed after migrations have been applied (PRAGMA optimize). Nothing is written to
+    a database that is up to date.
+    :param db_connection: database connection
+    :return: list of applied migration numbers
+    """
+    applied = []
+    first_version = get_schema_version(db_connection) + 1
+    if first_version > len(MIGRATIONS):
+        return applied
+    for version in range(first_version, len(MIGRATIONS) + 1):
+        db_connection.executescript("begin;\n" +
+                                    MIGRATIONS[version - 1] +
+                                    "pragma user_version = " + str(int(version)) + ";\n" +
+                                    "commit;\n")
+        applied.append(version)
+    db_connection.execute("pragma optimize")
+    return applied
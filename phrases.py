@@ -0,0 +1,106 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Phrases: words of the content whose name consists of several tokens ("wild west", "high-noon"). All phrases of a
+# language are compiled into an Aho-Corasick automaton over tokens, so finding them in a line takes time linear in the
+# number of its tokens, however many phrases there are.
+
+
+class PhraseAutomaton(object):
+    """
+    Aho-Corasick automaton whose alphabet is lowercased tokens. A state is a sequence of tokens that is a prefix of some
+    phrase, state 0 is the empty sequence.
+    """
+    def __init__(self, tokenizer, texts):
+        """
+        :param tokenizer: Tokenizer of the language
+        :param texts: lowercased names of all words of the language, the ones consisting of a single token are skipped
+        """
+        self.transitions = [{}]     # {token: next state} of every state
+        self.fail = [0]             # state of the longest proper suffix that is a prefix of some phrase
+        self.lengths = [()]         # numbers of tokens of the phrases ending in the state, the longest first
+        self.phrase_texts = set()   # lowercased phrases (phrase tokens must be separated exactly like in them)
+        for text in texts:
+            tokens = [match.group().lower() for match in tokenizer.regex.finditer(text)]
+            if len(tokens) > 1:
+                self._add_phrase(tokens)
+                self.phrase_texts.add(text.lower())
+        self._build_fail_links()
+
+    def __len__(self):
+        return len(self.phrase_texts)
+
+    def find_phrases(self, line, matches):
+        """
+        Find phrases in a line, leftmost-longest: of all phrases starting at the same token the longest one is taken,
+        phrases do not overlap.
+        :param line: text line
+        :param matches: list of regular expression matches of all tokens of the line
+        :return: list of (index of the first token, index of the token after the last one) of every phrase found
+        """
+        transitions = self.transitions
+        fail = self.fail
+        lengths = self.lengths
+        candidates = {}  # {index of the first token: [index of the token after the last one, ...]}
+        state = 0
+        for i, match in enumerate(matches):
+            token = match.group().lower()
+            while state and token not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(token, 0)
+            for length in lengths[state]:
+                candidates.setdefault(i + 1 - length, []).append(i + 1)
+
+        result = []
+        position = 0
+        for start in sorted(candidates):
+            if start < position:
+                continue
+            for stop in sorted(candidates[start], reverse=True):
+                # Tokens match, text between them has to match too ("wild west", but not "wild, west")
+                if line[matches[start].start():matches[stop - 1].end()].lower() in self.phrase_texts:
+                    result.append((start, stop))
+                    position = stop
+                    break
+        return result
+
+    def _add_phrase(self, tokens):
+        state = 0
+        for token in tokens:
+            next_state = self.transitions[state].get(token)
+            if next_state is None:
+                next_state = len(self.transitions)
+                self.transitions[state][token] = next_state
+                self.transitions.append({})
+                self.fail.append(0)
+                self.lengths.append(())
+            state = next_state
+        self.lengths[state] = (len(tokens),)
+
+    def _build_fail_links(self):
+        # Breadth-first, so that fail links of shorter states are ready before longer ones need them
+        queue = list(self.transitions[0].itervalues())
+        for state in queue:
+            for token, next_state in self.transitions[state].iteritems():
+                fail_state = self.fail[state]
+                while fail_state and token not in self.transitions[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.transitions[fail_state].get(token, 0)
+                # Phrases ending in the fail state end here too (they are shorter)
+                self.lengths[next_state] = self.lengths[next_state] + self.lengths[self.fail[next_state]]
+                queue.append(next_state)
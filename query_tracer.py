@@ -0,0 +1,280 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Optional instrumentation of the database connection: every executed statement is counted and timed per normalized
+# SQL text and per phase of the game (level build, game loop tick, content editor) in which it was executed.
+# Statements repeated many times within a single run of a phase (e.g. a single level build) are reported as possible
+# N+1 query patterns.
+# sqlite3 of Python 2.7 has no set_trace_callback, so the connection and its cursors are wrapped instead.
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+PHASE_BUILD = "build"
+PHASE_TICK = "tick"
+PHASE_EDITOR = "editor"
+PHASE_OTHER = "other"  # statements executed outside of any phase (startup etc.)
+
+# Min number of executions of the same statement within a single phase run to report it as N+1 pattern
+N_PLUS_ONE_MIN_COUNT = 10
+
+_STRING_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Reduce statement to its shape, so that statements differing only in literal values are counted together.
+    :param sql: SQL statement
+    :return: normalized statement, i.e. "select * from t where id = ? and name in (...)"
+    """
+    sql = _STRING_LITERAL_PATTERN.sub("?", sql)
+    sql = _NUMBER_PATTERN.sub("?", sql)
+    sql = _PARAMETER_LIST_PATTERN.sub("(...)", sql)
+    return _WHITESPACE_PATTERN.sub(" ", sql).strip().lower()
+
+
+class StatementStatistics(object):
+    def __init__(self):
+        self.count = 0
+        self.total_sec = 0.0
+        self.max_sec = 0.0
+        self.max_count_per_run = 0  # max number of executions within a single run of the phase
+
+
+class PhaseStatistics(object):
+    def __init__(self):
+        self.runs = 0
+        self.statements_count = 0
+        self.total_sec = 0.0
+        self.max_statements_per_run = 0
+
+
+class QueryTracer(object):
+    """
+    Collects statistics of statements executed via TracedConnection.
+    """
+    def __init__(self, is_enabled=False):
+        """
+        :param is_enabled: statements are only traced when True
+        """
+        self.is_enabled = is_enabled
+        self.statements = {}    # {(phase, normalized sql): StatementStatistics}
+        self.phases = {}        # {phase: PhaseStatistics}
+        self._local = threading.local()  # phases are tracked per thread (levels may be built in background)
+
+    @property
+    def _phase_stack(self):
+        """
+        :return: list of (phase, {normalized sql: count within the current run}) of the current thread
+        """
+        phase_stack = getattr(self._local, "phase_stack", None)
+        if phase_stack is None:
+            phase_stack = self._local.phase_stack = []
+        return phase_stack
+
+    def begin_phase(self, name):
+        """
+        Attribute statements executed from now on to the phase (until the matching end_phase call). Phases can be
+        nested, the innermost one wins.
+        :param name: phase name (PHASE_BUILD, PHASE_TICK, ...)
+        """
+        self._phase_stack.append((name, {}))
+
+    def end_phase(self):
+        name, run_counts = self._phase_stack.pop()
+        if self.is_enabled:
+            self._finish_run(name, run_counts)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Attribute statements executed within the "with" block to the phase (see begin_phase).
+        :param name: phase name
+        """
+        self.begin_phase(name)
+        try:
+            yield
+        finally:
+            self.end_phase()
+
+    def trace(self, sql, elapsed_sec):
+        """
+        Register single executed statement.
+        :param sql: SQL statement
+        :param elapsed_sec: execution time in seconds
+        """
+        normalized_sql = normalize_sql(sql)
+        if self._phase_stack:
+            phase, run_counts = self._phase_stack[-1]
+            run_counts[normalized_sql] = run_counts.get(normalized_sql, 0) + 1
+        else:
+            phase = PHASE_OTHER
+
+        key = (phase, normalized_sql)
+        statistics = self.statements.get(key)
+        if statistics is None:
+            statistics = self.statements[key] = StatementStatistics()
+        statistics.count += 1
+        statistics.total_sec += elapsed_sec
+        statistics.max_sec = max(statistics.max_sec, elapsed_sec)
+
+        phase_statistics = self._get_phase_statistics(phase)
+        phase_statistics.statements_count += 1
+        phase_statistics.total_sec += elapsed_sec
+
+    def reset(self):
+        self.statements.clear()
+        self.phases.clear()
+
+    def get_n_plus_one_statements(self):
+        """
+        :return: list of ((phase, normalized sql), StatementStatistics) of statements that were executed at least
+        N_PLUS_ONE_MIN_COUNT times within a single run of a phase, most repeated first
+        """
+        result = [(key, statistics) for key, statistics in self.statements.iteritems()
+                  if statistics.max_count_per_run >= N_PLUS_ONE_MIN_COUNT]
+        result.sort(key=lambda item: item[1].max_count_per_run, reverse=True)
+        return result
+
+    def get_report(self):
+        """
+        :return: human readable report of collected statistics
+        """
+        lines = ["Query trace (" + ("enabled" if self.is_enabled else "disabled") + ")", ""]
+
+        lines.append("Phases:")
+        lines.append("  %-8s %8s %10s %12s %14s %12s" % ("phase", "runs", "queries", "per run avg", "per run max",
+                                                          "time ms"))
+        for phase in sorted(self.phases):
+            statistics = self.phases[phase]
+            average = 0.0
+            if statistics.runs:
+                average = float(statistics.statements_count) / statistics.runs
+            lines.append("  %-8s %8d %10d %12.1f %14d %12.1f" % (phase, statistics.runs, statistics.statements_count,
+                                                                  average, statistics.max_statements_per_run,
+                                                                  statistics.total_sec * 1000))
+
+        lines.append("")
+        lines.append("Possible N+1 patterns (same statement executed " + str(N_PLUS_ONE_MIN_COUNT) +
+                     "+ times within a single run of a phase):")
+        n_plus_one_statements = self.get_n_plus_one_statements()
+        if not n_plus_one_statements:
+            lines.append("  none")
+        for (phase, sql), statistics in n_plus_one_statements:
+            lines.append("  [%s] %d times per run: %s" % (phase, statistics.max_count_per_run, sql))
+
+        lines.append("")
+        lines.append("Statements (slowest total first):")
+        lines.append("  %-8s %8s %10s %10s  %s" % ("phase", "count", "total ms", "max ms", "statement"))
+        for (phase, sql), statistics in sorted(self.statements.iteritems(), key=lambda item: item[1].total_sec,
+                                               reverse=True):
+            lines.append("  %-8s %8d %10.2f %10.2f  %s" % (phase, statistics.count, statistics.total_sec * 1000,
+                                                           statistics.max_sec * 1000, sql))
+        return "\n".join(lines)
+
+    def _get_phase_statistics(self, phase):
+        statistics = self.phases.get(phase)
+        if statistics is None:
+            statistics = self.phases[phase] = PhaseStatistics()
+        return statistics
+
+    def _finish_run(self, phase, run_counts):
+        phase_statistics = self._get_phase_statistics(phase)
+        phase_statistics.runs += 1
+        phase_statistics.max_statements_per_run = max(phase_statistics.max_statements_per_run,
+                                                      sum(run_counts.itervalues()))
+        for normalized_sql, count in run_counts.iteritems():
+            statistics = self.statements.get((phase, normalized_sql))
+            if statistics:
+                statistics.max_count_per_run = max(statistics.max_count_per_run, count)
+
+
+class TracedCursor(object):
+    """
+    Cursor wrapper reporting executed statements to the tracer. Everything else is delegated to the wrapped cursor.
+    """
+    def __init__(self, cursor, tracer):
+        self._cursor = cursor
+        self._tracer = tracer
+
+    def execute(self, sql, parameters=()):
+        if not self._tracer.is_enabled:
+            return self._cursor.execute(sql, parameters)
+        start_time = time.time()
+        try:
+            return self._cursor.execute(sql, parameters)
+        finally:
+            self._tracer.trace(sql, time.time() - start_time)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not self._tracer.is_enabled:
+            return self._cursor.executemany(sql, seq_of_parameters)
+        start_time = time.time()
+        try:
+            return self._cursor.executemany(sql, seq_of_parameters)
+        finally:
+            self._tracer.trace(sql, time.time() - start_time)
+
+    def executescript(self, sql_script):
+        if not self._tracer.is_enabled:
+            return self._cursor.executescript(sql_script)
+        start_time = time.time()
+        try:
+            return self._cursor.executescript(sql_script)
+        finally:
+            self._tracer.trace(sql_script, time.time() - start_time)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class TracedConnection(object):
+    """
+    sqlite3 connection wrapper whose statements (executed directly or via its cursors) are traced by QueryTracer.
+    Everything else is delegated to the wrapped connection.
+    """
+    def __init__(self, db_connection, tracer):
+        """
+        :param db_connection: sqlite3 connection
+        :param tracer: QueryTracer
+        """
+        self._connection = db_connection
+        self.tracer = tracer
+
+    def cursor(self):
+        return TracedCursor(self._connection.cursor(), self.tracer)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
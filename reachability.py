@@ -0,0 +1,238 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Checking that the player can get through a part: from where it enters the part down below the text, i.e. to the
+# finish platform or to the next part. Dead ends are the places the player can get to but never get out of (a pit
+# between words it cannot jump out of, when lines are close to each other and there are no margins).
+#
+# Movement of the player (in its initial shape, one cell) is simulated tick by tick like Gameplay.update does it, but
+# for all X coordinates of a row at once: the cells of a row are bits of an integer, 1 - the player may be there. A
+# state is a row and the number of jump stages left (see Trick): in every tick the player moves one cell to either
+# side (unless the cell is taken), then gravity pulls it one row down, while a jump stage lifts it one row up.
+
+from constants import *
+
+
+def _move(positions, free):
+    """
+    :param positions: X coordinates (bits) of the player in a row
+    :param free: free cells of the row
+    :return: X coordinates the player may have after moving one cell to either side or staying. The moves are
+    symmetric, so this is also where the player may have come from.
+    """
+    return positions | ((positions << 1) & free) | ((positions >> 1) & free)
+
+
+def _fill(seeds, mask, width):
+    """
+    Extend the seeds to the whole runs of the mask bits they are in, in log(width) steps (Kogge-Stone)
+    """
+    result = seeds & mask
+    for shift in (1, -1):
+        run = mask
+        step = 1
+        while step < width:
+            if shift > 0:
+                result |= (result << step) & run
+                run &= run << step
+            else:
+                result |= (result >> step) & run
+                run &= run >> step
+            step <<= 1
+    return result
+
+
+def _iter_bits(mask):
+    x = 0
+    while mask:
+        if mask & 1:
+            yield x
+        mask >>= 1
+        x += 1
+
+
+class ReachabilitySolver(object):
+    """
+    Cells of a part taken by words and platforms, and movement of the player over them. Gravity is assumed to be 1
+    (see Gameplay.y_gravity), so each stage of a jump lifts the player by one row. Coins and enemies are not obstacles:
+    coins are collected on touch and enemies move away.
+    """
+    def __init__(self, width, rows_count, jump_power=DEFAULT_JUMP_POWER):
+        """
+        :param width: width of the part
+        :param rows_count: number of rows of the part down to the last row of the text, the player is through the
+        part as soon as it falls below them
+        :param jump_power: number of jump stages of the player (see GameObject)
+        """
+        self.width = width
+        self.rows_count = rows_count
+        self.jump_power = jump_power
+        self.full_mask = (1 << width) - 1
+        self.taken = [0] * rows_count
+        self.is_bottom_reachable = False  # set by find_dead_ends
+
+    def widen(self, width):
+        """
+        Add free cells on the right side of the part
+        """
+        self.width = width
+        self.full_mask = (1 << width) - 1
+
+    def take(self, x, y, length):
+        """
+        Mark cells of a line of text as taken
+        """
+        if 0 <= y < self.rows_count and length > 0:
+            self.taken[y] |= (((1 << length) - 1) << max(0, x)) & self.full_mask
+
+    def release(self, x, y, length):
+        """
+        Mark cells of a line of text as free (the line has been moved)
+        """
+        if 0 <= y < self.rows_count and length > 0:
+            self.taken[y] &= ~(((1 << length) - 1) << max(0, x))
+
+    def find_dead_ends(self, entries):
+        """
+        Find the cells the player can get to from the entries, but not below the text from there
+        :param entries: list of (x, y) the player may enter the part at, not jumping
+        :return: list of (x, y) of the dead end cells, the lowest rows first
+        """
+        free = [self.full_mask & ~taken for taken in self.taken]
+        reached = self._find_reached(free, entries)
+        escaping = self._find_escaping(free)
+        dead_ends = []
+        for y in range(self.rows_count - 1, -1, -1):
+            dead_mask = 0
+            for stage in range(0, max(1, self.jump_power)):
+                dead_mask |= reached.get((stage, y), 0) & ~escaping.get((stage, y), 0)
+            dead_ends.extend((x, y) for x in _iter_bits(dead_mask))
+        return dead_ends
+
+    def is_standing(self, x, y):
+        """
+        :return: True if the cell below the provided one is taken (the player stands there)
+        """
+        return y + 1 < self.rows_count and bool(self.taken[y + 1] >> x & 1)
+
+    def _get_free(self, free, y):
+        if y < 0:
+            return 0  # the top of the part stops jumps
+        if y >= self.rows_count:
+            return self.full_mask
+        return free[y]
+
+    def _find_reached(self, free, entries):
+        """
+        :return: {(jump stages left, y): X coordinates (bits)} of the states the player can get to from the entries
+        """
+        reached = {}
+        pending = {}
+        for x, y in entries:
+            if 0 <= y < self.rows_count and 0 <= x < self.width:
+                pending[(0, y)] = pending.get((0, y), 0) | ((1 << x) & free[y])
+
+        def add(stage, y, positions):
+            if y >= self.rows_count:
+                if positions:
+                    self.is_bottom_reachable = True
+                return
+            positions &= ~reached.get((stage, y), 0)
+            if positions:
+                pending[(stage, y)] = pending.get((stage, y), 0) | positions
+
+        self.is_bottom_reachable = False
+        top_stage = self.jump_power - 1
+        while pending:
+            (stage, y), positions = pending.popitem()
+            positions &= ~reached.get((stage, y), 0)
+            if not positions:
+                continue
+            row_free = free[y]
+            above_free = self._get_free(free, y - 1)
+            if stage == 0:
+                below_free = self._get_free(free, y + 1)
+                standing = row_free & ~below_free
+                # Walking along the cells the player stands on
+                positions |= _fill(_move(positions, row_free) & standing, standing, self.width)
+                positions &= ~reached.get((0, y), 0)
+                reached[(0, y)] = reached.get((0, y), 0) | positions
+                add(0, y + 1, _move(positions, row_free) & below_free)
+                if self.jump_power > 0:
+                    jumped = _move(positions & standing, row_free)
+                    add(top_stage, y - 1, jumped & above_free)
+                    add(top_stage, y, jumped & ~above_free)
+            else:
+                reached[(stage, y)] = reached.get((stage, y), 0) | positions
+                moved = _move(positions, row_free)
+                add(stage - 1, y - 1, moved & above_free)
+                add(stage - 1, y, moved & ~above_free)
+        return reached
+
+    def _find_escaping(self, free):
+        """
+        :return: {(jump stages left, y): X coordinates (bits)} of the states the player can get below the text from.
+        Found backwards from the last row: a state escapes if any of its moves leads to a state that escapes.
+        """
+        escaping = {}
+        pending = {}
+        last_row = self.rows_count - 1
+        if last_row >= 0:
+            pending[(0, last_row)] = free[last_row]  # nothing is below the last row
+
+        def add(stage, y, positions):
+            if 0 <= y < self.rows_count:
+                positions &= ~escaping.get((stage, y), 0)
+                if positions:
+                    pending[(stage, y)] = pending.get((stage, y), 0) | positions
+
+        top_stage = self.jump_power - 1
+        while pending:
+            (stage, y), positions = pending.popitem()
+            row_free = free[y]
+            positions &= row_free & ~escaping.get((stage, y), 0)
+            if not positions:
+                continue
+            below_free = self._get_free(free, y + 1)
+            above_free = self._get_free(free, y - 1)
+            standing = row_free & ~below_free
+            if stage == 0:
+                # The player walks to an escaping cell it stands on from anywhere on the same run of such cells
+                positions |= _fill(positions & standing, standing, self.width)
+            escaping[(stage, y)] = escaping.get((stage, y), 0) | positions
+            if stage == 0:
+                # Falling into the row, standing in it (this row) and the last jump stage ending in it
+                above_row_free = self._get_free(free, y - 1)
+                add(0, y - 1, _move(positions & above_row_free, above_row_free))
+                add(0, y, _move(positions & standing, row_free))
+                if self.jump_power > 1:
+                    below_row_free = self._get_free(free, y + 1)
+                    add(1, y + 1, _move(positions & below_row_free, below_row_free))
+                    add(1, y, _move(positions & ~above_free, row_free))
+            elif stage < top_stage:
+                below_row_free = self._get_free(free, y + 1)
+                add(stage + 1, y + 1, _move(positions & below_row_free, below_row_free))
+                add(stage + 1, y, _move(positions & ~above_free, row_free))
+            if stage == top_stage and self.jump_power > 0:
+                # Jumps from the cells the player stands on, up into the row or against the row above
+                if y + 1 < self.rows_count:
+                    below_row_free = free[y + 1]
+                    below_standing = below_row_free & ~self._get_free(free, y + 2)
+                    add(0, y + 1, _move(positions & below_row_free, below_row_free) & below_standing)
+                add(0, y, _move(positions & ~above_free, row_free) & standing)
+        return escaping
@@ -0,0 +1,75 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Tests of the content store. Run from the game folder:
+#     python -m unittest discover tests
+
+import marshal
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from content import ContentStore, MeaningCache
+from migrations import apply_migrations
+
+DB_FILE_NAME = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data.db")
+LANGUAGE_ID = 1
+PHRASE_WITHOUT_MEANING = u"high noon"  # a word of several tokens that has no meaning
+
+
+class ContentPackTest(unittest.TestCase):
+    """
+    A store loaded from a content pack must be the same content as the one loaded from the database
+    """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        db_file_name = os.path.join(self.temp_dir, "data.db")
+        shutil.copy(DB_FILE_NAME, db_file_name)
+        self.connection = sqlite3.connect(db_file_name)
+        apply_migrations(self.connection)
+        changes_id = self.connection.execute("select min(id) from changes").fetchone()[0]
+        self.connection.execute("insert into words (name, language_id, immediate_changes_id) values (?, ?, ?)",
+                                (PHRASE_WITHOUT_MEANING, LANGUAGE_ID, changes_id))
+        self.connection.commit()
+
+        self.db_content = ContentStore(self.connection, MeaningCache())
+        self.pack_content = ContentStore(cache=MeaningCache())
+        # Through marshal, as the pack is written to a file (see content_pack module)
+        self.pack_content.load_from_pack_data(marshal.loads(marshal.dumps(self.db_content.get_pack_data())))
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_version(self):
+        self.assertEqual(self.db_content.get_version(), self.pack_content.get_version())
+
+    def test_phrase_automaton(self):
+        db_automaton = self.db_content.get_phrase_automaton(LANGUAGE_ID)
+        pack_automaton = self.pack_content.get_phrase_automaton(LANGUAGE_ID)
+        self.assertIn(PHRASE_WITHOUT_MEANING, db_automaton.phrase_texts)
+        self.assertEqual(db_automaton.phrase_texts, pack_automaton.phrase_texts)
+        self.assertEqual(db_automaton.transitions, pack_automaton.transitions)
+        self.assertEqual(db_automaton.fail, pack_automaton.fail)
+        self.assertEqual(db_automaton.lengths, pack_automaton.lengths)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Tests of laying parts out. Run from the game folder:
+#     python -m unittest discover tests
+
+import unittest
+
+from logic import LayoutBuilder
+from phrases import PhraseAutomaton
+from reachability import ReachabilitySolver
+from tokenizer import get_tokenizer
+
+LANGUAGE_ID = 1
+
+
+class DeadEndsTest(unittest.TestCase):
+    """
+    The player must always be able to get through a part, also when words cannot be moved apart
+    """
+    def setUp(self):
+        self.tokenizer = get_tokenizer(LANGUAGE_ID)
+        self.phrases = PhraseAutomaton(self.tokenizer, [])
+
+    def lay_out(self, lines, line_spacing, left, right, top_before_start, top_after_start, is_first_gameplay):
+        """
+        :return: (layout, dead ends of the layout found by a new solver)
+        """
+        layout = LayoutBuilder(self.tokenizer, self.phrases, lines, 0, line_spacing, left, right, top_before_start,
+                               top_after_start, is_first_gameplay).layout
+        row_step = line_spacing + 1 if line_spacing >= 0 else 0
+        first_row = max(0, top_before_start) + max(0, top_after_start) - 1
+        solver = ReachabilitySolver(layout["width"], first_row + 1 + len(lines) * row_step)
+        if is_first_gameplay:
+            solver.take(left, max(0, top_before_start) - 1, len(LayoutBuilder.START_PLATFORM_TEXT))
+            entries = [(LayoutBuilder.PLAYER_X, LayoutBuilder.PLAYER_Y)]
+        else:
+            entries = [(x, 0) for x in range(0, solver.width)]
+        for text, x, y in layout["tokens"]:
+            solver.take(x, y, len(text))
+        return layout, solver.find_dead_ends(entries)
+
+    def test_words_that_cannot_be_moved_apart(self):
+        # No margins and no line spacing: moving words aside does not free the way down
+        lines = [u"x abcdefghij abcdefghij abcd abcd ab abcd\n", u"x abcdefghij abcdefghij x abcd\n",
+                 u"x abcdef ab abcd abcdef x\n", u"x abcdefghij abcd abcdefghij abcdefghij\n",
+                 u"abcdefghij x abcdefghij abcdef ab abcdef\n", u"abcdef\n"]
+        layout, dead_ends = self.lay_out(lines, 0, 0, 0, 2, 1, False)
+        self.assertEqual([], dead_ends)
+        self.assertEqual([], layout["dead_ends"])
+        self.assertLess(len(layout["tokens"]), sum(len(line.split()) for line in lines))  # a word has been removed
+
+    def test_lines_shorter_than_start_platform(self):
+        layout, dead_ends = self.lay_out([u"x b.\n"], 0, 0, 2, 5, 3, True)
+        self.assertEqual([], dead_ends)
+        self.assertEqual([], layout["dead_ends"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf8 -*-
+
+# Iwillbia
+# Copyright (C) 2018 Žans Kļimovičs
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# Splitting text of a chunk to words. Every language may have its own token pattern (languages.tokenizer_pattern
+# column, the default pattern is used if it is empty). Patterns are compiled once per process and kept in the
+# registry, keyed by language id.
+
+import re
+import threading
+
+# Punctuation marks one by one, numbers and runs of letters (any alphabet)
+DEFAULT_TOKENIZER_PATTERN = ur"([.,#!?~@$%^&*()_+={}:;/<>'\[\]\"\-])|(\d+)|([^.,#!?~@$%^&*()_+={}:;/<>'\[\]\"\-\d\s]+)"
+
+
+class Tokenizer(object):
+    """
+    Compiled token pattern of a language
+    """
+    def __init__(self, pattern):
+        """
+        :param pattern: regular expression matching a single token
+        """
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.UNICODE)
+
+    def iter_tokens(self, lines, left, first_row, row_step, phrases=None):
+        """
+        :param lines: list of text lines
+        :param left: x of the first column of the text
+        :param first_row: row of the first line
+        :param row_step: number of rows between two consecutive lines
+        :param phrases: PhraseAutomaton of the language, tokens of every phrase found are joined into a single token
+        :return: generator of (text, x, row) of every token
+        """
+        # Scanning the joined text of the whole chunk instead has turned out to be slower: position of every token
+        # then has to be mapped to its line in Python code
+        finditer = self.regex.finditer
+        row = first_row
+        for line in lines:
+            if not phrases:
+                for match in finditer(line):
+                    yield match.group(), left + match.start(), row
+            else:
+                matches = list(finditer(line))
+                position = 0
+                for start, stop in phrases.find_phrases(line, matches):
+                    for match in matches[position:start]:
+                        yield match.group(), left + match.start(), row
+                    yield line[matches[start].start():matches[stop - 1].end()], left + matches[start].start(), row
+                    position = stop
+                for match in matches[position:]:
+                    yield match.group(), left + match.start(), row
+            row += row_step
+
+
+_tokenizers = {}  # {language id: Tokenizer}
+_lock = threading.Lock()
+
+
+def get_tokenizer(language_id, pattern=None):
+    """
+    Get compiled tokenizer of the language from the registry. It is recompiled only if the pattern of the language has
+    changed (i.e. content has been reloaded).
+    :param language_id: database id of the language
+    :param pattern: token pattern of the language, None - DEFAULT_TOKENIZER_PATTERN
+    :return: Tokenizer
+    """
+    pattern = pattern or DEFAULT_TOKENIZER_PATTERN
+    tokenizer = _tokenizers.get(language_id)
+    if tokenizer is None or tokenizer.pattern != pattern:
+        with _lock:
+            tokenizer = _tokenizers.get(language_id)
+            if tokenizer is None or tokenizer.pattern != pattern:
+                tokenizer = Tokenizer(pattern)
+                _tokenizers[language_id] = tokenizer
+    return tokenizer
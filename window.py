@@ -16,9 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import json
 import tkFileDialog
+import tkFont
 import webbrowser
 from editor.editor import *
+from estimator import sample_text, estimate_build
+from query_tracer import PHASE_EDITOR
 
 
 def show_editor_warning():
@@ -99,6 +103,20 @@ class Window(tk.Tk):
             GameSettingsDialog(self, file_path)
         self.focus_set()
 
+    def show_open_campaign_dialog(self):
+        """
+        Open directory dialog and pass chosen directory path to the controller function: all files of the directory
+        are played one after another
+        """
+        if self.controller.is_game_already_running() and self.controller.current_file_name:
+            if not self.ask_new_gameplay_confirm():
+                return
+
+        dir_path = tkFileDialog.askdirectory(title='Choose directory for the campaign', mustexist=True)
+        if dir_path:
+            GameSettingsDialog(self, dir_path)
+        self.focus_set()
+
     def start_tutorial(self):
         if self.controller.is_game_already_running():
             if not self.ask_new_gameplay_confirm():
@@ -129,7 +147,8 @@ class Window(tk.Tk):
         if file_name:
             file_str = str(file_name)
 
-        self.title(pause_str + file_str + " (" + str(current_part) + " of " + str(parts_total) + ") - " + APP_NAME)
+        parts_total_str = "?" if parts_total is None else str(parts_total)  # not known until the file is read
+        self.title(pause_str + file_str + " (" + str(current_part) + " of " + parts_total_str + ") - " + APP_NAME)
 
     def update_info(self, health, x_energy, y_energy, jump_power, capacity, bullets, coins, words):
         """
@@ -197,12 +216,13 @@ class Window(tk.Tk):
         """Set value inside inventory panel"""
         self.info_area.inventory_panel.word_value.config(text=inventory_string)
 
-    def set_scrollable_area_size(self, text):
+    def set_scrollable_area_size(self, columns, rows):
         """
-        Make scrollbars of the game area adjust to text content size correctly
-        :param text: text to adjust to
+        Make scrollbars of the game area adjust to the gameplay size correctly
+        :param columns: gameplay width
+        :param rows: gameplay height
         """
-        self.game_area.set_scrollable_area_size(text)
+        self.game_area.set_scrollable_area_size(columns, rows)
 
     def follow_player_y_view(self, offset):
         self.game_area.canvas.yview_moveto(offset)
@@ -246,15 +266,37 @@ class Window(tk.Tk):
 
     def show_word_editor_dialog(self):
         show_editor_warning()
-        EditorMainDialog(self, self.controller.connection)
+        with self.controller.query_tracer.phase(PHASE_EDITOR):
+            EditorMainDialog(self, self.controller.connection)
 
     def show_action_editor_dialog(self):
         show_editor_warning()
-        ActionEditorDialog(self, self.controller.connection)
+        with self.controller.query_tracer.phase(PHASE_EDITOR):
+            ActionEditorDialog(self, self.controller.connection)
 
     def show_change_editor_dialog(self):
         show_editor_warning()
-        ChangeEditorDialog(self, self.controller.connection)
+        with self.controller.query_tracer.phase(PHASE_EDITOR):
+            ChangeEditorDialog(self, self.controller.connection)
+
+    def toggle_query_tracing(self):
+        self.controller.query_tracer.is_enabled = self.menu_bar.is_query_tracing_enabled.get()
+
+    def show_query_report_dialog(self):
+        QueryReportDialog(self, self.controller.query_tracer)
+
+    def toggle_build_profiling(self):
+        self.controller.build_profiler.is_enabled = self.menu_bar.is_build_profiling_enabled.get()
+
+    def show_build_report_dialog(self):
+        BuildReportDialog(self, self.controller.build_profiler)
+
+    def calibrate_performance(self):
+        result = self.controller.calibrate()
+        self.show_message("Settings have been tuned to the speed of this computer:\n\n" + result.get_report())
+        settings_error = self.controller.save_settings()
+        if settings_error:
+            self.show_message(settings_error)
 
     def copy_to_clipboard(self, text):
         self.clipboard_clear()
@@ -262,7 +304,10 @@ class Window(tk.Tk):
         self.update()
 
     def copy_game_to_clipboard(self):
-        self.copy_to_clipboard(self.game_area.canvas.itemcget(self.game_area.text_id, "text"))
+        # Game area displays the visible columns only, so the whole gameplay is rendered once again
+        gameplay = self.controller.gameplays.get(self.controller.active_gameplay_number)
+        if gameplay:
+            self.copy_to_clipboard(gameplay.render_string())
 
     def open_online_help(self):
         webbrowser.open("https://github.com/irrollforwardable/iwillbia/wiki")
@@ -291,23 +336,45 @@ class GameArea(tk.Frame):
         self.canvas.grid(row=0, column=0, sticky=tk.NSEW)
         self.canvas.configure(xscrollcommand=self.horizontal_scroll.set, yscrollcommand=self.vertical_scroll.set)
 
-        self.text_id = self.canvas.create_text(10, 5, text="", font=(self.font_name, self.font_size), anchor=tk.NW,
-                                               justify=tk.LEFT, fill="#000000")
-
-    def render(self, text):
+        self.text_x = 10
+        self.text_y = 5
+        self.text_id = self.canvas.create_text(self.text_x, self.text_y, text="", font=(self.font_name, self.font_size),
+                                               anchor=tk.NW, justify=tk.LEFT, fill="#000000")
+        # Font is monospaced, so sizes of a single character are enough to map columns to pixels
+        font = tkFont.Font(family=self.font_name, size=self.font_size)
+        self.char_width = font.measure("0")
+        self.line_height = font.metrics("linespace")
+        self.columns = 0
+
+    def render(self, text, x_from=0):
         """
         Update the entire content of text with the text in parameter
         :param text:
+        :param x_from: gameplay column the text starts at (see get_visible_columns)
         """
         self.canvas.itemconfig(self.text_id, text=text)
+        self.canvas.coords(self.text_id, self.text_x + x_from * self.char_width, self.text_y)
+
+    def set_scrollable_area_size(self, columns, rows):
+        """
+        Make scrollbars adjust to the gameplay size. Scroll region covers the whole gameplay, while only its visible
+        columns are rendered.
+        :param columns: gameplay width
+        :param rows: gameplay height
+        """
+        self.columns = columns
+        self.canvas.configure(scrollregion=(0, 0, 2 * self.text_x + columns * self.char_width,
+                                            2 * self.text_y + rows * self.line_height))
 
-    def set_scrollable_area_size(self, text):
+    def get_visible_columns(self):
         """
-        Make scrollbars adjust to text content size correctly
-        :param text: text to adjust to
+        :return: (first visible column, column after the last visible one) of the gameplay
         """
-        self.render(text)
-        self.canvas.configure(scrollregion=self.canvas.bbox(tk.ALL))
+        region_width = 2 * self.text_x + self.columns * self.char_width
+        first, last = self.canvas.xview()
+        x_from = int((first * region_width - self.text_x) // self.char_width)
+        x_to = int(-(-(last * region_width - self.text_x) // self.char_width)) + 1
+        return max(0, x_from), min(self.columns, x_to)
 
 
 class InfoArea(tk.Frame):
@@ -528,6 +595,7 @@ class MenuBar(tk.Menu):
         # File menu
         self.file_menu = tk.Menu(self, tearoff=0)
         self.file_menu.add_command(label="New game", command=self.parent.show_open_file_dialog)
+        self.file_menu.add_command(label="New campaign...", command=self.parent.show_open_campaign_dialog)
         self.file_menu.add_command(label="Tutorial", command=self.parent.start_tutorial)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Exit", command=self.parent.quit)
@@ -550,6 +618,21 @@ class MenuBar(tk.Menu):
         self.edit_menu.add_cascade(label="Content Editor", menu=self.content_editor_menu)
         self.add_cascade(label="Edit", menu=self.edit_menu)
 
+        # Diagnostics
+        self.diagnostics_menu = tk.Menu(self, tearoff=0)
+        self.is_query_tracing_enabled = tk.BooleanVar(value=self.parent.controller.query_tracer.is_enabled)
+        self.diagnostics_menu.add_checkbutton(label="Trace database queries", variable=self.is_query_tracing_enabled,
+                                              command=self.parent.toggle_query_tracing)
+        self.diagnostics_menu.add_command(label="Query report...", command=self.parent.show_query_report_dialog)
+        self.diagnostics_menu.add_separator()
+        self.is_build_profiling_enabled = tk.BooleanVar(value=self.parent.controller.build_profiler.is_enabled)
+        self.diagnostics_menu.add_checkbutton(label="Profile level builds", variable=self.is_build_profiling_enabled,
+                                              command=self.parent.toggle_build_profiling)
+        self.diagnostics_menu.add_command(label="Build report...", command=self.parent.show_build_report_dialog)
+        self.diagnostics_menu.add_separator()
+        self.diagnostics_menu.add_command(label="Calibrate performance", command=self.parent.calibrate_performance)
+        self.add_cascade(label="Diagnostics", menu=self.diagnostics_menu)
+
         # Help
         self.help_menu = tk.Menu(self, tearoff=0)
         self.help_menu.add_command(label="Online Help", command=self.parent.open_online_help)
@@ -601,6 +684,7 @@ class PreferencesDialog(tk.Toplevel):
 
 
 class GameSettingsDialog(tk.Toplevel):
+    ESTIMATE_DELAY_MS = 300  # estimate is updated once values stop changing for that long
 
     def __init__(self, parent, file_name):
         tk.Toplevel.__init__(self, parent)
@@ -636,7 +720,15 @@ class GameSettingsDialog(tk.Toplevel):
         self.bottom_after_finish_value = tk.IntVar(body_panel)
         self.bottom_after_finish_value.set(3)
         self.lines_per_chunk_value = tk.IntVar(body_panel)
-        self.lines_per_chunk_value.set(10)
+        self.lines_per_chunk_value.set(parent.controller.settings.lines_per_chunk)
+        self.start_part_value = tk.IntVar(body_panel)
+        self.start_part_value.set(FIRST_GAMEPLAY_SEQUENCE_NUM)
+        self.is_follow_mode_value = tk.BooleanVar(body_panel)
+        self.is_follow_mode_value.set(False)
+        self.wrap_column_value = tk.IntVar(body_panel)
+        self.wrap_column_value.set(parent.controller.settings.wrap_column)
+        self.seed_value = tk.IntVar(body_panel)
+        self.seed_value.set(parent.controller.settings.seed)
 
         setting_rows = (("Line spacing", self.line_spacing_value),
                         ("Left margin", self.left_value),
@@ -645,7 +737,10 @@ class GameSettingsDialog(tk.Toplevel):
                         ("Rows after start panel", self.top_after_start_value),
                         ("Rows before finish panel", self.bottom_before_finish_value),
                         ("Rows after finish panel", self.bottom_after_finish_value),
-                        ("Rows per chunk", self.lines_per_chunk_value))
+                        ("Rows per chunk", self.lines_per_chunk_value),
+                        ("Start at chunk", self.start_part_value),
+                        ("Wrap lines at column (0 - off)", self.wrap_column_value),
+                        ("Seed (same seed - same level)", self.seed_value))
 
         # Language
         language_label = tk.Label(body_panel, text="Language", anchor=tk.W, justify=tk.LEFT)
@@ -669,9 +764,33 @@ class GameSettingsDialog(tk.Toplevel):
             value = tk.Entry(body_panel, textvariable=setting_rows[i][1], justify=tk.RIGHT)
             value.grid(row=i+2, column=1, sticky=tk.NSEW, padx=5)
 
+        # Follow mode
+        follow_check = tk.Checkbutton(body_panel, text="Follow the file while it grows", anchor=tk.W,
+                                      variable=self.is_follow_mode_value)
+        follow_check.grid(row=len(setting_rows) + 2, column=0, columnspan=2, sticky=tk.W, padx=5)
+
         body_panel.focus_set()
         body_panel.pack(fill=tk.X, padx=5, pady=10)
 
+        # Estimate of the game to be built, updated live as the values change
+        estimate_panel = tk.LabelFrame(self, text="Estimate")
+        self.estimate_value = tk.StringVar(estimate_panel)
+        estimate_label = tk.Label(estimate_panel, textvariable=self.estimate_value, anchor=tk.W, justify=tk.LEFT)
+        estimate_label.pack(fill=tk.X, padx=5, pady=5)
+        estimate_panel.pack(fill=tk.X, padx=10)
+        try:
+            self.text_sample = sample_text(file_name)
+        except (IOError, OSError) as e:
+            self.text_sample = None
+            self.estimate_value.set(str(e))
+        self.estimate_after_id = None
+        if self.text_sample:
+            for variable in (self.difficulty_value, self.line_spacing_value, self.left_value, self.right_value,
+                             self.top_before_start_value, self.top_after_start_value, self.bottom_before_finish_value,
+                             self.bottom_after_finish_value, self.lines_per_chunk_value, self.wrap_column_value):
+                variable.trace("w", self.schedule_estimate_update)
+            self.update_estimate()
+
         # Buttons
         button_panel = tk.Frame(self)
         ok_button = tk.Button(button_panel, text="OK", width=10, command=self.ok, default=tk.ACTIVE)
@@ -688,6 +807,7 @@ class GameSettingsDialog(tk.Toplevel):
         self.wait_window(self)
 
     def ok(self):
+        self.cancel_estimate_update()
         self.withdraw()
         self.update_idletasks()
         self.parent.focus_set()
@@ -698,12 +818,44 @@ class GameSettingsDialog(tk.Toplevel):
                                                              self.top_after_start_value.get(), self.right_value.get(),
                                                              self.bottom_before_finish_value.get(),
                                                              self.bottom_after_finish_value.get(),
-                                                             self.lines_per_chunk_value.get())
+                                                             self.lines_per_chunk_value.get(),
+                                                             start_part=self.start_part_value.get(),
+                                                             is_follow_mode=self.is_follow_mode_value.get(),
+                                                             wrap_column=self.wrap_column_value.get(),
+                                                             seed=self.seed_value.get())
 
     def cancel(self):
+        self.cancel_estimate_update()
         self.parent.focus_set()
         self.destroy()
 
+    def schedule_estimate_update(self, *args):
+        self.cancel_estimate_update()
+        self.estimate_after_id = self.after(self.ESTIMATE_DELAY_MS, self.update_estimate)
+
+    def cancel_estimate_update(self):
+        if self.estimate_after_id:
+            self.after_cancel(self.estimate_after_id)
+            self.estimate_after_id = None
+
+    def update_estimate(self):
+        self.estimate_after_id = None
+        try:
+            build_args = (1, self.difficulty_value.get(), self.line_spacing_value.get(), self.left_value.get(),
+                          self.top_before_start_value.get(), self.top_after_start_value.get(), self.right_value.get(),
+                          self.bottom_before_finish_value.get(), self.bottom_after_finish_value.get())
+            lines_per_chunk = self.lines_per_chunk_value.get()
+            wrap_column = self.wrap_column_value.get()
+        except (ValueError, tk.TclError):
+            self.estimate_value.set("Values must be whole numbers")
+            return
+        if lines_per_chunk <= 0:
+            self.estimate_value.set("Rows per chunk must be positive")
+            return
+        estimate = estimate_build(self.parent.controller, self.text_sample, build_args, lines_per_chunk,
+                                  wrap_column=wrap_column)
+        self.estimate_value.set(estimate.get_report())
+
 
 class WordChooseDialog(tk.Toplevel):
     def __init__(self, parent, word_texts_list):
@@ -813,6 +965,112 @@ class AboutDialog(tk.Toplevel):
         self.destroy()
 
 
+class ReportDialog(tk.Toplevel):
+    """
+    Text report of a diagnostics tool, which can be refreshed, reset, saved as text and exported as JSON
+    """
+    def __init__(self, parent, title, get_report, reset, to_dict=None, file_name="report", width=120, height=30):
+        """
+        :param parent: parent window
+        :param title: dialog title
+        :param get_report: function returning text of the report
+        :param reset: function discarding collected data
+        :param to_dict: function returning data of the report for JSON export, None if it cannot be exported
+        :param file_name: default file name (without extension) to save the report to
+        :param width: width of the report text in characters
+        :param height: height of the report text in rows
+        """
+        tk.Toplevel.__init__(self, parent)
+
+        self.transient(parent)
+        self.title(title)
+        self.iconbitmap("icon.ico")
+        self.parent = parent
+        self.get_report = get_report
+        self.reset_report = reset
+        self.to_dict = to_dict
+        self.file_name = file_name
+
+        main_panel = tk.Frame(self)
+        main_panel.grid_rowconfigure(0, weight=1)
+        main_panel.grid_columnconfigure(0, weight=1)
+        self.report_text = tk.Text(main_panel, font=("Courier New", 9), wrap=tk.NONE, width=width, height=height)
+        horizontal_scroll = tk.Scrollbar(main_panel, orient=tk.HORIZONTAL, command=self.report_text.xview)
+        horizontal_scroll.grid(row=1, column=0, sticky=tk.EW)
+        vertical_scroll = tk.Scrollbar(main_panel, orient=tk.VERTICAL, command=self.report_text.yview)
+        vertical_scroll.grid(row=0, column=1, sticky=tk.NS)
+        self.report_text.grid(row=0, column=0, sticky=tk.NSEW)
+        self.report_text.configure(xscrollcommand=horizontal_scroll.set, yscrollcommand=vertical_scroll.set)
+        main_panel.pack(fill=tk.BOTH, expand=1, padx=5, pady=5)
+
+        button_panel = tk.Frame(self)
+        tk.Button(button_panel, text="Refresh", width=10, command=self.refresh).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(button_panel, text="Reset", width=10, command=self.reset).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(button_panel, text="Save...", width=10, command=self.save).pack(side=tk.LEFT, padx=5, pady=5)
+        if self.to_dict:
+            tk.Button(button_panel, text="Export...", width=10, command=self.export).pack(side=tk.LEFT, padx=5, pady=5)
+        tk.Button(button_panel, text="Close", width=10, command=self.ok,
+                  default=tk.ACTIVE).pack(side=tk.LEFT, padx=5, pady=5)
+        button_panel.pack(pady=5)
+
+        self.refresh()
+
+        # Set window position relative to parent window
+        self.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
+        self.wait_window(self)
+
+    def refresh(self):
+        self.report_text.configure(state=tk.NORMAL)
+        self.report_text.delete("1.0", tk.END)
+        self.report_text.insert(tk.END, self.get_report())
+        self.report_text.configure(state=tk.DISABLED)
+
+    def reset(self):
+        self.reset_report()
+        self.refresh()
+
+    def save(self):
+        file_path = tkFileDialog.asksaveasfilename(parent=self, title="Save " + self.title().lower(),
+                                                   defaultextension=".txt", initialfile=self.file_name + ".txt")
+        if file_path:
+            report = self.get_report()
+            if isinstance(report, unicode):
+                report = report.encode("utf-8")
+            with open(file_path, "w") as report_file:
+                report_file.write(report + "\n")
+
+    def export(self):
+        file_path = tkFileDialog.asksaveasfilename(parent=self, title="Export " + self.title().lower(),
+                                                   defaultextension=".json", initialfile=self.file_name + ".json")
+        if file_path:
+            with open(file_path, "w") as report_file:
+                json.dump(self.to_dict(), report_file, indent=2, sort_keys=True)
+
+    def ok(self):
+        self.withdraw()
+        self.update_idletasks()
+        self.parent.focus_set()
+        self.destroy()
+
+
+class QueryReportDialog(ReportDialog):
+    """
+    Report of traced database queries (see query_tracer module)
+    """
+    def __init__(self, parent, query_tracer):
+        ReportDialog.__init__(self, parent, "Query report", query_tracer.get_report, query_tracer.reset,
+                              file_name="query_report")
+
+
+class BuildReportDialog(ReportDialog):
+    """
+    Report of profiled builds of the parts of the current game (see build_profiler module)
+    """
+    def __init__(self, parent, build_profiler):
+        ReportDialog.__init__(self, parent, "Build report", build_profiler.get_report, build_profiler.reset,
+                              to_dict=build_profiler.to_dict, file_name="build_report", width=90, height=40)
+
+
 class Separator(tk.Frame):
     def __init__(self, parent):
         tk.Frame.__init__(self, parent, height=2, bd=1, relief=tk.SUNKEN)